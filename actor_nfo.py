@@ -1,15 +1,29 @@
 import os
 import xml.etree.ElementTree as ET
-import sqlite3
 import logging
 import requests
-import time
 import re
-import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import load_config
+from nfo_catalog import refresh_catalog, library_root_types
+from api_cache import ApiCache, RateLimiter, purge_expired_cache
 
 # 已处理文件列表文件路径
 PROCESSED_FILES_FILE = '/config/processed_nfo_files.txt'
 
+# 豆瓣请求间隔（秒）及随机抖动，所有线程共享
+DOUBAN_REQUEST_INTERVAL = 3
+DOUBAN_REQUEST_JITTER = 2
+# 豆瓣请求超时时间（秒）
+DOUBAN_REQUEST_TIMEOUT = 15
+# 豆瓣搜索结果和演职人员的缓存有效期（秒），未找到的结果缓存时间较短以便重试
+DOUBAN_SEARCH_CACHE_TTL = 30 * 24 * 3600
+DOUBAN_CELEBRITIES_CACHE_TTL = 90 * 24 * 3600
+DOUBAN_NOT_FOUND_CACHE_TTL = 3 * 24 * 3600
+# 同时处理的 NFO 文件数（请求仍受限速器约束）
+ACTOR_NFO_MAX_WORKERS = 3
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,  # 设置日志级别为 INFO
@@ -20,23 +34,9 @@ logging.basicConfig(
     ]
 )
 
-def load_config(db_path='/config/data.db'):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
-
 # 从配置文件中读取值
-config = load_config()
+db_path = '/config/data.db'
+config = load_config(db_path)
 key = config.get('douban_api_key', '')
 cookie = config.get('douban_cookie', '')
 directory = config.get('media_dir', '')
@@ -48,6 +48,10 @@ class DoubanAPI:
         self.host = "https://frodo.douban.com/api/v2"
         self.key = key
         self.cookie = cookie
+        self.session = requests.Session()
+        self.limiter = RateLimiter(DOUBAN_REQUEST_INTERVAL, DOUBAN_REQUEST_JITTER)
+        self.search_cache = ApiCache('douban_suggest', DOUBAN_SEARCH_CACHE_TTL, db_path)
+        self.celebrities_cache = ApiCache('douban_celebrities', DOUBAN_CELEBRITIES_CACHE_TTL, db_path)
         self.mobileheaders = {
             "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.27(0x18001b33) NetType/WIFI Language/zh_CN",
             "Referer": "https://servicewechat.com/wx2f9b06c1de1ccfca/85/page-frame.html",
@@ -66,14 +70,26 @@ class DoubanAPI:
         # 移除标题中的 "第X季" 信息
         return re.sub(r'\s*第\d+季', '', title).strip()
 
+    def get(self, url, headers):
+        """经过限速器发送 GET 请求"""
+        self.limiter.wait()
+        response = self.session.get(url, headers=headers, timeout=DOUBAN_REQUEST_TIMEOUT)
+        response.raise_for_status()  # 检查请求是否成功
+        return response.json()
+
     def get_douban_id(self, title: str, year: str = None, media_type: str = 'tv') -> list:
+        cache_key = f"{media_type}|{title}|{year}"
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            logging.debug(f"使用缓存的豆瓣搜索结果: {title} ({year})")
+            return cached
+
         # 去除常见标点符号和空白符
         cleaned_title = re.sub(r'[：:.，,！!？?“”‘’"\'（）()【】\[\]「」{}《》<>\u00B7\u2027]', '', title)
         url = f"https://movie.douban.com/j/subject_suggest?q={cleaned_title}"
         try:
-            response = requests.get(url, headers=self.pcheaders)
-            response.raise_for_status()  # 检查请求是否成功
-            data = response.json()
+            data = self.get(url, self.pcheaders)
+            douban_ids = []
 
             if data and isinstance(data, list):
                 logging.debug(f"原始数据: {data}")  # 输出原始数据
@@ -96,7 +112,7 @@ class DoubanAPI:
                 if len(matches) == 1:
                     # 如果只有一个匹配项，直接使用这个结果
                     logging.info("找到一个匹配项")
-                    return [matches[0].get('id')]
+                    douban_ids = [matches[0].get('id')]
                 elif len(matches) > 1:
                     # 如果有多个匹配项，选择标题相同或匹配度最高的结果
                     best_match = None
@@ -108,22 +124,16 @@ class DoubanAPI:
                             best_match = match
                     if best_match:
                         logging.info("找到一个最佳匹配项")
-                        return [best_match.get('id')]
+                        douban_ids = [best_match.get('id')]
                     else:
                         logging.warning(f"未找到标题为 {title} 且年份为 {year} 的最佳匹配项")
-                        sleep_time = random.uniform(15, 30)  # 随机休眠15到30秒
-                        logging.info(f"随机休眠 {sleep_time:.2f} 秒")
-                        time.sleep(sleep_time)
                 else:
                     logging.warning(f"未找到标题为 {title} 的匹配项")
-                    sleep_time = random.uniform(15, 30)  # 随机休眠15到30秒
-                    logging.info(f"随机休眠 {sleep_time:.2f} 秒")
-                    time.sleep(sleep_time)
             else:
                 logging.warning(f"未找到标题为 {title} 的结果")
-                sleep_time = random.uniform(15, 30)  # 随机休眠15到30秒
-                logging.info(f"随机休眠 {sleep_time:.2f} 秒")
-                time.sleep(sleep_time)
+
+            self.search_cache.set(cache_key, douban_ids, None if douban_ids else DOUBAN_NOT_FOUND_CACHE_TTL)
+            return douban_ids
         except Exception as e:
             logging.error(f"获取豆瓣 ID 失败，标题: {title}，错误: {e}")
         return []
@@ -134,9 +144,7 @@ class DoubanAPI:
     def imdb_get_douban_id(self, imdb_id: str) -> str:
         url = f"https://movie.douban.com/j/subject_suggest?q={imdb_id}"
         try:
-            response = requests.get(url, headers=self.pcheaders)
-            response.raise_for_status()  # 检查请求是否成功
-            data = response.json()
+            data = self.get(url, self.pcheaders)
             if data and isinstance(data, list) and len(data) > 0:
                 # 直接提取第一个结果的豆瓣 ID
                 douban_id = data[0].get('id')
@@ -160,10 +168,15 @@ class DoubanAPI:
             logging.warning(f"不支持的媒体类型: {media_type}")
             return {}
 
+        # 演职人员按豆瓣 ID 缓存，多季对应同一豆瓣 ID 时只请求一次
+        cache_key = f"{media_type}|{douban_id}"
+        cached = self.celebrities_cache.get(cache_key)
+        if cached is not None:
+            logging.debug(f"使用缓存的演职人员信息，豆瓣 ID: {douban_id}")
+            return cached
+
         try:
-            response = requests.get(url, headers=self.mobileheaders)
-            response.raise_for_status()  # 检查请求是否成功
-            data = response.json()
+            data = self.get(url, self.mobileheaders)
             if 'directors' in data or 'actors' in data:
                 simplified_data = {
                     'directors': [],
@@ -182,78 +195,49 @@ class DoubanAPI:
                             }
                             for celeb in data[key]
                         ]
+                self.celebrities_cache.set(cache_key, simplified_data)
                 return simplified_data
             else:
                 logging.warning(f"未找到媒体类型为 {media_type} 的豆瓣 ID {douban_id} 的演职人员")
+                self.celebrities_cache.set(cache_key, {}, DOUBAN_NOT_FOUND_CACHE_TTL)
                 return {}
         except Exception as e:
             logging.error(f"获取演职人员失败，媒体类型: {media_type}，豆瓣 ID: {douban_id}，错误: {e}")
             return {}
-        finally:
-            # 随机休眠一段时间，避免频繁请求
-            sleep_time = random.uniform(15, 30)  # 随机休眠15到30秒
-            logging.info(f"获取演职人员完成，随机休眠 {sleep_time:.2f} 秒")
-            time.sleep(sleep_time)
 
-def read_nfo_file(file_path):
-    # 尝试打开并解析nfo文件
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # 判断是电影、电视剧还是季
-        media_type = None
-        if root.tag == 'movie':
-            logging.debug(f"这是电影 nfo 文件: {file_path}")
-            media_type = 'movie'
-        elif root.tag == 'tvshow':
-            logging.debug(f"这是电视剧 nfo 文件: {file_path}")
-            media_type = 'tv'
-        elif root.tag == 'season':
-            logging.debug(f"这是季 nfo 文件: {file_path}")
-            media_type = 'season'
-        else:
-            logging.warning(f"未知文件类型: {file_path}")
-            return None, None, None, None
-        
-        # 查找并获取标题
-        title = None
-        for element in root.findall('.//title'):
-            title = element.text
-            break  # 只需要第一个匹配到的标题
-        
-        # 查找并获取年份
-        year = None
-        for element in root.findall('.//year'):
-            year = element.text
-            break  # 只需要第一个匹配到的年份
-        
-        # 如果 <year> 标签中没有找到年份，则尝试从 <premiered> 和 <releasedate> 标签中提取年份
-        if not year:
-            for tag in ['premiered', 'releasedate']:
-                for element in root.findall(f'.//{tag}'):
-                    date_str = element.text
-                    if date_str:
-                        try:
-                            year = date_str.split('-')[0]  # 提取年份部分
-                            break
-                        except IndexError:
-                            logging.warning(f"日期格式不正确: {date_str}")
-        
-        # 查找并获取 IMDb ID
-        imdb_id = None
-        for element in root.findall('.//uniqueid[@type="imdb"]'):
-            imdb_id = element.text
-            break  # 只需要第一个匹配到的 IMDb ID
-        
-        if title:
-            logging.debug(f"标题: {title}, 年份: {year}, IMDb ID: {imdb_id}")
-            return media_type, title, year, imdb_id
-        else:
-            logging.warning(f"未找到文件 {file_path} 中的标题")
-            return None, None, None, None
-    except Exception as e:
-        logging.error(f"读取 nfo 文件 {file_path} 时出错: {e}")
+def read_nfo_file(catalog, file_path):
+    # 从 NFO 目录索引中读取文件信息
+    entry = catalog.entries.get(file_path) or catalog.lookup(file_path)
+    if entry is None:
+        logging.debug(f"未找到文件: {file_path}")
+        return None, None, None, None
+    if entry['MEDIA_TYPE'] is None:
+        logging.error(f"读取 nfo 文件 {file_path} 时出错: 无法解析 XML")
+        return None, None, None, None
+    
+    # 判断是电影、电视剧还是季
+    media_type = {'movie': 'movie', 'tvshow': 'tv', 'season': 'season'}.get(entry['MEDIA_TYPE'])
+    if media_type is None:
+        logging.warning(f"未知文件类型: {file_path}")
+        return None, None, None, None
+    logging.debug(f"这是 {entry['MEDIA_TYPE']} nfo 文件: {file_path}")
+    
+    title = entry['TITLE']
+    year = entry['YEAR']
+    
+    # 如果 <year> 标签中没有找到年份，则尝试从 <premiered> 和 <releasedate> 标签中提取年份
+    if not year:
+        date_str = entry['PREMIERED'] or entry['RELEASEDATE']
+        if date_str:
+            year = date_str.split('-')[0]  # 提取年份部分
+    
+    imdb_id = entry['IMDB_ID']
+    
+    if title:
+        logging.debug(f"标题: {title}, 年份: {year}, IMDb ID: {imdb_id}")
+        return media_type, title, year, imdb_id
+    else:
+        logging.warning(f"未找到文件 {file_path} 中的标题")
         return None, None, None, None
 
 def update_nfo_file(file_path, directors, actors):
@@ -308,10 +292,13 @@ def load_processed_files():
             processed_files = set(line.strip() for line in f)
     return processed_files
 
+processed_files_lock = threading.Lock()
+
 def save_processed_file(file_path):
     """保存已处理的文件"""
-    with open(PROCESSED_FILES_FILE, 'a+', encoding='utf-8') as f:
-        f.write(file_path + '\n')
+    with processed_files_lock:
+        with open(PROCESSED_FILES_FILE, 'a+', encoding='utf-8') as f:
+            f.write(file_path + '\n')
 
 def should_exclude_file(file_path):
     """检查文件是否应被排除"""
@@ -329,12 +316,115 @@ def should_exclude_directory(dir_path):
             return True
     return False
 
-def process_nfo_files(directory, douban_api):
+def collect_celebrities(douban_api, douban_ids, media_type, fetched):
+    """汇总多个豆瓣 ID 的演职人员，fetched 中已汇总过的豆瓣 ID 不再重复添加"""
+    directors = []
+    actors = []
+    for douban_id in douban_ids:
+        if douban_id in fetched:
+            continue
+        fetched.add(douban_id)
+        celebs_data = douban_api.get_celebrities(douban_id, media_type)
+        directors.extend(celebs_data.get('directors', []))
+        actors.extend(celebs_data.get('actors', []))
+    return directors, actors
+
+def build_task(catalog, nfo_files, root, file_path, tvshow_title, tvshow_year):
+    """
+    从 NFO 目录索引中读取处理单个文件所需的信息（在主线程中完成，工作线程只负责请求豆瓣和改写文件）。
+    返回 None 表示该文件无需处理。
+    """
+    media_type, title, year, imdb_id = read_nfo_file(catalog, file_path)
+    if media_type is None:
+        # 如果 media_type 为 None，则表示文件类型未知，直接跳过
+        logging.warning(f"未知文件类型: {file_path}，跳过")
+        return None
+    if not title:
+        logging.warning(f"未能提取标题 对于文件: {file_path}")
+        return None
+    if media_type not in ('movie', 'tv'):
+        logging.warning(f"不支持的媒体类型: {media_type}")
+        return None
+
+    task = {'file_path': file_path, 'media_type': media_type, 'title': title, 'year': year, 'seasons': []}
+    if media_type == 'tv':
+        # 各季的搜索标题和年份：使用父目录的标题和当前季的年份
+        season_dirs = sorted(
+            os.path.basename(path) for path in nfo_files
+            if os.path.dirname(path) == root and os.path.basename(path).startswith('Season')
+        )
+        for season_dir in season_dirs:
+            season_path = os.path.join(root, season_dir)
+            season_nfo_path = os.path.join(season_path, 'season.nfo')
+            if 'season.nfo' not in nfo_files[season_path]:
+                logging.debug(f"未找到文件: {season_nfo_path}")
+                continue
+            season_media_type, season_title, season_year, season_imdb_id = read_nfo_file(catalog, season_nfo_path)
+            if not season_year:
+                logging.warning(f"未找到文件 {season_nfo_path} 中的年份")
+                continue
+            # 确保年份是从正确的元素中提取的
+            if not season_year.isdigit():
+                # 如果年份不是数字，则从 tvshow.nfo 文件中获取年份
+                season_year = tvshow_year if tvshow_year else year
+            if not tvshow_title:
+                logging.warning(f"未找到父目录的 tvshow.nfo 文件中的标题，使用当前文件的标题: {title}")
+            task['seasons'].append((season_nfo_path, tvshow_title or title, season_year))
+    return task
+
+def process_task(task, douban_api):
+    """请求豆瓣演职人员并更新 NFO 文件，返回是否改写了文件"""
+    file_path = task['file_path']
+    media_type = task['media_type']
+    logging.info(f"正在处理文件: {file_path}")
+    fetched = set()
+    all_directors = []
+    all_actors = []
+    if media_type == 'movie':
+        # 获取豆瓣 ID
+        douban_ids = douban_api.get_douban_id(task['title'], task['year'], media_type='movie')
+        if not douban_ids:
+            logging.warning(f"未能提取豆瓣 ID 对于文件: {file_path}")
+            return False
+        logging.info(f"提取到的豆瓣 IDs 是: {douban_ids}")
+        all_directors, all_actors = collect_celebrities(douban_api, douban_ids, media_type, fetched)
+    else:
+        # 多季对应同一豆瓣 ID 时，演职人员只汇总一次
+        for season_nfo_path, search_title, season_year in task['seasons']:
+            douban_ids = douban_api.get_douban_id(search_title, season_year, media_type='tv')
+            if not douban_ids:
+                logging.warning(f"未能提取豆瓣 ID 对于文件: {season_nfo_path}")
+                continue
+            logging.info(f"提取到的豆瓣 IDs 是: {douban_ids}")
+            directors, actors = collect_celebrities(douban_api, douban_ids, media_type, fetched)
+            all_directors.extend(directors)
+            all_actors.extend(actors)
+
+    if all_directors or all_actors:
+        update_nfo_file(file_path, all_directors, all_actors)
+        save_processed_file(file_path)
+        return True
+    return False
+
+def process_nfo_files(directory, douban_api, root_types=()):
+    """
+    为未处理过的 NFO 文件补充豆瓣中文演职人员信息：
+    1. 从 NFO 目录索引中收集待处理文件，按修改时间从新到旧处理。
+    2. 多个文件并行处理，豆瓣请求经共享限速器按间隔发送，搜索结果和演职人员持久化缓存。
+    """
     # 加载已处理的文件列表
     processed_files = load_processed_files()
+    purge_expired_cache(db_path)
     
-    # 遍历指定目录及其所有子目录下的所有.nfo文件
-    for root, dirs, files in os.walk(directory):
+    # 增量更新 NFO 目录索引，按所在目录分组
+    catalog = refresh_catalog(db_path, [directory], root_types)
+    nfo_files = {}
+    for entry in catalog.under(directory):
+        nfo_files.setdefault(os.path.dirname(entry['PATH']), []).append(os.path.basename(entry['PATH']))
+    
+    # 收集指定目录及其所有子目录下待处理的.nfo文件
+    tasks = []
+    for root, files in nfo_files.items():
         # 检查当前目录是否应被排除
         if should_exclude_directory(root):
             continue
@@ -343,98 +433,46 @@ def process_nfo_files(directory, douban_api):
         tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
         tvshow_title = None
         tvshow_year = None
-        if os.path.exists(tvshow_nfo_path):
-            tvshow_media_type, tvshow_title, tvshow_year, tvshow_imdb_id = read_nfo_file(tvshow_nfo_path)
-            if tvshow_title is None or tvshow_year is None:
-                logging.warning(f"未找到文件 {tvshow_nfo_path} 中的标题或年份")
-                tvshow_title = None
-                tvshow_year = None
-        else:
-            logging.debug(f"未找到文件: {tvshow_nfo_path}")
+        tvshow_loaded = False
         
         for filename in files:
             if filename.endswith('.nfo'):
                 file_path = os.path.join(root, filename)
                 # 检查文件是否应被排除
-                if should_exclude_file(file_path):
-                    continue
-                
-                if file_path in processed_files:
-                    #logging.info(f"已处理文件: {file_path}，跳过")
+                if should_exclude_file(file_path) or file_path in processed_files:
                     continue
                 
-                logging.info(f"正在处理文件: {file_path}")
+                if not tvshow_loaded:
+                    tvshow_loaded = True
+                    if 'tvshow.nfo' in files:
+                        tvshow_media_type, tvshow_title, tvshow_year, tvshow_imdb_id = read_nfo_file(catalog, tvshow_nfo_path)
+                        if tvshow_title is None or tvshow_year is None:
+                            logging.warning(f"未找到文件 {tvshow_nfo_path} 中的标题或年份")
+                            tvshow_title = None
+                            tvshow_year = None
                 
-                # 读取nfo文件信息
-                media_type, title, year, imdb_id = read_nfo_file(file_path)
-                if media_type is None:
-                    # 如果 media_type 为 None，则表示文件类型未知，直接跳过
-                    logging.warning(f"未知文件类型: {file_path}，跳过")
-                    continue
-                
-                if title:
-                    if media_type == 'movie':
-                        # 获取豆瓣 ID
-                        douban_ids = douban_api.get_douban_id(title, year, media_type='movie')
-                        if douban_ids:
-                            logging.info(f"提取到的豆瓣 IDs 是: {douban_ids}")
-                            all_directors = []
-                            all_actors = []
-                            for douban_id in douban_ids:
-                                celebs_data = douban_api.get_celebrities(douban_id, media_type)
-                                all_directors.extend(celebs_data.get('directors', []))
-                                all_actors.extend(celebs_data.get('actors', []))
-                            if all_directors or all_actors:
-                                update_nfo_file(file_path, all_directors, all_actors)
-                                save_processed_file(file_path)
-                        else:
-                            logging.warning(f"未能提取豆瓣 ID 对于文件: {file_path}")
-                    elif media_type == 'tv':
-                        # 处理 tvshow.nfo 文件
-                        all_directors = []
-                        all_actors = []
-                        season_dirs = [d for d in dirs if d.startswith('Season')]
-                        for season_dir in season_dirs:
-                            season_path = os.path.join(root, season_dir)
-                            season_nfo_path = os.path.join(season_path, 'season.nfo')
-                            if os.path.exists(season_nfo_path):
-                                season_media_type, season_title, season_year, season_imdb_id = read_nfo_file(season_nfo_path)
-                                if season_year:
-                                    # 确保年份是从正确的元素中提取的
-                                    if not season_year.isdigit():
-                                        # 如果年份不是数字，则从 tvshow.nfo 文件中获取年份
-                                        season_year = tvshow_year if tvshow_year else year
-                                    # 使用父目录的标题和当前季的年份
-                                    if tvshow_title:
-                                        douban_ids = douban_api.get_douban_id(tvshow_title, season_year, media_type='tv')
-                                    else:
-                                        logging.warning(f"未找到父目录的 tvshow.nfo 文件中的标题，使用当前文件的标题: {title}")
-                                        douban_ids = douban_api.get_douban_id(title, season_year, media_type='tv')
-                                    if douban_ids:
-                                        logging.info(f"提取到的豆瓣 IDs 是: {douban_ids}")
-                                        for douban_id in douban_ids:
-                                            celebs_data = douban_api.get_celebrities(douban_id, media_type)
-                                            all_directors.extend(celebs_data.get('directors', []))
-                                            all_actors.extend(celebs_data.get('actors', []))
-                                    else:
-                                        logging.warning(f"未能提取豆瓣 ID 对于文件: {season_nfo_path}")
-                                else:
-                                    logging.warning(f"未找到文件 {season_nfo_path} 中的年份")
-                            else:
-                                logging.debug(f"未找到文件: {season_nfo_path}")
-                        
-                        if all_directors or all_actors:
-                            update_nfo_file(file_path, all_directors, all_actors)
-                            save_processed_file(file_path)
-                    else:
-                        logging.warning(f"不支持的媒体类型: {media_type}")
-                else:
-                    logging.warning(f"未能提取标题 对于文件: {file_path}")
-
-                # 随机休眠一段时间，避免频繁请求
-                sleep_time = random.uniform(15, 30)  # 随机休眠15到30秒
-                logging.info(f"处理完成，随机休眠 {sleep_time:.2f} 秒")
-                time.sleep(sleep_time)
+                task = build_task(catalog, nfo_files, root, file_path, tvshow_title, tvshow_year)
+                if task:
+                    tasks.append(task)
+    
+    # 最新的文件优先处理
+    tasks.sort(key=lambda task: catalog.entries[task['file_path']]['MTIME'] or 0, reverse=True)
+    logging.info(f"共 {len(tasks)} 个 NFO 文件待处理")
+    
+    updated_files = []
+    with ThreadPoolExecutor(max_workers=ACTOR_NFO_MAX_WORKERS) as executor:
+        futures = [executor.submit(process_task, task, douban_api) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                if future.result():
+                    updated_files.append(task['file_path'])
+            except Exception as e:
+                logging.error(f"处理文件 {task['file_path']} 时出错: {e}")
+    
+    # 改写过的文件重新登记到 NFO 目录索引
+    for file_path in updated_files:
+        catalog.lookup(file_path)
+    catalog.save()
 
 if __name__ == "__main__":
     config = load_config()
@@ -446,4 +484,4 @@ if __name__ == "__main__":
         exit(0)
         
     douban_api = DoubanAPI(key, cookie)
-    process_nfo_files(directory, douban_api)
\ No newline at end of file
+    process_nfo_files(directory, douban_api, library_root_types(config))
\ No newline at end of file
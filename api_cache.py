@@ -0,0 +1,126 @@
+import json
+import time
+import queue
+import random
+import logging
+import sqlite3
+import threading
+from database import connect, DB_PATH
+
+class RateLimiter:
+    """
+    请求限速器：多个线程共享，按固定间隔（可加随机抖动）依次放行请求，
+    替代每次请求后固定休眠，空闲时第一个请求无需等待。
+    """
+    def __init__(self, interval, jitter=0):
+        self.interval = interval
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval + random.uniform(0, self.jitter)
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+class ApiCache:
+    """
+    外部接口响应的持久化缓存（API_CACHE 表），按命名空间和键存取 JSON 数据，过期后视为未命中。
+    """
+    def __init__(self, namespace, ttl, db_path=DB_PATH):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.db_path = db_path
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        try:
+            with connect(self.db_path) as conn:
+                row = conn.execute(
+                    'SELECT DATA FROM API_CACHE WHERE NAMESPACE = ? AND KEY = ? AND EXPIRES_AT > ?',
+                    (self.namespace, str(key), int(time.time()))
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"读取接口缓存失败: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def get_all(self):
+        """一次读取命名空间下所有未过期的缓存，返回 {键: 数据}"""
+        try:
+            with connect(self.db_path) as conn:
+                rows = conn.execute(
+                    'SELECT KEY, DATA FROM API_CACHE WHERE NAMESPACE = ? AND EXPIRES_AT > ?',
+                    (self.namespace, int(time.time()))
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.warning(f"读取接口缓存失败: {e}")
+            return {}
+        return {key: json.loads(data) for key, data in rows}
+
+    def set(self, key, data, ttl=None):
+        """写入缓存，ttl 为空时使用默认有效期（秒）"""
+        expires_at = int(time.time() + (self.ttl if ttl is None else ttl))
+        try:
+            with connect(self.db_path) as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO API_CACHE (NAMESPACE, KEY, DATA, EXPIRES_AT) VALUES (?, ?, ?, ?)',
+                    (self.namespace, str(key), json.dumps(data, ensure_ascii=False), expires_at)
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"写入接口缓存失败: {e}")
+
+class RefreshQueue:
+    """
+    后台刷新队列：由一个后台线程依次执行刷新任务（请求由任务自身经限速器发送），
+    同一个键在完成前只排队一次；调用方可继续处理其他工作，需要结果时调用 join 等待队列清空。
+    """
+    def __init__(self, refresh, name='refresh'):
+        self.refresh = refresh
+        self.name = name
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def put(self, key, *args):
+        """加入刷新任务，返回是否新加入（已在队列中的键返回 False）"""
+        with self.lock:
+            if key in self.pending:
+                return False
+            self.pending.add(key)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker, name=self.name, daemon=True)
+                self.thread.start()
+        self.queue.put((key, args))
+        return True
+
+    def worker(self):
+        while True:
+            key, args = self.queue.get()
+            try:
+                self.refresh(*args)
+            except Exception as e:
+                logging.error(f"后台刷新 {key} 时出错: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+                self.queue.task_done()
+
+    def join(self):
+        """等待所有已加入的刷新任务完成"""
+        self.queue.join()
+
+def purge_expired_cache(db_path=DB_PATH):
+    """删除所有已过期的接口缓存"""
+    try:
+        with connect(db_path) as conn:
+            deleted = conn.execute('DELETE FROM API_CACHE WHERE EXPIRES_AT <= ?', (int(time.time()),)).rowcount
+        if deleted:
+            logging.info(f"已清理 {deleted} 条过期的接口缓存")
+    except sqlite3.Error as e:
+        logging.warning(f"清理接口缓存失败: {e}")
@@ -5,10 +5,10 @@ import threading
 import requests
 import bcrypt
 import psutil
-from flask import Flask, g, render_template, request, redirect, url_for, jsonify, session, flash, session, Response
+from flask import Flask, g, render_template, request, redirect, url_for, jsonify, session, flash, session, Response, send_file
 from functools import wraps
 from werkzeug.exceptions import InternalServerError
-from datetime import timedelta
+from datetime import timedelta, date
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 from flask import stream_with_context
@@ -25,7 +25,11 @@ import json
 import glob
 import threading
 import uuid
+import hashlib
 from collections import deque
+from tv_episodes import count_library_episodes, get_episode_counts
+from database import connect
+from artwork_cache import ThumbnailCache, TMDB_IMAGE_SIZES, TMDB_IMAGE_BASE_URL
 
 # Ensure runtime directories exist (Windows maps '/tmp' to 'C:\\tmp')
 os.makedirs("/tmp/log", exist_ok=True)
@@ -87,6 +91,27 @@ if not os.path.exists(_default_db):
 else:
     DATABASE = _default_db
 
+# 网页 TMDB 图片的本地缓存，浏览器可长期缓存（TMDB 图片路径对应的内容不会变化）
+thumbnail_cache = ThumbnailCache()
+TMDB_IMAGE_MAX_AGE = 365 * 24 * 3600
+TMDB_IMAGE_FILE_PATTERN = re.compile(r'^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp|svg)$')
+
+# 推荐页 TMDB 榜单的后台刷新间隔（秒）
+RECOMMENDATION_REFRESH_INTERVAL = 30 * 60
+# 推荐页榜单条目保留的字段（页面只用到这些字段，其余字段不返回）
+RECOMMENDATION_ITEM_FIELDS = (
+    'id', 'media_type', 'title', 'name', 'poster_path', 'backdrop_path', 'overview',
+    'vote_average', 'vote_count', 'release_date', 'first_air_date'
+)
+# 推荐页榜单缓存：序列化后的响应内容及其 ETag
+recommendation_feeds = {'body': None, 'etag': None}
+recommendation_feeds_lock = threading.Lock()
+recommendation_refresher_started = threading.Event()
+tmdb_session = requests.Session()
+
+# 配置变更标记文件，sync.py 检测到该文件更新后重新加载配置快照
+CONFIG_MARKER_PATH = '/tmp/config_changed.marker'
+
 # 存储进程ID的字典
 running_services = {}
 
@@ -96,8 +121,7 @@ log_streaming_status = {}
 def get_db():
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = connect(DATABASE, row_factory=sqlite3.Row)
     return db
 
 @app.teardown_appcontext
@@ -106,6 +130,14 @@ def close_connection(exception):
     if db is not None:
         db.close()
 
+def touch_config_marker():
+    """更新配置变更标记，通知常驻服务重新加载配置"""
+    try:
+        with open(CONFIG_MARKER_PATH, 'w') as f:
+            f.write(str(time.time()))
+    except Exception as e:
+        logger.warning(f"更新配置变更标记失败: {e}")
+
 def login_required(view):
     @wraps(view)
     def wrapped_view(**kwargs):
@@ -357,7 +389,7 @@ def dashboard():
     total_tvs = db.execute('SELECT COUNT(DISTINCT id) FROM LIB_TVS').fetchone()[0]
     
     # 获取剧集数量
-    total_episodes = db.execute('SELECT SUM(LENGTH(episodes) - LENGTH(REPLACE(episodes, \',\', \'\')) + 1) FROM LIB_TV_SEASONS').fetchone()[0] or 0
+    total_episodes = count_library_episodes(db)
      
     # 从会话中获取用户昵称和头像
     username = session.get('username')
@@ -497,6 +529,24 @@ def system_processes():
         "processes": processes
     })
 
+@app.route('/api/transfer_queue', methods=['GET'])
+@login_required
+def transfer_queue():
+    """
+    获取文件转移队列状态（由 sync.py 写入状态文件）
+    """
+    status_file_path = '/tmp/transfer_queue.json'
+    status = {'active': [], 'waiting': [], 'updated_at': None}
+    if os.path.exists(status_file_path):
+        try:
+            with open(status_file_path, 'r', encoding='utf-8') as f:
+                status.update(json.load(f))
+        except json.JSONDecodeError as e:
+            logger.error(f"解析转移队列状态文件失败: {e}")
+        except Exception as e:
+            logger.error(f"读取转移队列状态文件失败: {e}")
+    return jsonify(status)
+
 @app.route('/api/site_status', methods=['GET'])
 @login_required
 def site_status():
@@ -625,6 +675,128 @@ def recommendations():
     tmdb_api_key = tmdb_api_key['VALUE'] if tmdb_api_key else None
     return render_template('recommendations.html', nickname=nickname, avatar_url=avatar_url, tmdb_api_key=tmdb_api_key, version=APP_VERSION)
 
+def recommendation_feed_requests():
+    """推荐页各榜单对应的 TMDB 接口及参数"""
+    today = date.today()
+    return {
+        'trending_movies': ('/3/trending/movie/day', {}),
+        'now_playing_global': ('/3/movie/now_playing', {'page': 1}),
+        'now_playing_china': ('/3/movie/now_playing', {'region': 'CN', 'page': 1}),
+        'trending_tv': ('/3/trending/tv/day', {}),
+        # 国内最新电影：近一年上映
+        'china_movies': ('/3/discover/movie', {
+            'sort_by': 'release_date.desc',
+            'primary_release_date.gte': (today - timedelta(days=365)).isoformat(),
+            'primary_release_date.lte': today.isoformat(),
+            'with_origin_country': 'CN',
+            'vote_count.gte': 2,
+            'vote_average.gte': 5,
+        }),
+        # 国内最新剧集：近半年首播
+        'china_tv': ('/3/discover/tv', {
+            'sort_by': 'first_air_date.desc',
+            'first_air_date.gte': (today - timedelta(days=182)).isoformat(),
+            'first_air_date.lte': today.isoformat(),
+            'with_original_language': 'zh',
+            'vote_count.gte': 2,
+            'vote_average': 5,
+        }),
+        'top_rated_movies': ('/3/movie/top_rated', {}),
+        'top_rated_tv': ('/3/tv/top_rated', {}),
+    }
+
+def fetch_recommendation_feeds():
+    """并发请求推荐页的所有 TMDB 榜单，返回精简后的数据；未配置密钥或全部请求失败时返回 None"""
+    conn = connect(DATABASE)
+    try:
+        settings = dict(conn.execute(
+            "SELECT OPTION, VALUE FROM CONFIG WHERE OPTION IN ('tmdb_api_key', 'tmdb_base_url')"
+        ).fetchall())
+    finally:
+        conn.close()
+    api_key = settings.get('tmdb_api_key')
+    if not api_key:
+        return None
+    base_url = (settings.get('tmdb_base_url') or 'https://api.tmdb.org').rstrip('/')
+
+    def fetch(path, params):
+        response = tmdb_session.get(
+            f"{base_url}{path}",
+            params={'api_key': api_key, 'language': 'zh-CN', **params},
+            timeout=10
+        )
+        response.raise_for_status()
+        return [
+            {field: item[field] for field in RECOMMENDATION_ITEM_FIELDS if field in item}
+            for item in response.json().get('results', [])
+        ]
+
+    feeds = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {name: executor.submit(fetch, *args) for name, args in recommendation_feed_requests().items()}
+        for name, future in futures.items():
+            try:
+                feeds[name] = future.result()
+            except Exception as e:
+                logger.warning(f"获取推荐榜单 {name} 失败: {e}")
+    if not feeds:
+        return None
+    for name in futures:
+        feeds.setdefault(name, [])
+    return feeds
+
+def refresh_recommendation_feeds():
+    """刷新推荐页榜单缓存，失败时保留原有缓存，返回是否成功"""
+    feeds = fetch_recommendation_feeds()
+    if feeds is None:
+        return False
+    body = json.dumps({'feeds': feeds, 'updated_at': int(time.time())}, ensure_ascii=False, separators=(',', ':'))
+    with recommendation_feeds_lock:
+        recommendation_feeds['body'] = body
+        recommendation_feeds['etag'] = hashlib.sha1(body.encode('utf-8')).hexdigest()
+    return True
+
+def recommendation_refresh_loop():
+    """后台定时刷新推荐页榜单"""
+    while True:
+        time.sleep(RECOMMENDATION_REFRESH_INTERVAL)
+        try:
+            refresh_recommendation_feeds()
+        except Exception as e:
+            logger.error(f"刷新推荐榜单失败: {e}")
+
+@app.route('/recommendation_feeds')
+@login_required
+def get_recommendation_feeds():
+    """推荐页所需的全部 TMDB 榜单，由服务端汇总并定时刷新，支持 ETag 协商缓存"""
+    # 在锁内检查并标记，并发的首批请求只会启动一个刷新线程
+    with recommendation_feeds_lock:
+        start_refresher = not recommendation_refresher_started.is_set()
+        recommendation_refresher_started.set()
+    if start_refresher:
+        threading.Thread(target=recommendation_refresh_loop, daemon=True).start()
+    if recommendation_feeds['body'] is None:
+        try:
+            refreshed = refresh_recommendation_feeds()
+        except Exception as e:
+            logger.error(f"刷新推荐榜单失败: {e}")
+            refreshed = False
+        if not refreshed and recommendation_feeds['body'] is None:
+            return jsonify({'error': '无法获取TMDB数据，请检查TMDB API密钥及网络连接'}), 502
+
+    with recommendation_feeds_lock:
+        body = recommendation_feeds['body']
+        etag = recommendation_feeds['etag']
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # 浏览器可缓存，但每次使用前需向服务端确认 ETag 是否变化
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/search', methods=['GET'])
 @login_required
 def search():
@@ -707,9 +879,10 @@ def library():
             tv_ids = db.execute('SELECT id FROM LIB_TVS ORDER BY year DESC LIMIT ? OFFSET ?', (per_page, offset)).fetchall()
             tv_ids = [tv['id'] for tv in tv_ids]
 
-            # 获取这些电视剧的所有季信息
+            # 获取这些电视剧的所有季信息及每季集数
+            episode_counts = get_episode_counts(db, tv_ids)
             tv_seasons = db.execute('''
-                SELECT t1.id, t1.title, t2.season, t2.episodes, t1.year, t1.tmdb_id
+                SELECT t1.id, t1.title, t2.season, t1.year, t1.tmdb_id
                 FROM LIB_TVS AS t1 
                 JOIN LIB_TV_SEASONS AS t2 ON t1.id = t2.tv_id 
                 WHERE t1.id IN ({})
@@ -729,14 +902,7 @@ def library():
                         'total_episodes': 0
                     }
                 
-                # 兼容处理 episodes 字段（可能是整数或字符串）
-                episodes = tv['episodes']
-                if isinstance(episodes, int):
-                    episodes = str(episodes)
-
-                # 解析 episodes 字符串，计算总集数
-                episodes_list = episodes.split(',')
-                num_episodes = len(episodes_list)
+                num_episodes = episode_counts.get((tv['id'], tv['season']), 0)
 
                 tv_data[tv['id']]['seasons'].append({
                     'season': tv['season'],
@@ -772,6 +938,26 @@ def library():
         logger.error(f"发生错误: {e}")
         raise InternalServerError("发生意外错误，请稍后再试。")
 
+@app.route('/tmdb_image/<size>/<file_name>')
+@login_required
+def tmdb_image(size, file_name):
+    """TMDB 图片代理：首次访问时下载到本地缓存，之后直接从本地返回"""
+    if size not in TMDB_IMAGE_SIZES or not TMDB_IMAGE_FILE_PATTERN.match(file_name):
+        return jsonify({'error': '无效的图片地址'}), 404
+    etag = f"{size}-{file_name}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        path = thumbnail_cache.get(size, file_name)
+        if not path:
+            # 下载失败时由浏览器直接请求 TMDB
+            return redirect(f"{TMDB_IMAGE_BASE_URL}/{size}/{file_name}")
+        response = send_file(path, etag=etag, max_age=TMDB_IMAGE_MAX_AGE, conditional=True)
+    response.set_etag(etag)
+    response.cache_control.max_age = TMDB_IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/subscriptions')
 @login_required
 def subscriptions():
@@ -1016,56 +1202,61 @@ def tmdb_subscriptions():
         logger.error(f"订阅处理失败: {e}")
         return jsonify({"success": False, "message": "订阅失败，请稍后再试"}), 500
 
+def subscription_status(db, title, year, season=None):
+    """查询订阅或入库状态"""
+    # 检查是否已订阅
+    if season:  # 检查电视剧订阅（特定季）
+        existing_tv = db.execute(
+            'SELECT 1 FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?',
+            (title, year, season)
+        ).fetchone()
+        if existing_tv:
+            return {"subscribed": True, "status": "subscribed"}
+
+        # 检查是否已入库（特定季）
+        existing_tv_in_library = db.execute(
+            '''
+            SELECT t1.id FROM LIB_TVS AS t1
+            JOIN LIB_TV_SEASONS AS t2 ON t1.id = t2.tv_id
+            WHERE t1.title = ? AND t1.year = ? AND t2.season = ?
+            ''',
+            (title, year, season)
+        ).fetchone()
+        if existing_tv_in_library:
+            return {"subscribed": True, "status": "in_library"}
+    else:  # 检查电影订阅或电视剧整体订阅
+        # 检查电影订阅
+        existing_movie = db.execute(
+            'SELECT 1 FROM MISS_MOVIES WHERE title = ? AND year = ?',
+            (title, year)
+        ).fetchone()
+        if existing_movie:
+            return {"subscribed": True, "status": "subscribed"}
+
+        # 检查是否已入库（电影）
+        existing_movie_in_library = db.execute(
+            'SELECT id FROM LIB_MOVIES WHERE title = ? AND year = ?',
+            (title, year)
+        ).fetchone()
+        if existing_movie_in_library:
+            return {"subscribed": True, "status": "in_library"}
+
+    return {"subscribed": False, "status": "not_found"}
+
 # 检查热门推荐中的订阅状态（是否已订阅或已入库）
 @app.route('/check_subscriptions', methods=['POST'])
 @login_required
 def check_subscriptions():
+    """检查订阅状态；请求体为数组时批量检查，按顺序返回每一项的结果"""
     try:
         data = request.json
-        title = data.get('title')
-        year = data.get('year')
-        season = data.get('season')  # 如果是电视剧，获取季编号
-
         db = get_db()
-
-        # 检查是否已订阅
-        if season:  # 检查电视剧订阅（特定季）
-            existing_tv = db.execute(
-                'SELECT * FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?',
-                (title, year, season)
-            ).fetchone()
-            if existing_tv:
-                return jsonify({"subscribed": True, "status": "subscribed"})
-
-            # 检查是否已入库（特定季）
-            existing_tv_in_library = db.execute(
-                '''
-                SELECT t1.id FROM LIB_TVS AS t1
-                JOIN LIB_TV_SEASONS AS t2 ON t1.id = t2.tv_id
-                WHERE t1.title = ? AND t1.year = ? AND t2.season = ?
-                ''',
-                (title, year, season)
-            ).fetchone()
-            if existing_tv_in_library:
-                return jsonify({"subscribed": True, "status": "in_library"})
-        else:  # 检查电影订阅或电视剧整体订阅
-            # 检查电影订阅
-            existing_movie = db.execute(
-                'SELECT * FROM MISS_MOVIES WHERE title = ? AND year = ?',
-                (title, year)
-            ).fetchone()
-            if existing_movie:
-                return jsonify({"subscribed": True, "status": "subscribed"})
-
-            # 检查是否已入库（电影）
-            existing_movie_in_library = db.execute(
-                'SELECT id FROM LIB_MOVIES WHERE title = ? AND year = ?',
-                (title, year)
-            ).fetchone()
-            if existing_movie_in_library:
-                return jsonify({"subscribed": True, "status": "in_library"})
-
-        return jsonify({"subscribed": False, "status": "not_found"})
+        if isinstance(data, list):
+            return jsonify([
+                subscription_status(db, item.get('title'), item.get('year'), item.get('season'))
+                for item in data
+            ])
+        return jsonify(subscription_status(db, data.get('title'), data.get('year'), data.get('season')))
     except Exception as e:
         logger.error(f"检查订阅状态失败: {e}")
         return jsonify({"subscribed": False, "error": "检查失败"}), 500
@@ -1089,10 +1280,12 @@ def edit_subscription(type, id):
 
         try:
             if type == 'movie':
-                db.execute('UPDATE MISS_MOVIES SET title = ?, year = ? WHERE id = ?', (title, year, id))
+                # 标题或年份变化后，之前解析的 TMDB ID 不再适用
+                db.execute('UPDATE MISS_MOVIES SET title = ?, year = ?, tmdb_id = CASE WHEN title = ? AND year = ? THEN tmdb_id END WHERE id = ?',
+                          (title, year, title, year, id))
             elif type == 'tv':
-                db.execute('UPDATE MISS_TVS SET title = ?, season = ?, missing_episodes = ? WHERE id = ?', 
-                          (title, season, missing_episodes, id))
+                db.execute('UPDATE MISS_TVS SET title = ?, season = ?, missing_episodes = ?, tmdb_id = CASE WHEN title = ? THEN tmdb_id END WHERE id = ?', 
+                          (title, season, missing_episodes, title, id))
             db.commit()
             logger.info(f"用户更新订阅: {type} ID={id}")
             return jsonify(success=True, message="订阅更新成功")
@@ -1206,6 +1399,7 @@ def tv_alias_add_api():
             db.execute('INSERT INTO LIB_TV_ALIAS (ALIAS, TARGET_TITLE, TARGET_SEASON) VALUES (?, ?, ?)', 
                       (alias, target_title, target_season))
             db.commit()
+            touch_config_marker()
             return jsonify({"success": True, "message": "添加成功"})
         except sqlite3.IntegrityError:
             return jsonify({"success": False, "message": "该别名已存在"}), 400
@@ -1235,6 +1429,7 @@ def tv_alias_edit_api(alias_id):
             db.execute('UPDATE LIB_TV_ALIAS SET ALIAS = ?, TARGET_TITLE = ?, TARGET_SEASON = ? WHERE id = ?', 
                       (alias, target_title, target_season, alias_id))
             db.commit()
+            touch_config_marker()
             return jsonify({"success": True, "message": "更新成功"})
         except sqlite3.IntegrityError:
             return jsonify({"success": False, "message": "该别名已存在"}), 400
@@ -1254,6 +1449,7 @@ def tv_alias_delete_api(alias_id):
             
         db.execute('DELETE FROM LIB_TV_ALIAS WHERE id = ?', (alias_id,))
         db.commit()
+        touch_config_marker()
         return jsonify({"success": True, "message": "删除成功"})
     except Exception as e:
         logger.error(f"删除剧集关联失败: {e}")
@@ -1892,6 +2088,8 @@ GROUP_MAPPING = {
         "file_overwrite_option": {"type": "select", "label": "文件覆盖选项", "options": ["skip", "size", "always"]},
         "enable_multithread_transfer": {"type": "switch", "label": "启用多线程文件转移"},
         "transfer_thread_count": {"type": "text", "label": "批量文件转移线程数"},
+        "transfer_bandwidth_limit": {"type": "text", "label": "文件转移带宽限制（MB/s，0为不限制）"},
+        "transfer_device_concurrency": {"type": "text", "label": "单个磁盘同时转移的文件数"},
         "movie_folder_naming_format": {"type": "text", "label": "电影目录命名规则"},
         "tv_folder_naming_format": {"type": "text", "label": "电视剧目录命名规则"},
         "anime_folder_naming_format": {"type": "text", "label": "动漫目录命名规则"},
@@ -1927,7 +2125,8 @@ GROUP_MAPPING = {
         "download_host": {"type": "text", "label": "下载器地址"},
         "download_port": {"type": "text", "label": "下载器端口"},
         "xunlei_device_name": {"type": "text", "label": "迅雷设备名称"},
-        "xunlei_dir": {"type": "text", "label": "迅雷下载目录"}
+        "xunlei_dir": {"type": "text", "label": "迅雷下载目录"},
+        "download_completion_feed": {"type": "switch", "label": "下载完成后直接转移（替代递归目录监控，开启后只监控下载目录根层级，手动放入子目录的文件不再自动转移）"}
     },
     "站点索引开关": {
         "bthd_enabled": {"type": "switch", "label": "高清影视之家"},
@@ -2020,6 +2219,7 @@ def save_settings():
                     logger.info(f"更新配置项 ID={option_id}, KEY={key}, VALUE={value}")
                     db.execute('UPDATE CONFIG SET VALUE = ? WHERE ID = ?', (value, option_id))
         db.commit()
+        touch_config_marker()
         logger.info("配置保存成功")
         flash('设置已成功保存！', 'success')
     except Exception as e:
@@ -0,0 +1,323 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from database import connect, DB_PATH
+from nfo_catalog import open_atomic, file_umask
+
+# 图片缓存目录，图片按内容哈希存放（相同内容只保存一份）
+ARTWORK_CACHE_DIR = '/config/artwork_cache'
+# 图片缓存容量上限（字节），超过上限时按缓存时间从旧到新删除（媒体目录中的图片是独立副本，不受影响）
+ARTWORK_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# 同时下载的图片数，也是连接池中每个主机保留的连接数
+ARTWORK_MAX_WORKERS = 4
+# 下载时每次读取的字节数
+ARTWORK_CHUNK_SIZE = 256 * 1024
+# 下载超时时间（秒）
+ARTWORK_REQUEST_TIMEOUT = 30
+# Linux 的 FICLONE ioctl：在 btrfs、xfs 等文件系统上创建共享数据块的副本（reflink，写时复制）
+FICLONE = 0x40049409
+
+# TMDB 图片地址中尺寸和文件路径的前缀，如 https://image.tmdb.org/t/p/original/abc.jpg
+TMDB_IMAGE_PREFIX = '/t/p/'
+TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p'
+# 网页可通过代理请求的 TMDB 图片尺寸（由 TMDB 按尺寸缩放后提供）
+TMDB_IMAGE_SIZES = ('w92', 'w154', 'w185', 'w300', 'w342', 'w500', 'w780', 'w1280', 'h632', 'original')
+
+# 网页图片缓存目录及容量上限（字节），超过上限时删除最久未访问的图片
+THUMBNAIL_CACHE_DIR = '/config/thumbnail_cache'
+THUMBNAIL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 缓存命中时，距上次更新超过该时长（秒）才刷新文件修改时间，重启后按修改时间恢复访问顺序
+THUMBNAIL_TOUCH_INTERVAL = 24 * 3600
+
+def cache_key(url):
+    """TMDB 图片以尺寸和文件路径（如 original/abc.jpg）为键，与图片服务器域名无关；其他图片以完整地址为键"""
+    path = urlsplit(url).path
+    if path.startswith(TMDB_IMAGE_PREFIX):
+        return path[len(TMDB_IMAGE_PREFIX):]
+    return url
+
+def clone_or_copy(source, save_path):
+    """
+    将缓存中的图片放到媒体目录：支持 reflink 的文件系统上创建写时复制的副本，否则复制文件。
+    不使用硬链接：媒体服务器原地改写媒体目录中的图片时，不能影响缓存和其他目录中的同一图片。
+    """
+    with open(source, 'rb') as src, open_atomic(save_path) as dst:
+        try:
+            import fcntl
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except (ImportError, OSError):
+            shutil.copyfileobj(src, dst, ARTWORK_CHUNK_SIZE)
+
+class ArtworkCache:
+    """
+    海报、背景图、Logo 等图片的本地缓存：
+    1. 图片按内容的 SHA-256 存放在缓存目录中，ARTWORK_CACHE 表记录图片地址对应的内容哈希。
+    2. 已缓存的图片不再下载，以 reflink 或复制的方式放到媒体目录；缓存文件只读，命中时校验文件大小。
+    3. 下载使用带连接池的会话和较大的读取块，可并发下载；同一图片同时只下载一次。
+    4. 总大小超过 ARTWORK_CACHE_MAX_BYTES 时由 prune 按缓存时间从旧到新淘汰。
+    """
+    def __init__(self, cache_dir=ARTWORK_CACHE_DIR, db_path=DB_PATH, max_workers=ARTWORK_MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def object_path(self, content_hash, ext):
+        return os.path.join(self.cache_dir, content_hash[:2], content_hash + (ext or ''))
+
+    def key_lock(self, key):
+        with self.locks_lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def lookup(self, key):
+        """返回已缓存图片的路径，未缓存、缓存文件已被删除或大小与索引不符时返回 None"""
+        try:
+            with connect(self.db_path) as conn:
+                row = conn.execute('SELECT CONTENT_HASH, EXT, SIZE FROM ARTWORK_CACHE WHERE KEY = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"读取图片缓存索引失败: {e}")
+            return None
+        if not row:
+            return None
+        content_hash, ext, size = row
+        path = self.object_path(content_hash, ext)
+        try:
+            if os.path.getsize(path) == size:
+                return path
+        except OSError:
+            return None
+        # 缓存文件被改写过，删除后重新下载
+        logging.warning(f"图片缓存文件大小与索引不符，将重新下载: {path}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    def get(self, url):
+        """返回图片在缓存中的路径，未缓存时下载，下载失败时返回 None"""
+        key = cache_key(url)
+        with self.key_lock(key):
+            path = self.lookup(key)
+            if path:
+                logging.debug(f"图片缓存命中: {url}")
+                return path
+            return self.download(url, key)
+
+    def download(self, url, key):
+        """下载图片到缓存目录并登记索引"""
+        ext = os.path.splitext(urlsplit(url).path)[1].lower()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=self.cache_dir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                with self.session.get(url, stream=True, timeout=ARTWORK_REQUEST_TIMEOUT) as response:
+                    if response.status_code != 200:
+                        logging.warning(f"下载失败，状态码: {response.status_code} - {url}")
+                        os.remove(temp_path)
+                        return None
+                    for chunk in response.iter_content(ARTWORK_CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            content_hash = digest.hexdigest()
+            path = self.object_path(content_hash, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 缓存文件只读，防止被意外改写
+            os.chmod(temp_path, 0o444 & ~file_umask())
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.error(f"下载图片时出错: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            with connect(self.db_path) as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO ARTWORK_CACHE (KEY, CONTENT_HASH, EXT, SIZE, CREATED_AT) VALUES (?, ?, ?, ?, ?)',
+                    (key, content_hash, ext, size, int(time.time()))
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"写入图片缓存索引失败: {e}")
+        return path
+
+    def save(self, url, save_path):
+        """将图片保存到指定路径，返回是否成功"""
+        source = self.get(url)
+        if not source:
+            return False
+        try:
+            clone_or_copy(source, save_path)
+        except OSError as e:
+            logging.error(f"保存图片失败: {save_path} ({e})")
+            return False
+        logging.info(f"图片已保存: {save_path}")
+        return True
+
+    def save_many(self, images):
+        """并发保存多张图片，images 为 (图片地址, 保存路径) 列表"""
+        if not images:
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda image: self.save(*image), images))
+
+    def prune(self, max_bytes=ARTWORK_CACHE_MAX_BYTES):
+        """缓存总大小超过上限时，按缓存时间从旧到新删除图片及其索引"""
+        try:
+            with connect(self.db_path) as conn:
+                rows = conn.execute(
+                    'SELECT CONTENT_HASH, EXT, MAX(SIZE), MIN(CREATED_AT) FROM ARTWORK_CACHE '
+                    'GROUP BY CONTENT_HASH, EXT ORDER BY MIN(CREATED_AT)'
+                ).fetchall()
+                total = sum(size or 0 for _, _, size, _ in rows)
+                evicted = []
+                for content_hash, ext, size, created_at in rows:
+                    if total <= max_bytes:
+                        break
+                    evicted.append((content_hash, ext))
+                    total -= size or 0
+                conn.executemany('DELETE FROM ARTWORK_CACHE WHERE CONTENT_HASH = ? AND EXT IS ?', evicted)
+        except sqlite3.Error as e:
+            logging.warning(f"清理图片缓存失败: {e}")
+            return
+        for content_hash, ext in evicted:
+            try:
+                os.remove(self.object_path(content_hash, ext))
+            except OSError:
+                pass
+        if evicted:
+            logging.info(f"图片缓存超过容量上限，已删除 {len(evicted)} 张最早缓存的图片")
+
+class ThumbnailCache:
+    """
+    网页使用的 TMDB 图片缓存：
+    1. 按“尺寸/文件名”保存 TMDB 对应尺寸的图片，同一图片只下载一次。
+    2. 总大小超过上限时按最近访问顺序淘汰（LRU），访问顺序在内存中维护，启动时按文件修改时间恢复。
+    """
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES,
+                 max_workers=ARTWORK_MAX_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.entries = None
+        self.total = 0
+        self.locks = {}
+
+    def load(self):
+        """扫描缓存目录，按修改时间从旧到新排列（调用时需持有 self.lock）"""
+        files = []
+        for size in TMDB_IMAGE_SIZES:
+            size_dir = os.path.join(self.cache_dir, size)
+            if not os.path.isdir(size_dir):
+                continue
+            with os.scandir(size_dir) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        st = entry.stat()
+                        files.append((st.st_mtime, entry.path, st.st_size))
+        files.sort()
+        self.entries = OrderedDict((path, (file_size, mtime)) for mtime, path, file_size in files)
+        self.total = sum(file_size for file_size, mtime in self.entries.values())
+
+    def hit(self, path):
+        """返回已缓存图片的路径并记录访问，未缓存时返回 None"""
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            self.entries.move_to_end(path)
+            file_size, mtime = entry
+            now = time.time()
+            if now - mtime < THUMBNAIL_TOUCH_INTERVAL:
+                return path
+            self.entries[path] = (file_size, now)
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # 文件已被外部删除
+            with self.lock:
+                if self.entries.pop(path, None):
+                    self.total -= file_size
+            return None
+        except OSError:
+            pass
+        return path
+
+    def add(self, path, file_size):
+        """登记新下载的图片，超出容量时淘汰最久未访问的图片"""
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.total -= old[0]
+            self.entries[path] = (file_size, time.time())
+            self.total += file_size
+            evicted = []
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                old_path, (old_size, mtime) = self.entries.popitem(last=False)
+                self.total -= old_size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+        if evicted:
+            logging.debug(f"图片缓存超过容量上限，已删除 {len(evicted)} 张最久未访问的图片")
+
+    def get(self, size, file_name):
+        """返回图片的本地路径，未缓存时从 TMDB 下载，下载失败时返回 None"""
+        path = os.path.join(self.cache_dir, size, file_name)
+        if self.hit(path):
+            return path
+        with self.lock:
+            key_lock = self.locks.setdefault(path, threading.Lock())
+        try:
+            with key_lock:
+                # 等待期间其他线程可能已下载完成
+                if self.hit(path):
+                    return path
+                url = f"{TMDB_IMAGE_BASE_URL}/{size}/{file_name}"
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    with self.session.get(url, timeout=ARTWORK_REQUEST_TIMEOUT) as response:
+                        if response.status_code != 200:
+                            logging.warning(f"下载失败，状态码: {response.status_code} - {url}")
+                            return None
+                        data = response.content
+                    with open_atomic(path) as f:
+                        f.write(data)
+                except Exception as e:
+                    logging.error(f"下载图片时出错: {url} ({e})")
+                    return None
+        finally:
+            # 无论下载成功与否都移除该图片的锁，避免下载失败的图片在长期运行的 Web 进程中累积
+            with self.lock:
+                self.locks.pop(path, None)
+        self.add(path, len(data))
+        return path
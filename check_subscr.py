@@ -1,34 +1,32 @@
 import sqlite3
 import logging
-import json
 import requests
-import random
-import time
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,  # 设置日志级别为 INFO
-    format="%(asctime)s - %(levelname)s - %(message)s",  # 设置日志格式
-    handlers=[
-        logging.FileHandler("/tmp/log/check_subscr.log", mode='w'),  # 输出到文件并清空之前的日志
-        logging.StreamHandler()  # 输出到控制台
-    ]
-)
-
-def load_config(db_path):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from notifier import NotificationQueue
+from tv_episodes import parse_episodes, format_episodes, get_library_episodes, load_library_seasons, season_key
+from database import connect, load_config
+from api_cache import ApiCache, RateLimiter
+
+# TMDB 请求间隔（秒）和超时时间（秒），所有线程共享同一个限速器
+TMDB_REQUEST_INTERVAL = 0.1
+TMDB_REQUEST_TIMEOUT = 10
+# 同时查询 TMDB 的线程数（请求仍受限速器约束）
+TMDB_MAX_WORKERS = 4
+# TMDB 搜索结果的缓存有效期（秒），未找到的结果缓存时间较短以便重试
+TMDB_SEARCH_CACHE_TTL = 30 * 24 * 3600
+TMDB_NOT_FOUND_CACHE_TTL = 3 * 24 * 3600
+# TMDB 各季集数的缓存有效期（秒），播出中的剧集集数会增加
+TMDB_SEASON_CACHE_TTL = 24 * 3600
+
+# 异步通知队列，订阅变化在后台合并发送（作为模块导入、未执行 main() 时从数据库读取配置）
+notifier = NotificationQueue("订阅通知", lambda: globals().get('config') or load_config())
+
+tmdb_session = requests.Session()
+tmdb_session.mount('https://', HTTPAdapter(pool_connections=TMDB_MAX_WORKERS, pool_maxsize=TMDB_MAX_WORKERS))
+tmdb_limiter = RateLimiter(TMDB_REQUEST_INTERVAL)
+tmdb_search_cache = ApiCache('tmdb_subscription_search', TMDB_SEARCH_CACHE_TTL)
+tmdb_season_cache = ApiCache('tmdb_season_episodes', TMDB_SEASON_CACHE_TTL)
 
 def subscribe_movies(cursor):
     """订阅电影 - 根据状态决定是否订阅"""
@@ -64,20 +62,114 @@ def subscribe_movies(cursor):
         else:
             logging.info(f"影片：{title}（{year}) 已入库，无需下载订阅！")
 
-def subscribe_tvs(cursor):
+class MissTvs:
+    """
+    MISS_TVS 表的内存副本：按（标题, 年份, 季）或豆瓣ID查找和修改订阅，
+    修改只记录在内存中，最后由 save() 用 executemany 一次性写回。
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.rows = {}
+        self.original = {}
+        # 豆瓣ID到订阅键的索引，记录删除后不会从索引中移除，使用前需核对
+        self.douban_keys = {}
+        self.new_rows = 0
+        for record_id, title, year, season, missing_episodes, douban_id in cursor.execute(
+            'SELECT id, title, year, season, missing_episodes, douban_id FROM MISS_TVS'
+        ).fetchall():
+            self.put([record_id, title, year, season, missing_episodes, douban_id])
+            self.original[record_id] = (missing_episodes, douban_id)
+
+    @staticmethod
+    def key(title, year, season, record_id=None):
+        # 年份或季为空时 SQL 的等值比较不会匹配，这类记录只能按豆瓣ID删除
+        if year is None or season is None:
+            return ('id', record_id)
+        return (title, year, season)
+
+    def get(self, title, year, season):
+        """返回订阅的缺失集数，未订阅时返回 None"""
+        if year is None or season is None:
+            return None
+        row = self.rows.get((title, year, season))
+        return row[4] if row else None
+
+    def exists(self, title, year, season):
+        return year is not None and season is not None and (title, year, season) in self.rows
+
+    def put(self, row):
+        record_id, title, year, season, missing_episodes, douban_id = row
+        if record_id is None:
+            self.new_rows += 1
+            record_id = -self.new_rows
+        key = self.key(title, year, season, record_id)
+        self.rows[key] = row
+        if douban_id is not None:
+            self.douban_keys.setdefault(douban_id, set()).add(key)
+
+    def add(self, title, year, season, missing_episodes, douban_id):
+        self.put([None, title, year, season, missing_episodes, douban_id])
+
+    def update(self, title, year, season, missing_episodes):
+        if self.exists(title, year, season):
+            self.rows[(title, year, season)][4] = missing_episodes
+
+    def remove(self, title, year, season):
+        if self.exists(title, year, season):
+            del self.rows[(title, year, season)]
+
+    def remove_douban(self, douban_id):
+        """删除该豆瓣ID的所有订阅，返回是否有订阅被删除"""
+        if douban_id is None:
+            return False
+        keys = [key for key in self.douban_keys.pop(douban_id, ())
+                if key in self.rows and self.rows[key][5] == douban_id]
+        for key in keys:
+            del self.rows[key]
+        return bool(keys)
+
+    def save(self):
+        """写回所有变化：先删除，再更新，最后插入新订阅"""
+        current = {row[0] for row in self.rows.values() if row[0] is not None}
+        deleted = [(record_id,) for record_id in self.original if record_id not in current]
+        updated = [
+            (missing_episodes, douban_id, record_id)
+            for record_id, title, year, season, missing_episodes, douban_id in self.rows.values()
+            if record_id is not None and self.original[record_id] != (missing_episodes, douban_id)
+        ]
+        inserted = [tuple(row[1:]) for row in self.rows.values() if row[0] is None]
+        self.cursor.executemany('DELETE FROM MISS_TVS WHERE id = ?', deleted)
+        self.cursor.executemany('UPDATE MISS_TVS SET missing_episodes = ?, douban_id = ? WHERE id = ?', updated)
+        self.cursor.executemany(
+            'INSERT INTO MISS_TVS (title, year, season, missing_episodes, douban_id) VALUES (?, ?, ?, ?, ?)',
+            inserted
+        )
+
+def load_library(cursor):
+    """读取订阅（含别名映射的目标剧集）涉及的剧集在媒体库中每一季的已入库集数"""
+    titles = {row[0] for row in cursor.execute('''
+        SELECT title FROM RSS_TVS
+        UNION SELECT title FROM MISS_TVS
+        UNION SELECT TARGET_TITLE FROM LIB_TV_ALIAS
+    ''').fetchall()}
+    return load_library_seasons(cursor, titles)
+
+def subscribe_tvs(cursor, library):
     """订阅电视剧 - 支持别名关联和状态检查"""
-    cursor.execute('SELECT title, season, episode, year, douban_id, status FROM RSS_TVS')
+    lib_titles, lib_seasons = library
+    # 一次查询读取所有豆瓣订阅及其别名关联
+    cursor.execute('''
+        SELECT r.title, r.season, r.episode, r.year, r.douban_id, r.status, a.ID, a.TARGET_TITLE, a.TARGET_SEASON
+        FROM RSS_TVS r
+        LEFT JOIN LIB_TV_ALIAS a ON a.ALIAS = r.title
+    ''')
     rss_tvs = cursor.fetchall()
+    miss_tvs = MissTvs(cursor)
 
-    for title, season, total_episodes, year, douban_id, status in rss_tvs:
+    for title, season, total_episodes, year, douban_id, status, alias_id, target_title, target_season in rss_tvs:
         # 如果状态是"看过"，则不应订阅，如果已在订阅中则应移除
         if status == "看过":
-            # 检查是否在 MISS_TVS 中，如果在则移除
-            existing_in_miss = cursor.execute(
-                'SELECT 1 FROM MISS_TVS WHERE douban_id = ?', (douban_id,)
-            ).fetchone()
-            if existing_in_miss:
-                cursor.execute('DELETE FROM MISS_TVS WHERE douban_id = ?', (douban_id,))
+            if miss_tvs.remove_douban(douban_id):
                 logging.info(f"电视剧：{title} 第{season}季 状态为'看过'，已从订阅列表中移除")
                 send_notification(f"电视剧：{title} 第{season}季 状态为'看过'，已从订阅列表中移除")
             else:
@@ -94,79 +186,35 @@ def subscribe_tvs(cursor):
             logging.warning(f"电视剧：{title} 第{season}季 总集数无效（{total_episodes}），跳过处理！")
             continue
 
-        # 检查是否存在别名关联
-        alias_row = cursor.execute(
-            'SELECT TARGET_TITLE, TARGET_SEASON FROM LIB_TV_ALIAS WHERE ALIAS = ?', 
-            (title,)
-        ).fetchone()
-        
-        # 确定实际要检查的剧集标题和季数
-        actual_title = alias_row[0] if alias_row else title
-        actual_season = alias_row[1] if alias_row else season
+        # 确定实际要检查的剧集标题和季数（存在别名关联时使用映射的标题和季数）
+        actual_title = target_title if alias_id is not None else title
+        actual_season = target_season if alias_id is not None else season
         
         # 检查是否已经存在于 MISS_TVS 表中（使用原始标题和季数）
-        miss_row = cursor.execute(
-            'SELECT missing_episodes FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?',
-            (title, year, season)
-        ).fetchone()
+        miss_row = miss_tvs.exists(title, year, season)
+        subscribed_missing = parse_episodes(miss_tvs.get(title, year, season))
+        total_episodes_set = set(range(1, total_episodes + 1))
         
         # 检查LIB_TVS中是否已存在（使用实际标题，不匹配年份）
-        lib_exists = cursor.execute('SELECT 1 FROM LIB_TVS WHERE title = ?', (actual_title,)).fetchone()
-        
-        if not lib_exists:
+        if actual_title not in lib_titles:
             # 完全未入库的情况
-            missing_episodes_str = ','.join(map(str, range(1, total_episodes + 1)))
             if not miss_row:
                 # 完全新订阅
-                cursor.execute(
-                    'INSERT INTO MISS_TVS (title, year, season, missing_episodes, douban_id) VALUES (?, ?, ?, ?, ?)',
-                    (title, year, season, missing_episodes_str, douban_id)
-                )
+                miss_tvs.add(title, year, season, format_episodes(total_episodes_set), douban_id)
                 logging.info(f"电视剧：{title} 第{season}季 已添加订阅！")
                 send_notification(f"电视剧：{title} 第{season}季 已添加订阅！")
+            elif len(total_episodes_set) != len(subscribed_missing):
+                # 已存在订阅且总集数发生变化，更新缺失集数为最新的总集数范围
+                miss_tvs.update(title, year, season, format_episodes(total_episodes_set))
+                logging.info(f"电视剧：{title} 第{season}季 总集数已更新为{total_episodes}集，已更新订阅！")
             else:
-                # 已存在订阅，检查是否需要更新（总集数是否变化）
-                subscribed_missing = set(int(ep) for ep in miss_row[0].split(',') if ep.strip().isdigit()) if miss_row[0] else set()
-                total_episodes_set = set(range(1, total_episodes + 1))
-                
-                # 如果总集数发生变化，则更新
-                if len(total_episodes_set) != len(subscribed_missing):
-                    # 更新缺失集数为最新的总集数范围
-                    new_missing_episodes_str = ','.join(map(str, sorted(total_episodes_set)))
-                    cursor.execute(
-                        'UPDATE MISS_TVS SET missing_episodes = ? WHERE title = ? AND year = ? AND season = ?',
-                        (new_missing_episodes_str, title, year, season)
-                    )
-                    logging.info(f"电视剧：{title} 第{season}季 总集数已更新为{total_episodes}集，已更新订阅！")
-                else:
-                    logging.warning(f"电视剧：{title} 第{season}季 已存在于订阅列表中，跳过插入。")
+                logging.warning(f"电视剧：{title} 第{season}季 已存在于订阅列表中，跳过插入。")
         else:
             # 部分或全部已入库的情况
             # 使用实际标题和季数查询已存在的集数（不匹配年份）
-            existing_episodes_str = cursor.execute(
-                '''SELECT episodes FROM LIB_TV_SEASONS WHERE tv_id = (SELECT id FROM LIB_TVS WHERE title = ?) AND season = ?''',
-                (actual_title, actual_season)
-            ).fetchone()
-
-            if existing_episodes_str:
-                val = existing_episodes_str[0]
-                if isinstance(val, int):
-                    existing_episodes = set([val])
-                elif isinstance(val, str):
-                    existing_episodes = set(int(ep) for ep in val.split(',') if ep.strip().isdigit())
-                else:
-                    existing_episodes = set()
-            else:
-                existing_episodes = set()
-                
-            total_episodes_set = set(range(1, total_episodes + 1))
+            existing_episodes = lib_seasons.get((actual_title, season_key(actual_season))) or set()
             missing_episodes_set = total_episodes_set - existing_episodes
 
-            if miss_row and miss_row[0]:
-                subscribed_missing = set(int(ep) for ep in miss_row[0].split(',') if ep.strip().isdigit())
-            else:
-                subscribed_missing = set()
-
             # 检查RSS_TVS中的总集数是否与当前订阅表中的总集数一致
             current_subscribed_total = len(subscribed_missing) + len(existing_episodes)
             
@@ -177,181 +225,166 @@ def subscribe_tvs(cursor):
                 # 如果总集数发生了变化，或者需要添加新的缺失集
                 if len(total_episodes_set) != current_subscribed_total or need_add_missing:
                     # 合并后写回
-                    new_missing_episodes = sorted(subscribed_missing | need_add_missing)
-                    new_missing_episodes_str = ','.join(map(str, new_missing_episodes))
-                    cursor.execute(
-                        'UPDATE MISS_TVS SET missing_episodes = ? WHERE title = ? AND year = ? AND season = ?',
-                        (new_missing_episodes_str, title, year, season)
-                    )
+                    new_missing_episodes_str = format_episodes(subscribed_missing | need_add_missing)
+                    miss_tvs.update(title, year, season, new_missing_episodes_str)
                     logging.info(f"电视剧：{title} 第{season}季 缺失 {new_missing_episodes_str} 集，已更新订阅！")
                 elif not missing_episodes_set:
                     # 没有缺失集，删除订阅
-                    cursor.execute(
-                        'DELETE FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?',
-                        (title, year, season)
-                    )
+                    miss_tvs.remove(title, year, season)
                     logging.info(f"电视剧：{title} 第{season}季 已入库，无需下载订阅！")
                 else:
                     logging.info(f"电视剧：{title} 第{season}季 订阅未发生变化！")
-            else:
+            elif missing_episodes_set:
                 # 如果订阅表中没有记录且有缺失集，则插入
-                if missing_episodes_set:
-                    new_missing_episodes_str = ','.join(map(str, sorted(missing_episodes_set)))
-                    cursor.execute(
-                        'INSERT INTO MISS_TVS (title, year, season, missing_episodes, douban_id) VALUES (?, ?, ?, ?, ?)',
-                        (title, year, season, new_missing_episodes_str, douban_id)
-                    )
-                    logging.info(f"电视剧：{title} 第{season}季 缺失 {new_missing_episodes_str} 集，已补充订阅！")
-
-def update_subscriptions(cursor):
-    """检查并更新当前订阅 - 支持别名关联"""
-    # 检查并删除已入库的电影
-    cursor.execute('SELECT title, year FROM MISS_MOVIES')
-    miss_movies = cursor.fetchall()
+                new_missing_episodes_str = format_episodes(missing_episodes_set)
+                miss_tvs.add(title, year, season, new_missing_episodes_str, douban_id)
+                logging.info(f"电视剧：{title} 第{season}季 缺失 {new_missing_episodes_str} 集，已补充订阅！")
 
-    for title, year in miss_movies:
-        if cursor.execute('SELECT 1 FROM LIB_MOVIES WHERE title = ? AND year = ?', (title, year)).fetchone():
-            cursor.execute('DELETE FROM MISS_MOVIES WHERE title = ? AND year = ?', (title, year))
-            logging.info(f"影片：{title}（{year}) 已完成订阅！")
-            send_notification(f"影片：{title}（{year}) 已完成订阅！")
+    miss_tvs.save()
 
-    # 检查并删除已完整订阅的电视剧
-    cursor.execute('SELECT id, title, year, season, missing_episodes FROM MISS_TVS')
-    miss_tvs = cursor.fetchall()
-
-    for record_id, title, year, season, missing_episodes in miss_tvs:
-        # 检查是否存在别名关联
-        alias_row = cursor.execute(
-            'SELECT TARGET_TITLE, TARGET_SEASON FROM LIB_TV_ALIAS WHERE ALIAS = ?', 
-            (title,)
-        ).fetchone()
-        
-        if alias_row:
-            # 存在别名关联，使用映射的标题和季数
-            actual_title, actual_season = alias_row
+def remove_library_episodes(cursor, miss_tvs, lib_seasons):
+    """
+    从订阅的缺失集数中去掉已入库的集数，批量删除已完成的订阅、更新有变化的订阅。
+    miss_tvs 为 (ID, 缺失集数, 实际标题, 实际季) 列表，返回 {ID: (结果, 新的缺失集数)}，
+    结果为 completed（已完成）、changed（已更新）、unchanged（未变化）或 not_found（媒体库中没有对应的季）。
+    """
+    results = {}
+    for record_id, missing_episodes, actual_title, actual_season in miss_tvs:
+        existing_episodes = lib_seasons.get((actual_title, season_key(actual_season)))
+        if existing_episodes is None:
+            results[record_id] = ('not_found', missing_episodes)
+            continue
+        # 只保留还未入库的缺失集数
+        new_missing_episodes_set = parse_episodes(missing_episodes) - existing_episodes
+        new_missing_episodes_str = format_episodes(new_missing_episodes_set)
+        if not new_missing_episodes_set:
+            results[record_id] = ('completed', new_missing_episodes_str)
+        elif new_missing_episodes_str != missing_episodes:  # 检查是否发生变化
+            results[record_id] = ('changed', new_missing_episodes_str)
         else:
-            # 无别名关联，使用原值
-            actual_title, actual_season = title, season
-        
-        # 使用实际标题和季数查询已存在的集数（不匹配年份）
-        existing_episodes_str = cursor.execute(
-            '''SELECT episodes FROM LIB_TV_SEASONS 
-               WHERE tv_id = (SELECT id FROM LIB_TVS WHERE title = ?) AND season = ?''',
-            (actual_title, actual_season)
-        ).fetchone()
-
-        if existing_episodes_str:
-            # 兼容 episodes 字段为 int 或 str
-            val = existing_episodes_str[0]
-            if isinstance(val, int):
-                existing_episodes = set([val])
-            elif isinstance(val, str):
-                try:
-                    existing_episodes = set(int(ep) for ep in val.split(',') if ep.strip().isdigit())
-                except ValueError as e:
-                    logging.error(f"无效的集数数据：{val}，跳过处理。")
-                    continue
-            else:
-                existing_episodes = set()
+            results[record_id] = ('unchanged', missing_episodes)
+    cursor.executemany(
+        'DELETE FROM MISS_TVS WHERE id = ?',
+        [(record_id,) for record_id, (result, episodes) in results.items() if result == 'completed']
+    )
+    cursor.executemany(
+        'UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?',
+        [(episodes, record_id) for record_id, (result, episodes) in results.items() if result == 'changed']
+    )
+    return results
 
-            if missing_episodes:
-                missing_episodes_set = set(map(int, missing_episodes.split(',')))
-            else:
-                missing_episodes_set = set()
+def complete_movies(cursor, movies=None, notify=None):
+    """删除已入库的电影订阅，movies 为 (标题, 年份) 列表，不为空时只检查这些电影"""
+    notify = notify or send_notification
+    query = '''
+        SELECT mm.id, mm.title, mm.year
+        FROM MISS_MOVIES mm
+        WHERE EXISTS (SELECT 1 FROM LIB_MOVIES lm WHERE lm.title = mm.title AND lm.year = mm.year)
+    '''
+    params = []
+    if movies is not None:
+        if not movies:
+            return
+        query += ' AND (mm.title, mm.year) IN (VALUES {})'.format(','.join(['(?, ?)'] * len(movies)))
+        params = [value for movie in movies for value in movie]
+    cursor.execute(query, params)
+    completed_movies = cursor.fetchall()
+    cursor.executemany('DELETE FROM MISS_MOVIES WHERE id = ?', [(movie_id,) for movie_id, title, year in completed_movies])
+    for movie_id, title, year in completed_movies:
+        logging.info(f"影片：{title}（{year}) 已完成订阅！")
+        notify(f"影片：{title}（{year}) 已完成订阅！")
 
-            # 只保留还未入库的缺失集数
-            new_missing_episodes_set = missing_episodes_set - existing_episodes
+def reconcile_tv_subscriptions(cursor, lib_seasons, titles=None, notify=None):
+    """
+    按已入库集数更新订阅中的电视剧（存在别名关联时使用映射的标题和季数），
+    titles 不为空时只处理标题（或别名映射的目标标题）在其中的订阅。
+    """
+    notify = notify or send_notification
+    query = '''
+        SELECT mt.id, mt.title, mt.season, mt.missing_episodes, lta.ID IS NOT NULL,
+               COALESCE(lta.TARGET_TITLE, mt.title),
+               CASE WHEN lta.ID IS NULL THEN mt.season ELSE lta.TARGET_SEASON END
+        FROM MISS_TVS mt
+        LEFT JOIN LIB_TV_ALIAS lta ON mt.title = lta.ALIAS
+    '''
+    params = []
+    if titles is not None:
+        if not titles:
+            return
+        params = list(titles)
+        query += ' WHERE COALESCE(lta.TARGET_TITLE, mt.title) IN ({})'.format(','.join(['?'] * len(params)))
+    cursor.execute(query + ' ORDER BY mt.id', params)
+    miss_tvs = cursor.fetchall()
+    results = remove_library_episodes(
+        cursor, [(row[0], row[3], row[5], row[6]) for row in miss_tvs], lib_seasons
+    )
 
-            if not new_missing_episodes_set:
-                cursor.execute('DELETE FROM MISS_TVS WHERE id = ?', (record_id,))
-                if alias_row:
-                    logging.info(f"电视剧：{title} 第{season}季（映射到 {actual_title} 第{actual_season}季）已完成订阅！")
-                    send_notification(f"电视剧：{title} 第{season}季（映射到 {actual_title} 第{actual_season}季）已完成订阅！")
-                else:
-                    logging.info(f"电视剧：{title} 第{season}季 已完成订阅！")
-                    send_notification(f"电视剧：{title} 第{season}季 已完成订阅！")
-            else:
-                new_missing_episodes_str = ','.join(map(str, sorted(new_missing_episodes_set)))
-                if new_missing_episodes_str != missing_episodes:  # 检查是否发生变化
-                    cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?', 
-                                 (new_missing_episodes_str, record_id))
-                    if alias_row:
-                        logging.info(f"电视剧：{title} 第{season}季（映射到 {actual_title} 第{actual_season}季）缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                        send_notification(f"电视剧：{title} 第{season}季（映射到 {actual_title} 第{actual_season}季）缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                    else:
-                        logging.info(f"电视剧：{title} 第{season}季 缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                        send_notification(f"电视剧：{title} 第{season}季 缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                else:
-                    logging.info(f"电视剧：{title} 第{season}季 订阅未发生变化！")
+    for record_id, title, season, missing_episodes, is_alias, actual_title, actual_season in miss_tvs:
+        result, new_missing_episodes_str = results[record_id]
+        mapping = f"（映射到 {actual_title} 第{actual_season}季）" if is_alias else " "
+        if result == 'completed':
+            logging.info(f"电视剧：{title} 第{season}季{mapping}已完成订阅！")
+            notify(f"电视剧：{title} 第{season}季{mapping}已完成订阅！")
+        elif result == 'changed':
+            logging.info(f"电视剧：{title} 第{season}季{mapping}缺失 {new_missing_episodes_str} 集，已更新订阅！")
+            notify(f"电视剧：{title} 第{season}季{mapping}缺失 {new_missing_episodes_str} 集，已更新订阅！")
         else:
-            # 目标剧集不存在，检查是否应该更新别名映射
-            if alias_row:
+            if result == 'not_found' and is_alias:
                 logging.debug(f"电视剧：{title} 第{season}季 映射到 {actual_title} 第{actual_season}季，但目标剧集不存在")
             logging.info(f"电视剧：{title} 第{season}季 订阅未发生变化！")
 
-def update_alias_subscriptions(cursor):
+def update_subscriptions(cursor, library):
+    """检查并更新当前订阅 - 支持别名关联"""
+    # 检查并删除已入库的电影
+    complete_movies(cursor)
+    # 检查并删除已完整订阅的电视剧
+    reconcile_tv_subscriptions(cursor, library[1])
+
+def refresh_library_subscriptions(cursor, tv_titles=(), movies=(), notify=None):
+    """
+    媒体库新增文件后只更新受影响的订阅（由文件转移程序调用，无需全量检查）：
+    tv_titles 为有新增集数的剧集标题，movies 为新入库的 (标题, 年份) 列表。
+    """
+    if tv_titles:
+        lib_seasons = load_library_seasons(cursor, tv_titles)[1]
+        reconcile_tv_subscriptions(cursor, lib_seasons, tv_titles, notify)
+    if movies:
+        complete_movies(cursor, movies, notify)
+
+def update_alias_subscriptions(cursor, library):
     """更新别名订阅记录，将别名映射到实际剧集"""
+    lib_titles, lib_seasons = library
     # 查找所有在MISS_TVS中存在别名关联的记录
     cursor.execute('''
-        SELECT mt.id, mt.title, mt.season, mt.missing_episodes, mt.year, lta.TARGET_TITLE, lta.TARGET_SEASON
+        SELECT mt.id, mt.title, mt.season, mt.missing_episodes, lta.TARGET_TITLE, lta.TARGET_SEASON
         FROM MISS_TVS mt
         JOIN LIB_TV_ALIAS lta ON mt.title = lta.ALIAS
     ''')
-    
     alias_records = cursor.fetchall()
-    
-    for record_id, alias_title, alias_season, missing_episodes, year, target_title, target_season in alias_records:
-        # 检查目标剧集是否存在（不匹配年份）
-        lib_tv_row = cursor.execute(
-            'SELECT id FROM LIB_TVS WHERE title = ?', (target_title,)
-        ).fetchone()
-        
-        if lib_tv_row:
-            tv_id = lib_tv_row[0]
-            # 检查目标剧集的对应季数是否存在
-            lib_season_row = cursor.execute(
-                'SELECT episodes FROM LIB_TV_SEASONS WHERE tv_id = ? AND season = ?',
-                (tv_id, target_season)
-            ).fetchone()
-            
-            if lib_season_row:
-                # 获取已存在的集数
-                val = lib_season_row[0]
-                if isinstance(val, int):
-                    existing_episodes = set([val])
-                elif isinstance(val, str):
-                    existing_episodes = set(int(ep) for ep in val.split(',') if ep.strip().isdigit())
-                else:
-                    existing_episodes = set()
-                
-                # 计算还缺失的集数
-                if missing_episodes:
-                    missing_episodes_set = set(int(ep) for ep in missing_episodes.split(',') if ep.strip().isdigit())
-                else:
-                    missing_episodes_set = set()
-                
-                # 只保留还未入库的缺失集数
-                new_missing_episodes_set = missing_episodes_set - existing_episodes
-                
-                if not new_missing_episodes_set:
-                    # 所有集数都已入库，删除订阅记录
-                    cursor.execute('DELETE FROM MISS_TVS WHERE id = ?', (record_id,))
-                    logging.info(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）已完成订阅！")
-                    send_notification(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）已完成订阅！")
-                else:
-                    # 更新缺失集数
-                    new_missing_episodes_str = ','.join(map(str, sorted(new_missing_episodes_set)))
-                    if new_missing_episodes_str != missing_episodes:
-                        cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?', 
-                                     (new_missing_episodes_str, record_id))
-                        logging.info(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                        send_notification(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）缺失 {new_missing_episodes_str} 集，已更新订阅！")
-                    else:
-                        logging.info(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）订阅未发生变化！")
-            else:
-                logging.info(f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）订阅未发生变化！")
-        else:
+
+    # 只处理目标剧集存在（不匹配年份）的记录
+    results = remove_library_episodes(
+        cursor,
+        [(record[0], record[3], record[4], record[5]) for record in alias_records if record[4] in lib_titles],
+        lib_seasons
+    )
+
+    for record_id, alias_title, alias_season, missing_episodes, target_title, target_season in alias_records:
+        if record_id not in results:
             logging.info(f"目标剧集 {target_title} 不存在，无法更新别名订阅记录")
+            continue
+        result, new_missing_episodes_str = results[record_id]
+        mapping = f"电视剧：{alias_title} 第{alias_season}季（映射到 {target_title} 第{target_season}季）"
+        if result == 'completed':
+            # 所有集数都已入库，删除订阅记录
+            logging.info(f"{mapping}已完成订阅！")
+            send_notification(f"{mapping}已完成订阅！")
+        elif result == 'changed':
+            # 更新缺失集数
+            logging.info(f"{mapping}缺失 {new_missing_episodes_str} 集，已更新订阅！")
+            send_notification(f"{mapping}缺失 {new_missing_episodes_str} 集，已更新订阅！")
+        else:
+            logging.info(f"{mapping}订阅未发生变化！")
 
 def update_miss_titles(cursor):
     """检查并更新正在订阅中的标题与豆瓣想看保持一致"""
@@ -386,214 +419,214 @@ def update_miss_titles(cursor):
     else:
         logging.info(f"共更新 {len(movies_to_update)} 个电影和 {len(tvs_to_update)} 个电视剧的标题")
 
+def tmdb_get(url, params):
+    """经过限速器请求 TMDB API，返回 JSON 数据"""
+    tmdb_limiter.wait()
+    resp = tmdb_session.get(url, params=params, timeout=TMDB_REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
+
+def search_tmdb(media_type, title, year):
+    """
+    在 TMDB 搜索电影（movie）或电视剧（tv），返回第一个结果的 (TMDB ID, 标题)，未找到时返回 None。
+    搜索结果（包括未找到）写入持久化缓存。
+    """
+    cache_key = f"{media_type}|{title}|{year}"
+    cached = tmdb_search_cache.get(cache_key)
+    if cached is not None:
+        return tuple(cached) if cached else None
+
+    params = {
+        'api_key': config.get("tmdb_api_key", ""),
+        'query': title,
+        'year': year,
+        'language': 'zh-CN'
+    }
+    search_data = tmdb_get(f"{config.get('tmdb_base_url', '')}/3/search/{media_type}", params)
+    if not search_data.get('results'):
+        tmdb_search_cache.set(cache_key, [], TMDB_NOT_FOUND_CACHE_TTL)
+        return None
+    # 获取最匹配的结果
+    result = search_data['results'][0]
+    found = [result.get('id', ''), result.get('title' if media_type == 'movie' else 'name', '')]
+    tmdb_search_cache.set(cache_key, found)
+    return tuple(found)
+
+def get_season_episode_count(tmdb_id, season):
+    """返回 TMDB 上电视剧某一季的集数"""
+    cache_key = f"{tmdb_id}|{season}"
+    cached = tmdb_season_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    season_data = tmdb_get(f"{config.get('tmdb_base_url', '')}/3/tv/{tmdb_id}/season/{season}",
+                           {'api_key': config.get("tmdb_api_key", "")})
+    episodes_count = len(season_data.get('episodes', []))
+    tmdb_season_cache.set(cache_key, episodes_count)
+    return episodes_count
+
+def run_tmdb_lookups(func, keys):
+    """
+    在线程池中对每组参数执行 TMDB 查询，返回 {参数: 结果}。
+    单个查询出错时记录日志，结果中不包含该参数（下次运行重试）。
+    """
+    results = {}
+    if not keys:
+        return results
+    with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+        futures = {key: executor.submit(func, *key) for key in keys}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except requests.HTTPError as e:
+                logging.error(f"查询TMDB信息 {key} 失败，状态码: {e.response.status_code}")
+            except requests.RequestException as e:
+                logging.error(f"请求TMDB API时发生错误: {e}")
+            except Exception as e:
+                logging.error(f"查询TMDB信息 {key} 时发生未知错误: {e}")
+    return results
+
 def update_tmdb_items(cursor):
-    """检查并更新没有douban_id的电影和电视剧信息"""
-    # 获取TMDB配置
-    TMDB_API_KEY = config.get("tmdb_api_key", "")
-    TMDB_BASE_URL = config.get("tmdb_base_url", "")
-    
-    if not TMDB_API_KEY:
+    """
+    检查并更新没有douban_id的电影和电视剧信息：
+    1. 已记录 TMDB ID 的订阅不再搜索，电视剧只按 TMDB ID 查询该季集数。
+    2. 搜索和季集数查询去重后在线程池中并发请求，经共享限速器控制频率，结果写入持久化缓存。
+    3. 所有请求完成后再更新数据库，并记录解析出的 TMDB ID 和标题。
+    """
+    if not config.get("tmdb_api_key", ""):
         logging.warning("TMDB API Key未配置，跳过TMDB项目检查")
         return
     
-    # 检查没有douban_id的电影
-    cursor.execute('SELECT id, title, year FROM MISS_MOVIES WHERE douban_id IS NULL OR douban_id = ""')
+    cursor.execute('SELECT id, title, year, tmdb_id FROM MISS_MOVIES WHERE douban_id IS NULL OR douban_id = ""')
     movies_without_douban = cursor.fetchall()
+    cursor.execute('SELECT id, title, year, season, missing_episodes, tmdb_id FROM MISS_TVS WHERE douban_id IS NULL OR douban_id = ""')
+    tvs_without_douban = cursor.fetchall()
     
-    for movie_id, local_title, year in movies_without_douban:
+    if not movies_without_douban and not tvs_without_douban:
+        logging.info("没有需要检查的TMDB项目")
+        return
+    
+    # 搜索尚未记录 TMDB ID 的订阅（同一标题和年份只搜索一次）
+    searches = {('movie', title, year) for _, title, year, tmdb_id in movies_without_douban if not tmdb_id}
+    searches |= {('tv', title, year) for _, title, year, _, _, tmdb_id in tvs_without_douban if not tmdb_id}
+    found = run_tmdb_lookups(search_tmdb, searches)
+    
+    # 电视剧使用已记录的 TMDB ID 或本次搜索结果查询各季集数
+    tv_tmdb_ids = {}
+    for tv_id, title, year, season, missing_episodes, tmdb_id in tvs_without_douban:
+        if tmdb_id:
+            tv_tmdb_ids[tv_id] = tmdb_id
+        elif found.get(('tv', title, year)):
+            tv_tmdb_ids[tv_id] = found[('tv', title, year)][0]
+    episode_counts = run_tmdb_lookups(get_season_episode_count, {
+        (tv_tmdb_ids[tv_id], season) for tv_id, _, _, season, _, _ in tvs_without_douban if tv_id in tv_tmdb_ids
+    })
+    
+    for movie_id, local_title, year, tmdb_id in movies_without_douban:
+        key = ('movie', local_title, year)
+        if tmdb_id or key not in found:
+            continue
+        if found[key] is None:
+            logging.warning(f"未找到电影 '{local_title}' ({year}) 的TMDB信息")
+            continue
+        tmdb_id, tmdb_title = found[key]
         try:
-            # 使用TMDB搜索电影
-            search_url = f"{TMDB_BASE_URL}/3/search/movie"
-            params = {
-                'api_key': TMDB_API_KEY,
-                'query': local_title,
-                'year': year,
-                'language': 'zh-CN'
-            }
+            # 标准化标题比较
+            local_title_normalized = str(local_title).strip() if local_title is not None else ''
+            tmdb_title_normalized = str(tmdb_title).strip() if tmdb_title is not None else ''
             
-            response = requests.get(search_url, params=params, timeout=10)
-            if response.status_code == 200:
-                search_data = response.json()
-                if search_data.get('results'):
-                    # 获取最匹配的结果
-                    movie_result = search_data['results'][0]
-                    tmdb_title = movie_result.get('title', '')
-                    tmdb_id = movie_result.get('id', '')
-                    
-                    # 标准化标题比较
-                    local_title_normalized = str(local_title).strip() if local_title is not None else ''
-                    tmdb_title_normalized = str(tmdb_title).strip() if tmdb_title is not None else ''
-                    
-                    # 如果标题不一致，更新本地数据库
-                    if tmdb_title_normalized != local_title_normalized:
-                        cursor.execute('UPDATE MISS_MOVIES SET title = ? WHERE id = ?', 
-                                     (tmdb_title_normalized, movie_id))
-                        logging.info(f"已更新电影标题: '{local_title_normalized}' -> '{tmdb_title_normalized}' (TMDB ID: {tmdb_id})")
-                else:
-                    logging.warning(f"未找到电影 '{local_title}' ({year}) 的TMDB信息")
-            else:
-                logging.error(f"获取电影 '{local_title}' 信息失败，状态码: {response.status_code}")
-        except requests.RequestException as e:
-            logging.error(f"请求TMDB API时发生错误: {e}")
-        except Exception as e:
-            logging.error(f"处理电影 '{local_title}' 时发生未知错误: {e}")
-        
-        # 随机休眠避免频繁请求
-        sleep_time = random.uniform(1, 3)
-        time.sleep(sleep_time)
+            # 记录 TMDB ID，标题不一致时同时更新标题
+            cursor.execute('UPDATE MISS_MOVIES SET title = ?, tmdb_id = ? WHERE id = ?', 
+                         (tmdb_title_normalized, tmdb_id, movie_id))
+            if tmdb_title_normalized != local_title_normalized:
+                logging.info(f"已更新电影标题: '{local_title_normalized}' -> '{tmdb_title_normalized}' (TMDB ID: {tmdb_id})")
+        except sqlite3.Error as e:
+            logging.error(f"处理电影 '{local_title}' 时发生错误: {e}")
     
-    # 检查没有douban_id的电视剧
-    cursor.execute('SELECT id, title, year, season, missing_episodes FROM MISS_TVS WHERE douban_id IS NULL OR douban_id = ""')
-    tvs_without_douban = cursor.fetchall()
-    
-    for tv_id, local_title, year, season, missing_episodes in tvs_without_douban:
+    for tv_id, local_title, year, season, missing_episodes, tmdb_id in tvs_without_douban:
+        if tv_id not in tv_tmdb_ids:
+            if found.get(('tv', local_title, year), False) is None:
+                logging.warning(f"未找到电视剧 '{local_title}' 的TMDB信息")
+            continue
         try:
-            # 使用TMDB搜索电视剧
-            search_url = f"{TMDB_BASE_URL}/3/search/tv"
-            params = {
-                'api_key': TMDB_API_KEY,
-                'query': local_title,
-                'year': year,
-                'language': 'zh-CN'
-            }
+            title = local_title
+            if not tmdb_id:
+                tmdb_id, tmdb_title = found[('tv', local_title, year)]
+                
+                # 标准化标题比较
+                local_title_normalized = str(local_title).strip() if local_title is not None else ''
+                tmdb_title_normalized = str(tmdb_title).strip() if tmdb_title is not None else ''
+                
+                # 记录 TMDB ID，标题不一致时同时更新标题
+                cursor.execute('UPDATE MISS_TVS SET title = ?, tmdb_id = ? WHERE id = ?', 
+                             (tmdb_title_normalized, tmdb_id, tv_id))
+                if tmdb_title_normalized != local_title_normalized:
+                    logging.info(f"已更新电视剧标题: '{local_title_normalized}' -> '{tmdb_title_normalized}' (TMDB ID: {tmdb_id})")
+                title = tmdb_title_normalized
             
-            response = requests.get(search_url, params=params, timeout=10)
-            if response.status_code == 200:
-                search_data = response.json()
-                if search_data.get('results'):
-                    # 获取最匹配的结果
-                    tv_result = search_data['results'][0]
-                    tmdb_title = tv_result.get('name', '')
-                    tmdb_id = tv_result.get('id', '')
-                    
-                    # 获取详细季数信息
-                    season_url = f"{TMDB_BASE_URL}/3/tv/{tmdb_id}/season/{season}"
-                    season_params = {'api_key': TMDB_API_KEY}
-                    season_response = requests.get(season_url, params=season_params, timeout=10)
-                    
-                    if season_response.status_code == 200:
-                        season_data = season_response.json()
-                        tmdb_episodes_count = len(season_data.get('episodes', []))
-                        
-                        # 标准化标题比较
-                        local_title_normalized = str(local_title).strip() if local_title is not None else ''
-                        tmdb_title_normalized = str(tmdb_title).strip() if tmdb_title is not None else ''
-                        
-                        # 更新标题（如果需要）
-                        if tmdb_title_normalized != local_title_normalized:
-                            cursor.execute('UPDATE MISS_TVS SET title = ? WHERE id = ?', 
-                                         (tmdb_title_normalized, tv_id))
-                            logging.info(f"已更新电视剧标题: '{local_title_normalized}' -> '{tmdb_title_normalized}' (TMDB ID: {tmdb_id})")
-                        
-                        # 检查并更新集数信息
-                        if missing_episodes:
-                            try:
-                                local_missing_episodes_set = set(int(ep) for ep in missing_episodes.split(',') if ep.strip().isdigit())
-                                
-                                # 获取 TMDB 上的所有集数
-                                tmdb_episodes_set = set(range(1, tmdb_episodes_count + 1))
-                                
-                                # 获取本地已存在的集数（从 LIB_TV_SEASONS 表中获取）
-                                existing_episodes_str = cursor.execute(
-                                    '''SELECT episodes FROM LIB_TV_SEASONS WHERE tv_id = (SELECT id FROM LIB_TVS WHERE title = ? AND year = ?) AND season = ?''',
-                                    (local_title, year, season)
-                                ).fetchone()
-                                
-                                if existing_episodes_str:
-                                    val = existing_episodes_str[0]
-                                    if isinstance(val, int):
-                                        existing_episodes = set([val])
-                                    elif isinstance(val, str):
-                                        existing_episodes = set(int(ep) for ep in val.split(',') if ep.strip().isdigit())
-                                    else:
-                                        existing_episodes = set()
-                                else:
-                                    existing_episodes = set()
-                                
-                                # 计算新的缺失集数：TMDB 上的所有集数 - 本地已存在的集数
-                                new_missing_episodes_set = tmdb_episodes_set - existing_episodes
-                                new_missing_episodes_str = ','.join(map(str, sorted(new_missing_episodes_set)))
-                                
-                                # 如果缺失集数有变化，则更新
-                                if set(local_missing_episodes_set) != new_missing_episodes_set:
-                                    cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?', 
-                                                (new_missing_episodes_str, tv_id))
-                                    logging.info(f"已更新电视剧 '{tmdb_title_normalized}' 第{season}季的缺失集数: {sorted(local_missing_episodes_set)} -> {sorted(new_missing_episodes_set)}")
-                            except ValueError as e:
-                                logging.error(f"处理电视剧 '{local_title}' 集数时发生错误: {e}")
-                    else:
-                        logging.error(f"获取电视剧 '{local_title}' 第{season}季信息失败，状态码: {season_response.status_code}")
-                else:
-                    logging.warning(f"未找到电视剧 '{local_title}' 的TMDB信息")
-            else:
-                logging.error(f"搜索电视剧 '{local_title}' 信息失败，状态码: {response.status_code}")
-        except requests.RequestException as e:
-            logging.error(f"请求TMDB API时发生错误: {e}")
-        except Exception as e:
-            logging.error(f"处理电视剧 '{local_title}' 时发生未知错误: {e}")
-        
-        # 随机休眠避免频繁请求
-        sleep_time = random.uniform(1, 3)
-        time.sleep(sleep_time)
+            # 检查并更新集数信息
+            tmdb_episodes_count = episode_counts.get((tmdb_id, season))
+            if tmdb_episodes_count is None or not missing_episodes:
+                continue
+            local_missing_episodes_set = parse_episodes(missing_episodes)
+            
+            # 获取 TMDB 上的所有集数
+            tmdb_episodes_set = set(range(1, tmdb_episodes_count + 1))
+            
+            # 获取本地已存在的集数（从 LIB_TV_EPISODES 表中获取）
+            existing_episodes = get_library_episodes(cursor, title, season, year) or set()
+            
+            # 计算新的缺失集数：TMDB 上的所有集数 - 本地已存在的集数
+            new_missing_episodes_set = tmdb_episodes_set - existing_episodes
+            new_missing_episodes_str = format_episodes(new_missing_episodes_set)
+            
+            # 如果缺失集数有变化，则更新
+            if set(local_missing_episodes_set) != new_missing_episodes_set:
+                cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?', 
+                            (new_missing_episodes_str, tv_id))
+                logging.info(f"已更新电视剧 '{title}' 第{season}季的缺失集数: {sorted(local_missing_episodes_set)} -> {sorted(new_missing_episodes_set)}")
+        except ValueError as e:
+            logging.error(f"处理电视剧 '{local_title}' 集数时发生错误: {e}")
+        except sqlite3.Error as e:
+            logging.error(f"处理电视剧 '{local_title}' 时发生错误: {e}")
     
-    if not movies_without_douban and not tvs_without_douban:
-        logging.info("没有需要检查的TMDB项目")
-    else:
-        logging.info(f"共检查了 {len(movies_without_douban)} 个电影和 {len(tvs_without_douban)} 个电视剧的TMDB信息")
+    logging.info(f"共检查了 {len(movies_without_douban)} 个电影和 {len(tvs_without_douban)} 个电视剧的TMDB信息，"
+                 f"其中 {len(searches)} 个标题需要搜索")
 
 def send_notification(title_text):
-    # 通知功能
-    try:
-        notification_enabled = config.get("notification", "")
-        if notification_enabled.lower() != "true":  # 显式检查是否为 "true"
-            logging.info("通知功能未启用，跳过发送通知。")
-            return
-        api_key = config.get("notification_api_key", "")
-        if not api_key:
-            logging.error("通知API Key未在配置文件中找到，无法发送通知。")
-            return
-        api_url = f"https://api.day.app/{api_key}"
-        data = {
-            "title": "订阅通知",
-            "body": title_text  # 使用 title_text 作为 body 内容
-        }
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(api_url, data=json.dumps(data), headers=headers)
-        if response.status_code == 200:
-            logging.info("通知发送成功: %s", response.text)
-        else:
-            logging.error("通知发送失败: %s %s", response.status_code, response.text)
-    except KeyError as e:
-        logging.error(f"配置文件中缺少必要的键: {e}")
-    except requests.RequestException as e:
-        logging.error(f"网络请求出现错误: {e}")
+    # 通知功能：加入异步通知队列，由后台线程合并发送
+    notifier.notify(title_text)
 
 def main():
     # 读取配置文件
     global config
     config = load_config(db_path)
     # 连接到数据库
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
 
     try:
-        # 检查并更新豆瓣订阅项目的标题
-        update_miss_titles(cursor)
-
         # 检查并更新TMDB订阅项目的标题和集数
+        # （最先执行：TMDB 请求期间本连接尚未开始写事务，响应缓存可由其他连接写入）
         update_tmdb_items(cursor)
 
+        # 检查并更新豆瓣订阅项目的标题
+        update_miss_titles(cursor)
+
         # 订阅电影
         subscribe_movies(cursor)
 
+        # 一次性读取媒体库中已入库的剧集和集数，后续比对均在内存中完成
+        library = load_library(cursor)
+
         # 订阅电视剧
-        subscribe_tvs(cursor)
+        subscribe_tvs(cursor, library)
 
         # 更新别名订阅记录
-        update_alias_subscriptions(cursor)
+        update_alias_subscriptions(cursor, library)
 
         # 更新订阅
-        update_subscriptions(cursor)
+        update_subscriptions(cursor, library)
 
         # 提交事务
         conn.commit()
@@ -605,5 +638,14 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
+    # 作为脚本运行时才配置日志（sync.py 导入本模块做增量更新时沿用其日志配置）
+    logging.basicConfig(
+        level=logging.INFO,  # 设置日志级别为 INFO
+        format="%(asctime)s - %(levelname)s - %(message)s",  # 设置日志格式
+        handlers=[
+            logging.FileHandler("/tmp/log/check_subscr.log", mode='w'),  # 输出到文件并清空之前的日志
+            logging.StreamHandler()  # 输出到控制台
+        ]
+    )
     db_path='/config/data.db'
     main()
\ No newline at end of file
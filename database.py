@@ -0,0 +1,100 @@
+import os
+import time
+import sqlite3
+import logging
+
+# 数据库文件路径
+DB_PATH = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or "/config/data.db"
+
+# 等待其他进程释放数据库锁的最长时间（秒）
+DB_BUSY_TIMEOUT = 30
+# 内存映射读取的大小（字节）
+DB_MMAP_SIZE = 256 * 1024 * 1024
+# 执行时间超过该阈值（毫秒）的语句会记录到日志
+SLOW_QUERY_THRESHOLD_MS = 200
+
+def log_slow_query(sql, started):
+    """记录执行时间超过阈值的 SQL 语句"""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+        statement = " ".join(str(sql).split())
+        if len(statement) > 300:
+            statement = statement[:300] + "..."
+        logging.warning(f"慢查询 {elapsed_ms:.0f}ms: {statement}")
+
+class TimedCursor(sqlite3.Cursor):
+    """记录慢查询的游标（计时覆盖语句执行及首行结果的生成）"""
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            log_slow_query(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            log_slow_query(sql, started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            log_slow_query(sql_script, started)
+
+class TimedConnection(sqlite3.Connection):
+    """默认创建 TimedCursor 的连接，conn.execute() 等快捷方法同样会被计时"""
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def connect(db_path=DB_PATH, row_factory=None):
+    """
+    打开数据库连接并应用统一的性能设置：
+    1. WAL 模式：写入不再阻塞其他进程的读取（Web 页面查询与文件转移写入可同时进行）。
+    2. synchronous=NORMAL：WAL 模式下仍可保证数据库一致性，减少每次提交的 fsync。
+    3. busy_timeout：数据库被其他进程锁定时等待重试，而不是立即报 database is locked。
+    4. mmap_size：通过内存映射读取数据库文件，减少读取时的系统调用和内存拷贝。
+    """
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT, factory=TimedConnection)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    cursor = conn.cursor()
+    try:
+        # WAL 模式保存在数据库文件中，已是 WAL 时该语句不会产生写操作
+        cursor.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError as e:
+        logging.warning(f"无法切换数据库到 WAL 模式，继续使用当前日志模式: {e}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT * 1000}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.close()
+    return conn
+
+def load_config(db_path=DB_PATH):
+    """从数据库中加载配置"""
+    try:
+        conn = connect(db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
+            config = {option: value for option, value in cursor.fetchall()}
+        finally:
+            conn.close()
+
+        logging.debug("加载配置文件成功")
+        return config
+    except sqlite3.Error as e:
+        logging.error(f"数据库加载配置错误: {e}")
+        exit(0)
@@ -36,6 +36,7 @@ def initialize_database():
     if not os.path.exists(DB_PATH):
         logging.info("数据库文件不存在，正在创建...")
         create_tables()
+        apply_schema_migrations()
         ensure_all_configs_exist()  # 检查配置项完整性
         return CONFIG_DEFAULT
     else:
@@ -108,6 +109,17 @@ def create_tables():
             FOREIGN KEY (TV_ID) REFERENCES LIB_TVS(ID)
         )
     ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS IDX_LIB_TV_SEASONS_TV_ID_SEASON ON LIB_TV_SEASONS (TV_ID, SEASON)')
+
+    # 创建LIB_TV_EPISODES表（每集一行，已入库集数以此表为准）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LIB_TV_EPISODES (
+            TV_ID INTEGER NOT NULL,
+            SEASON INTEGER NOT NULL,
+            EPISODE INTEGER NOT NULL,
+            PRIMARY KEY (TV_ID, SEASON, EPISODE)
+        ) WITHOUT ROWID
+    ''')
 
     # 创建RSS_MOVIES表
     cursor.execute('''
@@ -146,6 +158,7 @@ def create_tables():
             TITLE TEXT NOT NULL,
             YEAR INTEGER,
             DOUBAN_ID INTEGER,
+            TMDB_ID INTEGER,
             UNIQUE(TITLE, YEAR)
         )
     ''')
@@ -159,6 +172,7 @@ def create_tables():
             SEASON INTEGER,
             MISSING_EPISODES TEXT,
             DOUBAN_ID INTEGER,
+            TMDB_ID INTEGER,
             UNIQUE(TITLE, YEAR, SEASON)
         )
     ''')
@@ -174,6 +188,78 @@ def create_tables():
         )
     ''')
 
+    # 创建LIB_FINGERPRINTS表（媒体库文件内容指纹，用于识别不同文件名的重复资源）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LIB_FINGERPRINTS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            PATH TEXT NOT NULL,
+            FINGERPRINT TEXT NOT NULL,
+            SIZE INTEGER,
+            UNIQUE(PATH)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS IDX_LIB_FINGERPRINTS_FINGERPRINT ON LIB_FINGERPRINTS (FINGERPRINT)')
+
+    # 创建LIB_SCAN_SNAPSHOT表（媒体库目录扫描快照，用于增量扫描）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LIB_SCAN_SNAPSHOT (
+            KIND TEXT NOT NULL,
+            PATH TEXT NOT NULL,
+            MTIME INTEGER,
+            DATA TEXT,
+            PRIMARY KEY (KIND, PATH)
+        )
+    ''')
+    # 创建LIB_NFO_CATALOG表（NFO 文件目录索引，供各脚本查询 NFO 信息，避免重复解析）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LIB_NFO_CATALOG (
+            PATH TEXT PRIMARY KEY,
+            ROOT_TYPE TEXT,
+            MTIME INTEGER,
+            SIZE INTEGER,
+            CONTENT_HASH TEXT,
+            MEDIA_TYPE TEXT,
+            TITLE TEXT,
+            YEAR TEXT,
+            SEASON TEXT,
+            PREMIERED TEXT,
+            RELEASEDATE TEXT,
+            AIRED TEXT,
+            DATEADDED TEXT,
+            TMDB_ID TEXT,
+            IMDB_ID TEXT
+        )
+    ''')
+    # 创建LIB_NFO_ACTOR_STATE表（季目录 NFO 已应用的演员信息，内容和演员信息均未变化时跳过）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS LIB_NFO_ACTOR_STATE (
+            PATH TEXT PRIMARY KEY,
+            CONTENT_HASH TEXT,
+            ACTORS_HASH TEXT
+        )
+    ''')
+    # 创建API_CACHE表（豆瓣、TMDB 等外部接口响应的持久化缓存）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS API_CACHE (
+            NAMESPACE TEXT NOT NULL,
+            KEY TEXT NOT NULL,
+            DATA TEXT,
+            EXPIRES_AT INTEGER,
+            PRIMARY KEY (NAMESPACE, KEY)
+        ) WITHOUT ROWID
+    ''')
+
+    # 创建ARTWORK_CACHE表（图片缓存索引：图片地址对应的内容哈希）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ARTWORK_CACHE (
+            KEY TEXT PRIMARY KEY,
+            CONTENT_HASH TEXT NOT NULL,
+            EXT TEXT,
+            SIZE INTEGER,
+            CREATED_AT INTEGER
+        )
+    ''')
+
     # 插入默认用户数据
     cursor.execute("SELECT COUNT(*) FROM USERS WHERE USERNAME = 'admin'")
     if cursor.fetchone()[0] == 0:
@@ -283,6 +369,9 @@ def create_tables():
         ("jackett_enabled", "False"),
         ("1lou_ok1_cookie", "8PbJZYCzXpLlGOhwwVsn70gm69fg4y2vORAniXidCSBKzz3rKHibfdtHop4PVU9DTATcR7ifHfLbL3ZmriJIpDcjg8AbpYPeIoNGjzsgAEd3jZ5fAAQfU7N"),
         ("1lou_max_hits", "8"),
+        ("download_completion_feed", "False"),
+        ("transfer_bandwidth_limit", "0"),
+        ("transfer_device_concurrency", "1"),
         ("run_interval_hours", "6")
     ]
 
@@ -331,6 +420,26 @@ def migrate_rss_tables_with_status():
     conn.commit()
     conn.close()
 
+def migrate_miss_tables_with_tmdb_id():
+    """
+    迁移 MISS_MOVIES 和 MISS_TVS 表，添加 TMDB_ID 字段（记录手动订阅已解析的 TMDB ID，避免重复搜索）
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    for table in ("MISS_MOVIES", "MISS_TVS"):
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = cursor.fetchall()
+        if not any(column[1] == 'TMDB_ID' for column in columns):
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN TMDB_ID INTEGER")
+                logging.info(f"已向 {table} 表添加 TMDB_ID 字段")
+            except sqlite3.OperationalError as e:
+                logging.warning(f"添加 TMDB_ID 字段到 {table} 表时出错: {e}")
+
+    conn.commit()
+    conn.close()
+
 def migrate_miss_tvs_table():
     """
     迁移 MISS_TVS 表以兼容新的唯一性约束（包含 SEASON 字段）
@@ -412,6 +521,66 @@ def migrate_miss_tvs_table():
     conn.commit()
     conn.close()
 
+def migrate_tv_episodes_table():
+    """
+    将 LIB_TV_SEASONS.EPISODES 中逗号分隔的集数拆分写入 LIB_TV_EPISODES 表（仅在该表为空时执行一次）
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT 1 FROM LIB_TV_EPISODES LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT TV_ID, SEASON, EPISODES FROM LIB_TV_SEASONS WHERE EPISODES IS NOT NULL AND EPISODES != ''")
+        rows = []
+        for tv_id, season, episodes in cursor.fetchall():
+            for episode in str(episodes).split(','):
+                episode = episode.strip()
+                if episode.isdigit():
+                    rows.append((tv_id, season, int(episode)))
+        if rows:
+            logging.info(f"正在迁移剧集数据到 LIB_TV_EPISODES 表，共 {len(rows)} 集...")
+            cursor.executemany("INSERT OR IGNORE INTO LIB_TV_EPISODES (TV_ID, SEASON, EPISODE) VALUES (?, ?, ?)", rows)
+            logging.info("LIB_TV_EPISODES 表迁移完成")
+
+    conn.commit()
+    conn.close()
+
+# 数据库结构迁移，按版本号顺序执行，当前版本记录在 PRAGMA user_version 中
+SCHEMA_MIGRATIONS = [
+    # 版本1：启用 WAL 模式，并为按豆瓣ID和剧集季查询的热点字段添加索引
+    # （LIB_TVS.TITLE 的查询已由 UNIQUE(TITLE, YEAR) 自动索引覆盖）
+    (1, [
+        "PRAGMA journal_mode=WAL",
+        "CREATE INDEX IF NOT EXISTS IDX_LIB_TV_SEASONS_TV_ID_SEASON ON LIB_TV_SEASONS (TV_ID, SEASON)",
+        "CREATE INDEX IF NOT EXISTS IDX_MISS_MOVIES_DOUBAN_ID ON MISS_MOVIES (DOUBAN_ID)",
+        "CREATE INDEX IF NOT EXISTS IDX_MISS_TVS_DOUBAN_ID ON MISS_TVS (DOUBAN_ID)",
+        "CREATE INDEX IF NOT EXISTS IDX_RSS_MOVIES_DOUBAN_ID ON RSS_MOVIES (DOUBAN_ID)",
+        "CREATE INDEX IF NOT EXISTS IDX_RSS_TVS_DOUBAN_ID ON RSS_TVS (DOUBAN_ID)",
+    ]),
+]
+
+def apply_schema_migrations():
+    """
+    执行尚未应用的数据库结构迁移，每个版本成功后更新 user_version
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for version, statements in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        logging.info(f"正在升级数据库结构到版本 {version}...")
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        current_version = version
+
+    # 汇总表的统计信息，供查询优化器选择索引
+    cursor.execute("PRAGMA optimize")
+    conn.close()
+
 def migrate_douban_config():
     """
     迁移豆瓣配置项，从 douban_rss_url 迁移到 douban_user_ids
@@ -481,7 +650,9 @@ def check_and_update_tables():
     # 定义所有表名
     tables = [
         "USERS", "CONFIG", "LIB_MOVIES", "LIB_TVS", "LIB_TV_SEASONS",
-        "RSS_MOVIES", "RSS_TVS", "MISS_MOVIES", "MISS_TVS", "LIB_TV_ALIAS"
+        "RSS_MOVIES", "RSS_TVS", "MISS_MOVIES", "MISS_TVS", "LIB_TV_ALIAS",
+        "LIB_FINGERPRINTS", "LIB_SCAN_SNAPSHOT", "LIB_TV_EPISODES", "LIB_NFO_CATALOG",
+        "LIB_NFO_ACTOR_STATE", "API_CACHE", "ARTWORK_CACHE"
     ]
 
     for table in tables:
@@ -500,8 +671,17 @@ def check_and_update_tables():
     # 添加 STATUS 字段到 RSS 表
     migrate_rss_tables_with_status()
 
+    # 添加 TMDB_ID 字段到 MISS 表
+    migrate_miss_tables_with_tmdb_id()
+
+    # 将 LIB_TV_SEASONS.EPISODES 中的集数拆分到 LIB_TV_EPISODES 表
+    migrate_tv_episodes_table()
+
     conn.close()
 
+    # 按版本号执行数据库结构迁移（索引、日志模式等）
+    apply_schema_migrations()
+
 def ensure_all_configs_exist():
     """
     检查是否每一个配置项都存在，如果有缺失的配置项，则插入默认值。
@@ -604,6 +784,9 @@ def ensure_all_configs_exist():
         ("jackett_enabled", "False"),
         ("1lou_max_hits", "8"),
         ("1lou_ok1_cookie", "8PbJZYCzXpLlGOhwwVsn70gm69fg4y2vORAniXidCSBKzz3rKHibfdtHop4PVU9DTATcR7ifHfLbL3ZmriJIpDcjg8AbpYPeIoNGjzsgAEd3jZ5fAAQfU7N"),
+        ("download_completion_feed", "False"),
+        ("transfer_bandwidth_limit", "0"),
+        ("transfer_device_concurrency", "1"),
         ("run_interval_hours", "6")
     ]
 
@@ -719,6 +902,9 @@ def check_config_data():
         "jackett_enabled": "False",
         "1lou_ok1_cookie": "8PbJZYCzXpLlGOhwwVsn70gm69fg4y2vORAniXidCSBKzz3rKHibfdtHop4PVU9DTATcR7ifHfLbL3ZmriJIpDcjg8AbpYPeIoNGjzsgAEd3jZ5fAAQfU7N",
         "1lou_max_hits": "8",
+        "download_completion_feed": "False",
+        "transfer_bandwidth_limit": "0",
+        "transfer_device_concurrency": "1",
         "run_interval_hours": "6"
     }
 
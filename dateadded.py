@@ -1,7 +1,11 @@
 import os
-import re
-import sqlite3
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from database import load_config
+from nfo_catalog import refresh_catalog, library_root_types, write_file_atomic, DATEADDED_PATTERN
+
+# 并行改写 NFO 文件的线程数
+DATEADDED_MAX_WORKERS = 4
 
 # 配置日志
 logging.basicConfig(
@@ -27,151 +31,149 @@ def read_file_with_encoding(file_path):
     logging.error(f"无法解码文件: {file_path}，所有尝试的编码均失败")
     return None
 
-def get_parent_nfo_date(file_path):
+def get_nfo_date(entry):
+    """
+    从 NFO 索引记录中获取日期：优先 releasedate，其次 aired，年份为 0001 时视为无效
+    """
+    if entry is None:
+        return None
+    if entry['RELEASEDATE'] is not None:
+        date_content = entry['RELEASEDATE']
+    elif entry['AIRED'] is not None:
+        date_content = entry['AIRED']
+    else:
+        return None
+    if date_content.startswith('0001'):
+        return None
+    return date_content
+
+def get_parent_nfo_date(file_path, catalog):
     """
     从 tvshow.nfo 或 season.nfo 获取日期信息
     """
     directory = os.path.dirname(file_path)
     season_nfo_path = os.path.join(directory, 'season.nfo')
-    tvshow_nfo_path = None
-    
-    # 查找 tvshow.nfo 路径
-    parent_dir = os.path.dirname(directory)
-    if parent_dir:
-        tvshow_nfo_path = os.path.join(parent_dir, 'tvshow.nfo')
     
     # 首先尝试从 season.nfo 获取日期
-    if os.path.exists(season_nfo_path):
-        content = read_file_with_encoding(season_nfo_path)
-        if content:
-            releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-            aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-            
-            if releasedate_match:
-                date_content = releasedate_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
-            elif aired_match:
-                date_content = aired_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
+    date_content = get_nfo_date(catalog.entries.get(season_nfo_path) or catalog.lookup(season_nfo_path))
+    if date_content is not None:
+        return date_content
     
     # 如果 season.nfo 没有有效日期，则尝试 tvshow.nfo
-    if tvshow_nfo_path and os.path.exists(tvshow_nfo_path):
-        content = read_file_with_encoding(tvshow_nfo_path)
-        if content:
-            releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-            aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-            
-            if releasedate_match:
-                date_content = releasedate_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
-            elif aired_match:
-                date_content = aired_match.group(1).strip()
-                if not date_content.startswith('0001'):
-                    return date_content
+    parent_dir = os.path.dirname(directory)
+    if parent_dir:
+        tvshow_nfo_path = os.path.join(parent_dir, 'tvshow.nfo')
+        return get_nfo_date(catalog.entries.get(tvshow_nfo_path) or catalog.lookup(tvshow_nfo_path))
     
     return None
 
-def update_dateadded(directory):
+def rewrite_dateadded(file_path, replacement_content):
     """
-    更新指定目录下所有 .nfo 文件中的 <dateadded> 标签值。
+    将单个 NFO 文件的 <dateadded> 改写为指定日期（先写临时文件再重命名替换）。
+    返回写入的文件内容，无需改写或读取失败时返回 None。
     """
-    logging.debug(f"开始遍历目录及其子目录: {directory}")
-    for root, dirs, files in os.walk(directory):
-        # 排除 music 目录（不区分大小写）
-        dirs[:] = [d for d in dirs if d.lower() != 'music']
-
-        for filename in files:
-            # 排除 artist.nfo 文件（不区分大小写）
-            if filename.lower().endswith('.nfo') and not filename.lower() == 'artist.nfo':
-                file_path = os.path.join(root, filename)
-                logging.debug(f"处理文件: {file_path}")
-
-                content = read_file_with_encoding(file_path)
-                if content is None:
-                    continue
-
-                # 使用正则表达式查找<dateadded>, <releasedate>和<aired>标签
-                dateadded_match = re.search(r'<dateadded>(.*?)</dateadded>', content, re.DOTALL)
-                releasedate_match = re.search(r'<releasedate>(.*?)</releasedate>', content, re.DOTALL)
-                aired_match = re.search(r'<aired>(.*?)</aired>', content, re.DOTALL)
-
-                if dateadded_match:
-                    dateadded_content = dateadded_match.group(1)
-                    logging.debug(f"添加日期: {dateadded_content}")
-
-                    # 提取 dateadded 的年月日部分
-                    dateadded_date = dateadded_content.split()[0]
-
-                    replacement_content = None
-                    if releasedate_match:
-                        replacement_content = releasedate_match.group(1).strip()
-                        logging.debug(f"发行日期: {replacement_content}")
-                    elif aired_match:
-                        replacement_content = aired_match.group(1).strip()
-                        logging.debug(f"播出日期: {replacement_content}")
-
-                    # 检查是否有有效的本地日期
-                    local_date_valid = replacement_content and not replacement_content.startswith('0001')
-                    
-                    # 如果本地日期无效，尝试从父级 nfo 文件获取日期
-                    if not local_date_valid:
-                        parent_date = get_parent_nfo_date(file_path)
-                        if parent_date:
-                            replacement_content = parent_date
-                            logging.debug(f"从父级 NFO 获取日期: {replacement_content}")
-                        else:
-                            logging.warning(f"未找到有效的 [发行日期] 或 [播出日期] 标签在文件或其父级文件中: {file_path}")
-                            continue
-                    elif not replacement_content:
-                        # 本地没有日期字段且无法从父级获取
-                        logging.warning(f"未找到 [发行日期] 或 [播出日期] 标签在文件: {file_path}")
-                        continue
-
-                    # 检查年份是否为 0001（仅当我们没有从父级获取日期时）
-                    if replacement_content.startswith('0001'):
-                        logging.warning(f"[发行日期] 或 [播出日期] 年份无效 (0001)，跳过处理: {file_path}")
-                        continue
-
-                    # 比较 dateadded 的年月日部分与 replacement_content 是否相同
-                    if dateadded_date == replacement_content:
-                        logging.debug(f"[添加日期] 与 [发行日期] 或 [播出日期] 相同，跳过处理: {file_path}")
-                        continue
-
-                    # 替换<dateadded>标签中的内容
-                    updated_content = content.replace(
-                        f'<dateadded>{dateadded_content}</dateadded>',
-                        f'<dateadded>{replacement_content}</dateadded>'
-                    )
-                    logging.info(f"更新 [添加日期] 为: {replacement_content}")
-
-                    # 将更新后的内容写回文件
-                    with open(file_path, 'w', encoding='utf-8') as file:
-                        file.write(updated_content)
-
-                    logging.info(f'更新完成: {file_path}')
-                else:
-                    logging.warning(f"未找到 [添加日期] 标签在文件: {file_path}")
-
-def get_config_value(db_path, option):
+    content = read_file_with_encoding(file_path)
+    if content is None:
+        return None
+    dateadded_match = DATEADDED_PATTERN.search(content)
+    if not dateadded_match:
+        logging.warning(f"未找到 [添加日期] 标签在文件: {file_path}")
+        return None
+
+    # 替换<dateadded>标签中的内容
+    updated_content = content.replace(
+        f'<dateadded>{dateadded_match.group(1)}</dateadded>',
+        f'<dateadded>{replacement_content}</dateadded>'
+    )
+    logging.info(f"更新 [添加日期] 为: {replacement_content}")
+
+    # 将更新后的内容写回文件
+    data = updated_content.encode('utf-8')
+    write_file_atomic(file_path, data)
+    logging.info(f'更新完成: {file_path}')
+    return data
+
+def update_dateadded(directory, db_path, root_types=()):
     """
-    从 SQLite 数据库中读取配置项。
+    更新指定目录下所有 .nfo 文件中的 <dateadded> 标签值。
+    1. 日期信息从 NFO 目录索引中读取，索引按 (修改时间, 大小) 跟踪每个文件，未变化的文件不会被打开。
+    2. 改写后的文件连同已应用的日期重新登记到索引，下次运行时直接判定为无需处理。
+    3. 需要改写的文件在线程池中并行处理，每个文件原子替换，中断时不会留下截断的 NFO。
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT VALUE FROM CONFIG WHERE OPTION = ?", (option,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    logging.debug(f"开始更新目录及其子目录的NFO目录索引: {directory}")
+    catalog = refresh_catalog(db_path, [directory], root_types)
+    rewrites = []
+    for entry in catalog.under(directory):
+        file_path = entry['PATH']
+        # 排除 music 目录（不区分大小写）
+        sub_dirs = os.path.relpath(os.path.dirname(file_path), directory).split(os.sep)
+        if any(d.lower() == 'music' for d in sub_dirs):
+            continue
+        # 排除 artist.nfo 文件（不区分大小写）
+        if os.path.basename(file_path).lower() == 'artist.nfo':
+            continue
+        logging.debug(f"处理文件: {file_path}")
+
+        dateadded_content = entry['DATEADDED']
+        if dateadded_content is None:
+            logging.warning(f"未找到 [添加日期] 标签在文件: {file_path}")
+            continue
+        logging.debug(f"添加日期: {dateadded_content}")
+
+        # 提取 dateadded 的年月日部分
+        dateadded_parts = dateadded_content.split()
+        dateadded_date = dateadded_parts[0] if dateadded_parts else ''
+
+        replacement_content = None
+        if entry['RELEASEDATE'] is not None:
+            replacement_content = entry['RELEASEDATE']
+            logging.debug(f"发行日期: {replacement_content}")
+        elif entry['AIRED'] is not None:
+            replacement_content = entry['AIRED']
+            logging.debug(f"播出日期: {replacement_content}")
+
+        # 检查是否有有效的本地日期
+        local_date_valid = replacement_content and not replacement_content.startswith('0001')
+        
+        # 如果本地日期无效，尝试从父级 nfo 文件获取日期
+        if not local_date_valid:
+            parent_date = get_parent_nfo_date(file_path, catalog)
+            if parent_date:
+                replacement_content = parent_date
+                logging.debug(f"从父级 NFO 获取日期: {replacement_content}")
+            else:
+                logging.warning(f"未找到有效的 [发行日期] 或 [播出日期] 标签在文件或其父级文件中: {file_path}")
+                continue
+
+        # 比较 dateadded 的年月日部分与 replacement_content 是否相同
+        if dateadded_date == replacement_content:
+            logging.debug(f"[添加日期] 与 [发行日期] 或 [播出日期] 相同，跳过处理: {file_path}")
+            continue
+
+        rewrites.append((file_path, replacement_content))
+
+    if rewrites:
+        logging.info(f"共 {len(rewrites)} 个 NFO 文件需要更新 [添加日期]")
+        with ThreadPoolExecutor(max_workers=DATEADDED_MAX_WORKERS) as executor:
+            futures = [executor.submit(rewrite_dateadded, file_path, date) for file_path, date in rewrites]
+            for (file_path, _), future in zip(rewrites, futures):
+                # 单个文件出错时记录日志并继续，保证其余文件的索引更新能够保存
+                try:
+                    data = future.result()
+                    # 改写过的文件重新登记到 NFO 目录索引
+                    if data is not None:
+                        catalog.update(file_path, data)
+                except Exception as e:
+                    logging.error(f"更新文件 {file_path} 失败: {e}")
+    catalog.save()
 
 if __name__ == '__main__':
     db_path = '/config/data.db'
-    media_dir = get_config_value(db_path, 'media_dir')
-    dateadded_enabled = get_config_value(db_path, 'dateadded')
+    config = load_config(db_path)
+    media_dir = config.get('media_dir')
+    dateadded_enabled = config.get('dateadded')
     logging.debug(f"从数据库获取配置: media_dir={media_dir}, dateadded={dateadded_enabled}")
     if dateadded_enabled and dateadded_enabled.lower() == "true":  # 显式检查是否为 "true"
-        update_dateadded(media_dir)
+        update_dateadded(media_dir, db_path, library_root_types(config))
     else:
-        logging.info('添加日期功能已禁用.')
\ No newline at end of file
+        logging.info('添加日期功能已禁用.')
@@ -18,6 +18,8 @@ import requests
 import argparse 
 import glob
 from captcha_handler import CaptchaHandler
+from notifier import NotificationQueue
+from database import connect
 from pathlib import Path
 import shutil
 from urllib.parse import urljoin
@@ -106,6 +108,8 @@ class MediaDownloader:
         self.db_path = db_path
         self.driver = None
         self.config = {}
+        # 异步通知队列，下载通知在后台合并发送
+        self.notifier = NotificationQueue("下载通知", lambda: self.config)
         if not self.db_path:
             self.db_path = os.environ.get("DB_PATH") or os.environ.get("DATABASE") or '/config/data.db'
 
@@ -228,7 +232,7 @@ class MediaDownloader:
     def load_config(self):
         """从数据库中加载配置"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
                 config_items = cursor.fetchall()
@@ -241,31 +245,9 @@ class MediaDownloader:
             exit(0)
 
     def send_notification(self, item, title_text, resolution):
-        # 通知功能
-        try:
-            notification_enabled = self.config.get("notification", "")
-            if notification_enabled.lower() != "true":  # 显式检查是否为 "true"
-                logging.info("通知功能未启用，跳过发送通知。")
-                return
-            api_key = self.config.get("notification_api_key", "")
-            if not api_key:
-                logging.error("通知API Key未在配置文件中找到，无法发送通知。")
-                return
-            api_url = f"https://api.day.app/{api_key}"
-            data = {
-                "title": "下载通知",
-                "body": f"开始下载：{title_text}"  # 使用 title_text 作为 body 内容
-            }
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(api_url, data=json.dumps(data), headers=headers)
-            if response.status_code == 200:
-                logging.info("通知发送成功: %s", response.text)
-            else:
-                logging.error("通知发送失败: %s %s", response.status_code, response.text)
-        except KeyError as e:
-            logging.error(f"配置文件中缺少必要的键: {e}")
-        except requests.RequestException as e:
-            logging.error(f"网络请求出现错误: {e}")
+        # 通知功能：加入异步通知队列，由后台线程合并发送，不阻塞下载流程
+        self.notifier.notify(f"开始下载：{title_text}")
+
     def add_magnet_task(self, magnet_link: str, title_text: str) -> bool:
         """将磁力链接直接添加到下载器（Transmission / qBittorrent）。"""
         try:
@@ -1323,7 +1305,7 @@ class MediaDownloader:
         """从数据库读取订阅电影信息"""
         all_movie_info = []
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT title, year FROM MISS_MOVIES')
                 movies = cursor.fetchall()
@@ -1342,7 +1324,7 @@ class MediaDownloader:
         """从数据库读取订阅电视节目信息和缺失的集数信息"""
         all_tv_info = []
         
-        with sqlite3.connect(self.db_path) as conn:
+        with connect(self.db_path) as conn:
             cursor = conn.cursor()
             
             # 读取缺失的电视节目信息和缺失的集数信息
@@ -1934,7 +1916,7 @@ class MediaDownloader:
                         
                         # 下载成功后，更新数据库，标记该电影已完成订阅
                         try:
-                            with sqlite3.connect(self.db_path) as conn:
+                            with connect(self.db_path) as conn:
                                 cursor = conn.cursor()
                                 cursor.execute(
                                     "DELETE FROM MISS_MOVIES WHERE title=? AND year=?",
@@ -2199,7 +2181,7 @@ class MediaDownloader:
             # 只对实际下载成功的集数更新数据库
             if successfully_downloaded_episodes:
                 try:
-                    with sqlite3.connect(self.db_path) as conn:
+                    with connect(self.db_path) as conn:
                         cursor = conn.cursor()
                         # 查询当前缺失集数
                         cursor.execute(
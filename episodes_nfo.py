@@ -1,7 +1,11 @@
 import os
+import json
+import hashlib
+import sqlite3
 from xml.etree import ElementTree as ET
 import logging
-import sqlite3
+from database import connect, load_config
+from nfo_catalog import refresh_catalog, library_root_types, is_under, write_file_atomic
 
 # 配置日志
 logging.basicConfig(
@@ -13,20 +17,6 @@ logging.basicConfig(
     ]
 )
 
-def load_config(db_path='/config/data.db'):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
 def parse_nfo(file_path):
     """解析NFO文件，返回演员字典，键为tmdbid或imdbid，值为(name, role)元组"""
     try:
@@ -85,8 +75,33 @@ def parse_nfo(file_path):
         logging.error(f"解析文件 {file_path} 时出错：{e}")
         return {}
 
+def apply_actor(actor, name_elem, role_elem, type_elem, name, role, file_path):
+    """将演员姓名和角色写入 <actor> 元素，返回是否有修改"""
+    changed = name_elem.text != name
+    name_elem.text = name
+    if role_elem is None:
+        # 创建新的 <role> 标签并插入到 <name> 和 <type> 之间
+        role_elem = ET.SubElement(actor, 'role')
+        role_elem.text = role
+        name_elem.tail = '\n  '  # 确保 <role> 标签在 <name> 标签之后换行插入
+        role_elem.tail = '\n  '  # 确保 <role> 标签之后换行插入
+        
+        # 如果有 <type> 标签，确保 <role> 标签在 <type> 标签之前
+        if type_elem is not None:
+            actor.remove(type_elem)
+            actor.append(type_elem)
+        
+        logging.info(f"为文件 {file_path} 中的演员添加了默认的 <role> 标签")
+        return True
+    changed = changed or role_elem.text != role
+    role_elem.text = role
+    return changed
+
 def update_nfo(file_path, actors):
-    """更新NFO文件中的演员角色信息"""
+    """
+    更新NFO文件中的演员角色信息。
+    返回写入的文件内容；演员信息已是最新无需改写时返回 None；出错时返回 False。
+    """
     try:
         tree = ET.parse(file_path)
         root = tree.getroot()
@@ -106,78 +121,112 @@ def update_nfo(file_path, actors):
             imdbid = imdbid_elem.text if imdbid_elem is not None else None
             
             if tmdbid and tmdbid in actors:
-                name_elem.text = actors[tmdbid][0]
-                if role_elem is None:
-                    # 创建新的 <role> 标签并插入到 <name> 和 <type> 之间
-                    role_elem = ET.SubElement(actor, 'role')
-                    role_elem.text = actors[tmdbid][1]
-                    name_elem.tail = '\n  '  # 确保 <role> 标签在 <name> 标签之后换行插入
-                    role_elem.tail = '\n  '  # 确保 <role> 标签之后换行插入
-                    
-                    # 如果有 <type> 标签，确保 <role> 标签在 <type> 标签之前
-                    if type_elem is not None:
-                        actor.remove(type_elem)
-                        actor.append(type_elem)
-                    
-                    logging.info(f"为文件 {file_path} 中的演员添加了默认的 <role> 标签")
-                else:
-                    role_elem.text = actors[tmdbid][1]
-                updated = True
+                key = tmdbid
             elif imdbid and imdbid in actors:
-                name_elem.text = actors[imdbid][0]
-                if role_elem is None:
-                    # 创建新的 <role> 标签并插入到 <name> 和 <type> 之间
-                    role_elem = ET.SubElement(actor, 'role')
-                    role_elem.text = actors[imdbid][1]
-                    name_elem.tail = '\n  '  # 确保 <role> 标签在 <name> 标签之后换行插入
-                    role_elem.tail = '\n  '  # 确保 <role> 标签之后换行插入
-                    
-                    # 如果有 <type> 标签，确保 <role> 标签在 <type> 标签之前
-                    if type_elem is not None:
-                        actor.remove(type_elem)
-                        actor.append(type_elem)
-                    
-                    logging.info(f"为文件 {file_path} 中的演员添加了默认的 <role> 标签")
-                else:
-                    role_elem.text = actors[imdbid][1]
+                key = imdbid
+            else:
+                continue
+            if apply_actor(actor, name_elem, role_elem, type_elem, actors[key][0], actors[key][1], file_path):
                 updated = True
         
         if updated:
-            tree.write(file_path, encoding='utf-8', xml_declaration=True)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content.replace('><', '>\n<'))
+            content = ET.tostring(root, encoding='utf-8', xml_declaration=True).decode('utf-8')
+            data = content.replace('><', '>\n<').encode('utf-8')
+            write_file_atomic(file_path, data)
             logging.info(f"已更新文件中的角色信息：{file_path}")
-        else:
-            logging.debug(f"文件无需更新：{file_path}")
+            return data
+        logging.debug(f"文件无需更新：{file_path}")
+        return None
     except Exception as e:
         logging.error(f"更新文件 {file_path} 时出错：{e}")
+        return False
+
+def actors_hash(actors):
+    """演员信息的哈希，用于判断季目录 NFO 是否已应用过同样的演员信息"""
+    return hashlib.sha1(json.dumps(sorted(actors.items()), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def load_actor_state(db_path, media_dir):
+    """读取已应用演员信息的 NFO 文件状态：{路径: (文件内容哈希, 演员信息哈希)}"""
+    state = {}
+    try:
+        with connect(db_path) as conn:
+            for path, content_hash, applied_hash in conn.execute('SELECT PATH, CONTENT_HASH, ACTORS_HASH FROM LIB_NFO_ACTOR_STATE'):
+                if is_under(path, media_dir):
+                    state[path] = (content_hash, applied_hash)
+    except sqlite3.Error as e:
+        logging.warning(f"读取演员信息应用状态失败，将重新检查所有 NFO 文件: {e}")
+    return state
+
+def save_actor_state(db_path, changed, removed):
+    """保存有变化的 NFO 文件状态，并删除已不存在的文件状态"""
+    if not changed and not removed:
+        return
+    try:
+        with connect(db_path) as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO LIB_NFO_ACTOR_STATE (PATH, CONTENT_HASH, ACTORS_HASH) VALUES (?, ?, ?)',
+                [(path, content_hash, applied_hash) for path, (content_hash, applied_hash) in changed.items()]
+            )
+            conn.executemany('DELETE FROM LIB_NFO_ACTOR_STATE WHERE PATH = ?', [(path,) for path in removed])
+    except sqlite3.Error as e:
+        logging.error(f"保存演员信息应用状态失败: {e}")
 
-def process_directory(base_dir, exclude_dirs):
-    """处理给定目录及其子目录中的NFO文件"""
+def process_directory(base_dir, exclude_dirs, nfo_paths, catalog, state, changed_state):
+    """
+    处理剧集目录中的NFO文件（nfo_paths 为该目录下所有 NFO 文件路径）。
+    文件内容和演员信息都未变化的季目录 NFO 直接跳过，不再解析。
+    """
     if any(exclude_dir in base_dir for exclude_dir in exclude_dirs):
         logging.debug(f"跳过排除目录：{base_dir}")
         return
     
     tvshow_nfo_path = os.path.join(base_dir, 'tvshow.nfo')
-    if os.path.exists(tvshow_nfo_path):
-        main_actors = parse_nfo(tvshow_nfo_path)
-        for root, dirs, files in os.walk(base_dir):
-            for file in files:
-                if file.endswith('.nfo') and 'Season' in root:  # 只处理季目录中的NFO文件
-                    nfo_file_path = os.path.join(root, file)
-                    update_nfo(nfo_file_path, main_actors)
-    else:
-        logging.warning(f"未找到文件 tvshow.nfo 在目录：{base_dir}")
+    main_actors = parse_nfo(tvshow_nfo_path)
+    catalog.lookup(tvshow_nfo_path)
+    applied_hash = actors_hash(main_actors)
+    for nfo_file_path in nfo_paths:
+        if nfo_file_path.endswith('.nfo') and 'Season' in os.path.dirname(nfo_file_path):  # 只处理季目录中的NFO文件
+            entry = catalog.entries.get(nfo_file_path)
+            if entry is None:
+                continue
+            if state.get(nfo_file_path) == (entry['CONTENT_HASH'], applied_hash):
+                logging.debug(f"文件和演员信息均未变化，跳过：{nfo_file_path}")
+                continue
+            data = update_nfo(nfo_file_path, main_actors)
+            if data is False:
+                continue
+            if data is not None:
+                # 改写过的文件重新登记到 NFO 目录索引
+                entry = catalog.update(nfo_file_path, data) or entry
+            changed_state[nfo_file_path] = (entry['CONTENT_HASH'], applied_hash)
+
+def process_media_directory(media_dir, exclude_dirs, db_path='/config/data.db', root_types=()):
+    """
+    一次遍历处理媒体目录下的所有剧集：
+    通过NFO目录索引找到所有包含 tvshow.nfo 的剧集目录，并将各NFO文件归入所属剧集，逐个剧集处理。
+    """
+    media_dir = os.path.normpath(media_dir)
+    catalog = refresh_catalog(db_path, [media_dir], root_types)
+    entries = catalog.under(media_dir)
+    show_files = {
+        os.path.dirname(entry['PATH']): [] for entry in entries
+        if os.path.basename(entry['PATH']) == 'tvshow.nfo' and os.path.dirname(entry['PATH']) != media_dir
+    }
+    # 将每个 NFO 文件归入其所在的剧集目录（逐级向上查找最近的包含 tvshow.nfo 的目录）
+    for entry in entries:
+        parent = os.path.dirname(entry['PATH'])
+        while parent != media_dir and parent != os.path.dirname(parent):
+            if parent in show_files:
+                show_files[parent].append(entry['PATH'])
+                break
+            parent = os.path.dirname(parent)
 
-def process_media_directory(media_dir, exclude_dirs):
-    """递归处理媒体目录及其所有子目录"""
-    for root, dirs, files in os.walk(media_dir):
-        for dir_name in dirs:
-            show_path = os.path.join(root, dir_name)
-            if os.path.isdir(show_path):
-                process_directory(show_path, exclude_dirs)
+    state = load_actor_state(db_path, media_dir)
+    changed_state = {}
+    for show_path, nfo_paths in show_files.items():
+        process_directory(show_path, exclude_dirs, nfo_paths, catalog, state, changed_state)
+    catalog.save()
+    save_actor_state(db_path, changed_state, [path for path in state if path not in catalog.entries])
 
 if __name__ == '__main__':
     config = load_config()
@@ -191,4 +240,4 @@ if __name__ == '__main__':
     media_dir = config.get('episodes_path', '')
     exclude_dirs = config.get('nfo_exclude_dirs', '').split(',')
 
-    process_media_directory(media_dir, exclude_dirs)
\ No newline at end of file
+    process_media_directory(media_dir, exclude_dirs, root_types=library_root_types(config))
\ No newline at end of file
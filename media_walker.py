@@ -0,0 +1,106 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 并行遍历的最大线程数（媒体库根目录常位于不同磁盘，可同时遍历）
+WALK_MAX_WORKERS = 8
+
+# 子树遍历完成的标记
+_DONE = object()
+
+def scan_directory(path, skip_dir=None):
+    """
+    列出单个目录，返回 (子目录名列表, 文件名列表, 需要继续遍历的子目录路径列表)。
+    使用 os.scandir，DirEntry 缓存了文件类型，通常无需再对每个条目调用 stat。
+    与 os.walk 一致：指向目录的符号链接会出现在子目录列表中，但不会进入遍历。
+    """
+    dirs = []
+    files = []
+    descend = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(entry.name)
+                continue
+            if skip_dir and skip_dir(entry.name):
+                continue
+            dirs.append(entry.name)
+            try:
+                if not entry.is_symlink():
+                    descend.append(entry.path)
+            except OSError:
+                pass
+    return dirs, files, descend
+
+def walk(roots, skip_dir=None, max_workers=WALK_MAX_WORKERS):
+    """
+    并行遍历多个媒体库根目录，逐个产出与 os.walk 相同格式的 (目录, 子目录名列表, 文件名列表)。
+
+    1. 每个根目录及其一级子目录作为独立任务在线程池中遍历，子树内部按自上而下顺序产出，
+       不同子树之间的产出顺序不固定。
+    2. skip_dir(目录名) 返回 True 的目录不会被遍历（替代 os.walk 中原地修改 dirs 的写法）。
+    3. 调用方提前结束迭代（如 break 或 return）时，后台遍历会随之停止。
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    roots = list(dict.fromkeys(root for root in roots if root))
+
+    results = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    submitted = [0]
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media-walker")
+
+    def submit(path, split):
+        with lock:
+            submitted[0] += 1
+        executor.submit(walk_tree, path, split)
+
+    def walk_tree(top, split):
+        try:
+            stack = [top]
+            while stack and not stop.is_set():
+                path = stack.pop()
+                try:
+                    dirs, files, descend = scan_directory(path, skip_dir)
+                except OSError as e:
+                    logging.warning(f"无法读取目录，跳过: {path} ({e})")
+                    continue
+                results.put((path, dirs, files))
+                if split:
+                    # 根目录的一级子目录拆分为独立任务并行遍历
+                    for sub_path in descend:
+                        submit(sub_path, False)
+                else:
+                    stack.extend(reversed(descend))
+        except Exception as e:
+            logging.error(f"遍历目录 {top} 时出错: {e}")
+        finally:
+            results.put(_DONE)
+
+    try:
+        for root in roots:
+            if os.path.isdir(root):
+                submit(root, True)
+            else:
+                logging.warning(f"目录不存在，跳过遍历: {root}")
+
+        finished = 0
+        while True:
+            with lock:
+                if finished >= submitted[0]:
+                    break
+            item = results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,267 @@
+import os
+import re
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+import xml.etree.ElementTree as ET
+import media_walker
+from database import connect
+
+# 媒体库路径配置项及其类型，用于标记 NFO 所属的媒体库（ROOT_TYPE）
+LIBRARY_ROOT_KEYS = (
+    ('movies_path', 'movie'),
+    ('episodes_path', 'tv'),
+    ('anime_path', 'tv'),
+    ('variety_path', 'tv'),
+)
+
+# 目录索引中的字段，与 LIB_NFO_CATALOG 表的列一一对应
+CATALOG_FIELDS = (
+    'PATH', 'ROOT_TYPE', 'MTIME', 'SIZE', 'CONTENT_HASH', 'MEDIA_TYPE', 'TITLE', 'YEAR', 'SEASON',
+    'PREMIERED', 'RELEASEDATE', 'AIRED', 'DATEADDED', 'TMDB_ID', 'IMDB_ID'
+)
+
+# 进程的 umask，用于设置新建文件的默认权限；os.umask 只能通过先改后还原的方式读取，
+# 读取期间其他线程新建的文件会使用错误的权限，因此只在首次需要时加锁读取一次
+_file_umask = None
+_file_umask_lock = threading.Lock()
+
+
+def file_umask():
+    global _file_umask
+    with _file_umask_lock:
+        if _file_umask is None:
+            _file_umask = os.umask(0o022)
+            os.umask(_file_umask)
+        return _file_umask
+
+# 日期标签按原始文本匹配（与改写 dateadded 时的替换方式一致，XML 无法解析时同样可用）
+DATEADDED_PATTERN = re.compile(r'<dateadded>(.*?)</dateadded>', re.DOTALL)
+RELEASEDATE_PATTERN = re.compile(r'<releasedate>(.*?)</releasedate>', re.DOTALL)
+AIRED_PATTERN = re.compile(r'<aired>(.*?)</aired>', re.DOTALL)
+
+def library_root_types(config):
+    """从配置中读取各媒体库路径及其类型"""
+    return [(config[key], root_type) for key, root_type in LIBRARY_ROOT_KEYS if config.get(key)]
+
+def normalize_roots(roots):
+    """去掉空路径和重复路径，已被其他根目录包含的子目录不再单独遍历"""
+    roots = sorted({os.path.normpath(root) for root in roots if root})
+    result = []
+    for root in roots:
+        if not any(is_under(root, parent) for parent in result):
+            result.append(root)
+    return result
+
+def is_under(path, root):
+    return path == root or path.startswith(os.path.join(root, ''))
+
+def decode_content(data):
+    """按常见编码依次尝试解码 NFO 内容"""
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('latin-1')
+
+@contextmanager
+def open_atomic(file_path, mode='wb', encoding=None, errors=None):
+    """
+    打开同目录下的临时文件用于写入，正常结束时同步到磁盘并重命名替换原文件；
+    写入过程中出错或中断时删除临时文件，原文件保持完整。
+    临时文件以 .tmp 结尾，不会被 NFO 目录索引收录。
+    """
+    directory = os.path.dirname(file_path)
+    fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, errors=errors) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # 保留原文件的权限和属主，新文件使用默认权限（mkstemp 创建的临时文件仅所有者可读写）
+        try:
+            st = os.stat(file_path)
+            os.chmod(temp_path, st.st_mode & 0o7777)
+            os.chown(temp_path, st.st_uid, st.st_gid)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o666 & ~file_umask())
+        except OSError:
+            pass
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def write_file_atomic(file_path, data):
+    """先写入临时文件，再重命名替换原文件"""
+    with open_atomic(file_path) as f:
+        f.write(data)
+
+def element_text(root, path):
+    element = root.find(path)
+    if element is None or element.text is None:
+        return None
+    return element.text.strip()
+
+def parse_entry(path, data, st, root_type):
+    """解析 NFO 文件内容，生成目录索引记录"""
+    entry = dict.fromkeys(CATALOG_FIELDS)
+    entry.update({
+        'PATH': path,
+        'ROOT_TYPE': root_type,
+        'MTIME': st.st_mtime_ns,
+        'SIZE': st.st_size,
+        'CONTENT_HASH': hashlib.sha1(data).hexdigest(),
+    })
+
+    content = decode_content(data)
+    match = DATEADDED_PATTERN.search(content)
+    if match:
+        entry['DATEADDED'] = match.group(1)
+    match = RELEASEDATE_PATTERN.search(content)
+    if match:
+        entry['RELEASEDATE'] = match.group(1).strip()
+    match = AIRED_PATTERN.search(content)
+    if match:
+        entry['AIRED'] = match.group(1).strip()
+
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        # MEDIA_TYPE 为空表示 NFO 不是有效的 XML
+        return entry
+    entry.update({
+        'MEDIA_TYPE': root.tag,
+        'TITLE': element_text(root, 'title'),
+        'YEAR': element_text(root, 'year'),
+        'SEASON': element_text(root, 'seasonnumber'),
+        'PREMIERED': element_text(root, './/premiered'),
+        'TMDB_ID': element_text(root, ".//uniqueid[@type='tmdb']"),
+        'IMDB_ID': element_text(root, ".//uniqueid[@type='imdb']"),
+    })
+    return entry
+
+class NfoCatalog:
+    """
+    NFO 目录索引（LIB_NFO_CATALOG 表）：
+    1. 记录每个 NFO 文件的大小、修改时间、内容哈希和常用字段（标题、年份、TMDB/IMDB ID、日期等）。
+    2. 大小和修改时间未变化的文件直接复用索引记录；内容哈希未变化时只更新文件签名，不再解析。
+    3. 各脚本通过索引查询 NFO 信息，只有需要改写文件时才读取 NFO 原文。
+    """
+    def __init__(self, db_path, roots, root_types=()):
+        self.db_path = db_path
+        self.roots = normalize_roots(roots)
+        self.root_types = sorted(
+            ((os.path.normpath(path), root_type) for path, root_type in root_types if path),
+            key=lambda item: len(item[0]), reverse=True
+        )
+        self.entries = self.load()
+        self.pending = {}
+        self.seen = set()
+
+    def load(self):
+        """读取根目录下已有的索引记录"""
+        entries = {}
+        try:
+            with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+                for row in conn.execute(f"SELECT {', '.join(CATALOG_FIELDS)} FROM LIB_NFO_CATALOG"):
+                    if any(is_under(row['PATH'], root) for root in self.roots):
+                        entries[row['PATH']] = dict(row)
+        except sqlite3.Error as e:
+            logging.warning(f"读取 NFO 目录索引失败，将重新解析所有 NFO 文件: {e}")
+        return entries
+
+    def root_type(self, path):
+        for root, root_type in self.root_types:
+            if is_under(path, root):
+                return root_type
+        return 'other'
+
+    def lookup(self, path):
+        """返回 NFO 文件的最新索引记录，文件已变化时重新解析，文件不存在时返回 None"""
+        self.seen.add(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self.entries.get(path)
+        if entry is not None and entry['MTIME'] == st.st_mtime_ns and entry['SIZE'] == st.st_size:
+            return entry
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logging.warning(f"无法读取 NFO 文件: {path} ({e})")
+            return entry
+        if entry is not None and entry['CONTENT_HASH'] == hashlib.sha1(data).hexdigest():
+            entry = dict(entry, MTIME=st.st_mtime_ns, SIZE=st.st_size)
+        else:
+            entry = parse_entry(path, data, st, self.root_type(path))
+        self.entries[path] = entry
+        self.pending[path] = entry
+        return entry
+
+    def update(self, path, data):
+        """登记刚写入的文件内容（无需重新读取文件）"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = parse_entry(path, data, st, self.root_type(path))
+        self.entries[path] = entry
+        self.pending[path] = entry
+        return entry
+
+    def under(self, root):
+        """按路径顺序返回某个目录下的所有索引记录"""
+        root = os.path.normpath(root)
+        return [self.entries[path] for path in sorted(self.entries) if is_under(path, root)]
+
+    def save(self, prune=False):
+        """
+        写入有变化的索引记录。
+        prune 为 True 时删除本次遍历中未出现的记录（仅限存在的根目录，避免存储离线时清空索引）。
+        """
+        removed = []
+        if prune:
+            online_roots = [root for root in self.roots if os.path.isdir(root)]
+            removed = [path for path in self.entries
+                       if path not in self.seen and any(is_under(path, root) for root in online_roots)]
+        if not self.pending and not removed:
+            return
+        try:
+            with connect(self.db_path) as conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO LIB_NFO_CATALOG ({', '.join(CATALOG_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * len(CATALOG_FIELDS))})",
+                    [tuple(entry[field] for field in CATALOG_FIELDS) for entry in self.pending.values()]
+                )
+                conn.executemany('DELETE FROM LIB_NFO_CATALOG WHERE PATH = ?', [(path,) for path in removed])
+            logging.info(f"NFO 目录索引已更新：{len(self.pending)} 个文件有变化，{len(removed)} 个文件已移除")
+        except sqlite3.Error as e:
+            logging.error(f"保存 NFO 目录索引失败: {e}")
+        for path in removed:
+            del self.entries[path]
+        self.pending = {}
+
+def refresh_catalog(db_path, roots, root_types=()):
+    """
+    遍历根目录下的所有 NFO 文件并增量更新目录索引，返回最新的 NfoCatalog。
+    索引在各脚本之间共享，因此不排除任何目录，需要排除的目录由调用方在处理时自行跳过。
+    """
+    catalog = NfoCatalog(db_path, roots, root_types)
+    for root, dirs, files in media_walker.walk(catalog.roots):
+        for filename in files:
+            if filename.lower().endswith('.nfo'):
+                catalog.lookup(os.path.join(root, filename))
+    catalog.save(prune=True)
+    logging.info(f"NFO 目录索引共 {len(catalog.entries)} 个文件")
+    return catalog
@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+import requests
+
+# 合并通知的时间窗口（秒），窗口内的事件合并为一条摘要通知
+NOTIFY_WINDOW_SECONDS = 10
+# 单条通知的最大发送次数
+NOTIFY_MAX_RETRIES = 3
+# 单次请求超时时间（秒）
+NOTIFY_REQUEST_TIMEOUT = 10
+# 程序退出时等待队列发送完毕的最长时间（秒）
+NOTIFY_FLUSH_TIMEOUT = 30
+
+class NotificationQueue:
+    """
+    异步通知队列：
+    1. notify() 只负责入队，不会阻塞文件转移、下载等主流程。
+    2. 后台线程在时间窗口内收集事件，同组事件合并为摘要（如“某剧 第1季：12 集已入库”）。
+    3. 发送失败时按指数退避重试，程序退出前自动尝试发送剩余通知。
+    """
+    def __init__(self, title, config_getter, window=NOTIFY_WINDOW_SECONDS):
+        self.title = title
+        self.config_getter = config_getter
+        self.window = window
+        self.queue = queue.Queue()
+        self.flushing = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def notify(self, body, group=None, summary=None):
+        """
+        添加一条通知
+
+        Args:
+            body: 通知内容
+            group: 分组键，同一窗口内分组相同的通知会合并
+            summary: 合并后的摘要格式，支持 {count} 占位符
+        """
+        config = self.config_getter() or {}
+        if config.get("notification", "").lower() != "true":  # 显式检查是否为 "true"
+            logging.info("通知功能未启用，跳过发送通知。")
+            return
+        if not config.get("notification_api_key", ""):
+            logging.error("通知API Key未在配置文件中找到，无法发送通知。")
+            return
+        self.queue.put((body, group, summary))
+        self.ensure_worker()
+
+    def ensure_worker(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="notification-sender", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            events = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            # 在时间窗口内继续收集事件，退出时立即发送
+            while not self.flushing.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self.queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+            while True:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.send_with_retry(self.build_digest(events), len(events))
+            finally:
+                for _ in events:
+                    self.queue.task_done()
+
+    @staticmethod
+    def build_digest(events):
+        """将窗口内的事件合并为通知正文"""
+        grouped = {}
+        for index, (body, group, summary) in enumerate(events):
+            key = group if group is not None else ('', index)
+            grouped.setdefault(key, {'bodies': [], 'summary': summary})['bodies'].append(body)
+
+        lines = []
+        for item in grouped.values():
+            bodies = item['bodies']
+            if len(bodies) > 1 and item['summary']:
+                lines.append(item['summary'].format(count=len(bodies)))
+            else:
+                lines.extend(bodies)
+        return '\n'.join(lines)
+
+    def send_with_retry(self, body, count):
+        config = self.config_getter() or {}
+        api_key = config.get("notification_api_key", "")
+        if not api_key:
+            logging.error("通知API Key未在配置文件中找到，无法发送通知。")
+            return
+        api_url = f"https://api.day.app/{api_key}"
+        data = {
+            "title": self.title if count == 1 else f"{self.title}（{count}条）",
+            "body": body
+        }
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(NOTIFY_MAX_RETRIES):
+            try:
+                response = requests.post(api_url, data=json.dumps(data), headers=headers, timeout=NOTIFY_REQUEST_TIMEOUT)
+                if response.status_code == 200:
+                    logging.info("通知发送成功: %s", response.text)
+                    return
+                logging.error("通知发送失败: %s %s", response.status_code, response.text)
+            except requests.RequestException as e:
+                logging.error(f"网络请求出现错误: {e}")
+            if attempt < NOTIFY_MAX_RETRIES - 1:
+                wait_time = 2 ** (attempt + 1)
+                logging.info(f"通知发送失败，{wait_time} 秒后重试 ({attempt + 1}/{NOTIFY_MAX_RETRIES})")
+                time.sleep(wait_time)
+        logging.error(f"通知重试 {NOTIFY_MAX_RETRIES} 次后仍发送失败，已丢弃: {body}")
+
+    def flush(self, timeout=NOTIFY_FLUSH_TIMEOUT):
+        """立即发送队列中的通知并等待完成（最多等待 timeout 秒）"""
+        if self.thread is None:
+            return
+        self.flushing.set()
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self.queue.unfinished_tasks:
+            logging.warning(f"仍有 {self.queue.unfinished_tasks} 条通知未发送完成")
+        self.flushing.clear()
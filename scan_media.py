@@ -1,386 +1,626 @@
 import os
 import re
+import json
+import time
 import sqlite3
 import logging
-import xml.etree.ElementTree as ET
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,  # 设置日志级别为 INFO
-    format="%(asctime)s - %(levelname)s - %(message)s",  # 设置日志格式
-    handlers=[
-        logging.FileHandler("/tmp/log/scan_media.log", mode='w'),  # 输出到文件并清空之前的日志
-        logging.StreamHandler()  # 输出到控制台
-    ]
-)
-
-def load_config(db_path):
-    """从数据库中加载配置"""
+from concurrent.futures import ThreadPoolExecutor
+from media_walker import scan_directory, WALK_MAX_WORKERS
+from tv_episodes import format_episodes
+from database import connect, load_config
+from nfo_catalog import NfoCatalog
+
+MEDIA_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')
+
+# 多种电影命名格式
+MOVIE_PATTERNS = [
+    re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
+    re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
+    re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
+    re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
+    re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
+]
+
+# 多种季目录命名格式
+SEASON_PATTERNS = [
+    re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
+    re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
+    re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
+    re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
+]
+
+EPISODE_PATTERN = re.compile(r'^(.*) - S(\d+)E(\d+) - (.*)$', re.IGNORECASE)
+EPISODE_PATTERN_ALT = re.compile(r'^(.*)\.S(\d+)E(\d+)\.(.*)$', re.IGNORECASE)  # 支持点号分隔
+
+# 修改时间距扫描时刻过近的目录不记录快照，避免同一时间精度内的后续修改被遗漏
+SNAPSHOT_MTIME_GUARD_NS = 2 * 1000 * 1000 * 1000
+
+def load_scan_snapshot(db_path, kind, path):
+    """读取指定媒体库根目录下所有目录的扫描快照"""
+    snapshot = {}
+    prefix = os.path.join(path, '')
     try:
-        with sqlite3.connect(db_path) as conn:
+        with connect(db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
+            cursor.execute('SELECT PATH, MTIME, DATA FROM LIB_SCAN_SNAPSHOT WHERE KIND = ?', (kind,))
+            for dir_path, mtime, data in cursor.fetchall():
+                if dir_path == path or dir_path.startswith(prefix):
+                    record = json.loads(data)
+                    record['mtime'] = mtime
+                    snapshot[dir_path] = record
+    except (sqlite3.Error, ValueError) as e:
+        logging.warning(f"读取扫描快照失败，将执行全量扫描: {e}")
+    return snapshot
+
+def save_scan_snapshot(db_path, kind, previous, records, changed):
+    """保存有变化的目录快照，并删除已不存在的目录快照"""
+    removed = [dir_path for dir_path in previous if dir_path not in records]
+    try:
+        with connect(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                'INSERT OR REPLACE INTO LIB_SCAN_SNAPSHOT (KIND, PATH, MTIME, DATA) VALUES (?, ?, ?, ?)',
+                [(kind, dir_path, records[dir_path]['mtime'],
+                  json.dumps({k: v for k, v in records[dir_path].items() if k != 'mtime'}, ensure_ascii=False))
+                 for dir_path in changed]
+            )
+            cursor.executemany('DELETE FROM LIB_SCAN_SNAPSHOT WHERE KIND = ? AND PATH = ?', [(kind, dir_path) for dir_path in removed])
+            conn.commit()
     except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
-
-def scan_movies(path):
-    movies = []
-    media_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso']
-    
-    # 多种电影命名格式
-    movie_patterns = [
-        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-    ]
-
-    for root, _, files in os.walk(path):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in media_extensions):
-                matched = False
-                for pattern in movie_patterns:
-                    match = pattern.match(os.path.splitext(file)[0])
-                    if match:
-                        movie_name = match.group(1).strip()
-                        year = int(match.group(2))
-                        tmdb_id = None
-                        
-                        # 检查NFO文件
-                        media_file_name = os.path.splitext(file)[0]
-                        nfo_file_path = os.path.join(root, media_file_name + '.nfo')
-                        if os.path.exists(nfo_file_path):
-                            try:
-                                tree = ET.parse(nfo_file_path)
-                                root_element = tree.getroot()
-                                uniqueid_elements = root_element.findall('uniqueid')
-                                for uniqueid in uniqueid_elements:
-                                    if uniqueid.attrib.get('type') == 'tmdb':
-                                        tmdb_id = uniqueid.text.strip()
-                                        break
-                            except ET.ParseError:
-                                logging.warning(f"无法解析 NFO 文件: {nfo_file_path}")
-
-                        movies.append((movie_name, year, tmdb_id))
-                        matched = True
-                        break
-                
-                if not matched:
-                    logging.warning(f"无法从文件名提取标题和年份: {file}")
-
-    return movies
+        logging.error(f"保存扫描快照失败: {e}")
 
-def scan_episodes(path):
-    episodes = {}
-    
-    # 多种季目录命名格式
-    season_patterns = [
-        re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
-        re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
-        re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
-        re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
-    ]
-    
-    episode_pattern = re.compile(r'^(.*) - S(\d+)E(\d+) - (.*)$', re.IGNORECASE)
-    episode_pattern_alt = re.compile(r'^(.*)\.S(\d+)E(\d+)\.(.*)$', re.IGNORECASE)  # 支持点号分隔
+def file_signature(file_path):
+    """文件的 (大小, 修改时间) 签名，文件不存在时返回 None"""
+    try:
+        st = os.stat(file_path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+def snapshot_is_valid(dir_path, record):
+    """目录修改时间未变化，且目录内已解析的 NFO 文件未被原地改写时，快照仍然有效"""
+    if record is None or record.get('mtime') is None:
+        return False
+    try:
+        if os.stat(dir_path).st_mtime_ns != record['mtime']:
+            return False
+    except OSError:
+        return False
+    return all(file_signature(os.path.join(dir_path, name)) == signature for name, signature in record['deps'].items())
 
-    for root, dirs, files in os.walk(path):
-        # 检查 tvshow.nfo
-        if 'tvshow.nfo' in files:
-            tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
+def walk_library(path, previous, build_record, catalog):
+    """
+    增量遍历媒体库目录：
+    1. 目录修改时间及其 NFO 文件签名均未变化时直接复用快照，不再列目录和解析文件。
+    2. 有变化的目录重新列出并调用 build_record 生成记录，未变化的 NFO 复用上次的解析结果，
+       其余 NFO 从 NFO 目录索引中读取（索引过期时重新解析并更新索引）。
+    返回按 os.walk 自上而下顺序排列的 {目录: 记录} 和有变化的目录列表。
+    """
+    records = {}
+    changed = []
+    stack = [path]
+    while stack:
+        dir_path = stack.pop()
+        record = previous.get(dir_path)
+        if not snapshot_is_valid(dir_path, record):
             try:
-                tree = ET.parse(tvshow_nfo_path)
-                root_element = tree.getroot()
+                st = os.stat(dir_path)
+                subdirs, files, descend = scan_directory(dir_path)
+            except OSError as e:
+                logging.warning(f"无法读取目录，跳过: {dir_path} ({e})")
+                continue
 
-                title_element = root_element.find('title')
-                if title_element is not None:
-                    show_name = title_element.text.strip()
+            cached = record or {}
+            deps = {}
+            parsed = {}
+            def read_nfo(name, parser):
+                """读取目录中的 NFO 文件，签名未变化时复用上次的解析结果"""
+                nfo_path = os.path.join(dir_path, name)
+                signature = file_signature(nfo_path)
+                if signature is not None and cached.get('deps', {}).get(name) == signature:
+                    result = cached['nfo'][name]
                 else:
-                    logging.warning(f"tvshow.nfo 文件中未找到标题元素: {tvshow_nfo_path}")
-                    continue
+                    result = parser(nfo_path, catalog.lookup(nfo_path))
+                deps[name] = signature
+                parsed[name] = result
+                return result
+
+            mtime = st.st_mtime_ns
+            if time.time_ns() - mtime < SNAPSHOT_MTIME_GUARD_NS:
+                mtime = None
+            record = {
+                'mtime': mtime,
+                'subdirs': subdirs,
+                'descend': [os.path.basename(sub_path) for sub_path in descend],
+                'deps': deps,
+                'nfo': parsed
+            }
+            record.update(build_record(dir_path, files, read_nfo))
+            changed.append(dir_path)
+        records[dir_path] = record
+        stack.extend(os.path.join(dir_path, name) for name in reversed(record['descend']))
+    return records, changed
+
+def parse_movie_nfo(nfo_file_path, entry):
+    """从电影 NFO 的索引记录中读取 TMDB ID"""
+    if entry is None:
+        return None
+    if entry['MEDIA_TYPE'] is None:
+        logging.warning(f"无法解析 NFO 文件: {nfo_file_path}")
+        return None
+    return entry['TMDB_ID']
+
+def build_movie_record(root, files, read_nfo):
+    """解析单个目录中的电影文件"""
+    movies = []
+    file_set = set(files)
+    for file in files:
+        if file.lower().endswith(MEDIA_EXTENSIONS):
+            media_file_name = os.path.splitext(file)[0]
+            for pattern in MOVIE_PATTERNS:
+                match = pattern.match(media_file_name)
+                if match:
+                    movie_name = match.group(1).strip()
+                    year = int(match.group(2))
+                    tmdb_id = None
+
+                    # 检查NFO文件
+                    nfo_file_name = media_file_name + '.nfo'
+                    if nfo_file_name in file_set:
+                        tmdb_id = read_nfo(nfo_file_name, parse_movie_nfo)
+
+                    movies.append([movie_name, year, tmdb_id])
+                    break
+            else:
+                logging.warning(f"无法从文件名提取标题和年份: {file}")
+    return {'movies': movies}
+
+def collect_movies(records):
+    return [tuple(movie) for record in records.values() for movie in record['movies']]
+
+def scan_movies(path, db_path):
+    previous = load_scan_snapshot(db_path, 'movies', path)
+    catalog = NfoCatalog(db_path, [path], [(path, 'movie')])
+    records, changed = walk_library(path, previous, build_movie_record, catalog)
+    catalog.save()
+    movies = collect_movies(records)
+
+    if previous:
+        old_keys = {(title, year) for title, year, _ in collect_movies(previous)}
+        new_keys = {(title, year) for title, year, _ in movies}
+        for title, year in sorted(new_keys - old_keys):
+            logging.info(f"扫描发现新增电影: {title} ({year})")
+        for title, year in sorted(old_keys - new_keys):
+            logging.info(f"扫描发现移除电影: {title} ({year})")
+    logging.info(f"电影目录 {path} 扫描完成，共 {len(records)} 个目录，其中 {len(changed)} 个有变化")
+
+    save_scan_snapshot(db_path, 'movies', previous, records, changed)
+    return movies
 
-                tmdb_id = None
-                uniqueid_elements = root_element.findall('uniqueid')
-                for uniqueid in uniqueid_elements:
-                    if uniqueid.attrib.get('type') == 'tmdb':
-                        tmdb_id = uniqueid.text.strip()
-                        break
-
-                if show_name not in episodes:
-                    episodes[show_name] = {'tmdb_id': tmdb_id, 'seasons': {}}
-
-                # 支持多种季目录格式
-                for dir_name in dirs:
-                    season_number = None
-                    for pattern in season_patterns:
-                        match = pattern.match(dir_name)
-                        if match:
-                            season_number = int(match.group(1))
-                            break
-                    
-                    if season_number is not None:
-                        season_path = os.path.join(root, dir_name)
-                        season_nfo_path = os.path.join(season_path, 'season.nfo')
-
-                        year = None
-                        if os.path.exists(season_nfo_path):
-                            try:
-                                season_tree = ET.parse(season_nfo_path)
-                                season_root = season_tree.getroot()
-
-                                season_number_element = season_root.find('seasonnumber')
-                                if season_number_element is not None and season_number_element.text is not None:
-                                    season_number = int(season_number_element.text.strip())
-
-                                year_element = season_root.find('year')
-                                if year_element is not None and year_element.text is not None:
-                                    year = int(year_element.text.strip())
-                                else:
-                                    releasedate_element = season_root.find('releasedate')
-                                    if releasedate_element is not None and releasedate_element.text:
-                                        date_text = releasedate_element.text.strip()
-                                        match = re.match(r'(\d{4})', date_text)
-                                        if match:
-                                            year_str = match.group(1)
-                                            if not year_str.startswith('000'):
-                                                year = int(year_str)
-
-                                if season_number not in episodes[show_name]['seasons']:
-                                    episodes[show_name]['seasons'][season_number] = {'year': year, 'episodes': []}
-
-                                # 扫描该季的媒体文件
-                                for file in os.listdir(season_path):
-                                    if file.lower().endswith(('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')):
-                                        episode_match = episode_pattern.match(os.path.splitext(file)[0])
-                                        if not episode_match:
-                                            episode_match = episode_pattern_alt.match(os.path.splitext(file)[0])
-                                        
-                                        if episode_match:
-                                            episode_number = int(episode_match.group(3))
-                                            if episode_number not in episodes[show_name]['seasons'][season_number]['episodes']:
-                                                episodes[show_name]['seasons'][season_number]['episodes'].append(episode_number)
-                            except ET.ParseError:
-                                logging.warning(f"无法解析 season.nfo 文件: {season_nfo_path}")
-                                continue
-
-            except ET.ParseError:
-                logging.warning(f"无法解析 tvshow.nfo 文件: {tvshow_nfo_path}")
+def parse_tvshow_nfo(tvshow_nfo_path, entry):
+    """读取 tvshow.nfo 的标题和 TMDB ID，解析失败或无标题时返回 False"""
+    if entry is None:
+        return False
+    if entry['MEDIA_TYPE'] is None:
+        logging.warning(f"无法解析 tvshow.nfo 文件: {tvshow_nfo_path}")
+        return False
+    if entry['TITLE'] is None:
+        logging.warning(f"tvshow.nfo 文件中未找到标题元素: {tvshow_nfo_path}")
+        return False
+    return {'title': entry['TITLE'], 'tmdb_id': entry['TMDB_ID']}
+
+def parse_season_nfo(season_nfo_path, entry):
+    """读取 season.nfo 的季号和年份，解析失败时返回 False"""
+    if entry is None:
+        return False
+    if entry['MEDIA_TYPE'] is None:
+        logging.warning(f"无法解析 season.nfo 文件: {season_nfo_path}")
+        return False
+
+    season_number = int(entry['SEASON']) if entry['SEASON'] else None
+
+    year = None
+    if entry['YEAR']:
+        year = int(entry['YEAR'])
+    elif entry['RELEASEDATE']:
+        match = re.match(r'(\d{4})', entry['RELEASEDATE'])
+        if match:
+            year_str = match.group(1)
+            if not year_str.startswith('000'):
+                year = int(year_str)
+    return {'number': season_number, 'year': year}
+
+def build_episode_record(root, files, read_nfo):
+    """解析单个目录中的 tvshow.nfo、season.nfo 和剧集文件"""
+    record = {}
+    if 'tvshow.nfo' in files:
+        record['tvshow'] = read_nfo('tvshow.nfo', parse_tvshow_nfo)
+
+    # 季目录：季号默认取自目录名，season.nfo 中的季号优先
+    if 'season.nfo' in files:
+        dir_name = os.path.basename(root)
+        for pattern in SEASON_PATTERNS:
+            match = pattern.match(dir_name)
+            if match:
+                season = read_nfo('season.nfo', parse_season_nfo)
+                if season:
+                    season = {'number': season['number'] if season['number'] is not None else int(match.group(1)), 'year': season['year']}
+                record['season'] = season
+                break
+
+    episodes = []
+    for file in files:
+        if file.lower().endswith(MEDIA_EXTENSIONS):
+            media_file_name = os.path.splitext(file)[0]
+            episode_match = EPISODE_PATTERN.match(media_file_name)
+            if not episode_match:
+                episode_match = EPISODE_PATTERN_ALT.match(media_file_name)
+
+            if episode_match:
+                episodes.append([episode_match.group(1).strip(), int(episode_match.group(2)), int(episode_match.group(3))])
+    record['episodes'] = episodes
+    return record
+
+def collect_episodes(records):
+    episodes = {}
+    for root, record in records.items():
+        # 检查 tvshow.nfo
+        if 'tvshow' in record:
+            tvshow = record['tvshow']
+            if not tvshow:
                 continue
+            show_name = tvshow['title']
+            if show_name not in episodes:
+                episodes[show_name] = {'tmdb_id': tvshow['tmdb_id'], 'seasons': {}}
+
+            # 支持多种季目录格式
+            for dir_name in record['subdirs']:
+                season_record = records.get(os.path.join(root, dir_name))
+                season = season_record.get('season') if season_record else None
+                if not season:
+                    continue
+                season_number = season['number']
+                if season_number not in episodes[show_name]['seasons']:
+                    episodes[show_name]['seasons'][season_number] = {'year': season['year'], 'episodes': []}
+                season_episodes = episodes[show_name]['seasons'][season_number]['episodes']
+                for _, _, episode_number in season_record['episodes']:
+                    if episode_number not in season_episodes:
+                        season_episodes.append(episode_number)
 
         # 处理直接在根目录下的剧集文件
-        for file in files:
-            if file.lower().endswith(('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')):
-                episode_match = episode_pattern.match(os.path.splitext(file)[0])
-                if not episode_match:
-                    episode_match = episode_pattern_alt.match(os.path.splitext(file)[0])
-                
-                if episode_match:
-                    show_name = episode_match.group(1).strip()
-                    season = int(episode_match.group(2))
-                    episode = int(episode_match.group(3))
-
-                    if show_name not in episodes:
-                        episodes[show_name] = {'tmdb_id': None, 'seasons': {}}
-                    if season not in episodes[show_name]['seasons']:
-                        episodes[show_name]['seasons'][season] = {'year': None, 'episodes': []}
+        for show_name, season, episode in record['episodes']:
+            if show_name not in episodes:
+                episodes[show_name] = {'tmdb_id': None, 'seasons': {}}
+            if season not in episodes[show_name]['seasons']:
+                episodes[show_name]['seasons'][season] = {'year': None, 'episodes': []}
 
-                    if episode not in episodes[show_name]['seasons'][season]['episodes']:
-                        episodes[show_name]['seasons'][season]['episodes'].append(episode)
+            if episode not in episodes[show_name]['seasons'][season]['episodes']:
+                episodes[show_name]['seasons'][season]['episodes'].append(episode)
 
     return episodes
 
-def insert_or_update_movies(db_path, movies):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def flatten_episodes(episodes):
+    return {
+        (show_name, season, episode)
+        for show_name, show_info in episodes.items()
+        for season, season_info in show_info['seasons'].items()
+        for episode in season_info['episodes']
+    }
+
+def scan_episodes(path, db_path):
+    previous = load_scan_snapshot(db_path, 'episodes', path)
+    catalog = NfoCatalog(db_path, [path], [(path, 'tv')])
+    records, changed = walk_library(path, previous, build_episode_record, catalog)
+    catalog.save()
+    episodes = collect_episodes(records)
+
+    if previous:
+        old_keys = flatten_episodes(collect_episodes(previous))
+        new_keys = flatten_episodes(episodes)
+        for show_name, season, episode in sorted(new_keys - old_keys):
+            logging.info(f"扫描发现新增剧集: {show_name} S{season:02d}E{episode:02d}")
+        for show_name, season, episode in sorted(old_keys - new_keys):
+            logging.info(f"扫描发现移除剧集: {show_name} S{season:02d}E{episode:02d}")
+    logging.info(f"剧集目录 {path} 扫描完成，共 {len(records)} 个目录，其中 {len(changed)} 个有变化")
+
+    save_scan_snapshot(db_path, 'episodes', previous, records, changed)
+    return episodes
 
-    for title, year, tmdb_id in movies:
-        cursor.execute('SELECT id, tmdb_id FROM LIB_MOVIES WHERE title = ? AND year = ?', (title, year))
-        existing_movie = cursor.fetchone()
-        
-        if existing_movie:
-            logging.debug(f"电影 '{title} ({year})' 已存在于数据库中。")
-            existing_tmdb_id = existing_movie[1]
-            
-            # 添加调试日志
-            logging.debug(f"比较 TMDB ID: 当前值={tmdb_id}, 数据库值={existing_tmdb_id}")
-            
-            # 确保数据类型一致
-            if tmdb_id and str(tmdb_id).strip() != str(existing_tmdb_id).strip():
-                cursor.execute('UPDATE LIB_MOVIES SET tmdb_id = ? WHERE id = ?', (tmdb_id, existing_movie[0]))
-                logging.info(f"已更新电影 '{title} ({year})' 的 TMDB ID: {tmdb_id}")
-            else:
-                logging.debug(f"电影 '{title} ({year})' 的 TMDB ID 未发生变化。")
-        else:
-            cursor.execute('INSERT INTO LIB_MOVIES (title, year, tmdb_id) VALUES (?, ?, ?)', (title, year, tmdb_id))
-            logging.info(f"已将电影 '{title} ({year})' 插入数据库。")
+def save_movies(db_path, movies):
+    """
+    将电影扫描结果同步到 LIB_MOVIES：
+    扫描结果先批量写入临时表，再用一条 UPSERT 插入新电影/更新 TMDB ID，一条 DELETE 删除多余记录，
+    全部在同一事务中完成。
+    """
+    conn = connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE SCAN_MOVIES (TITLE TEXT NOT NULL, YEAR INTEGER NOT NULL, TMDB_ID INTEGER)')
+        cursor.executemany(
+            'INSERT INTO SCAN_MOVIES (TITLE, YEAR, TMDB_ID) VALUES (?, ?, ?)',
+            [(title, int(year), str(tmdb_id).strip() or None if tmdb_id else None) for title, year, tmdb_id in movies]
+        )
+        cursor.execute('CREATE INDEX temp.IDX_SCAN_MOVIES ON SCAN_MOVIES (TITLE, YEAR)')
+
+        cursor.execute('''
+            SELECT DISTINCT TITLE, YEAR FROM SCAN_MOVIES s
+            WHERE NOT EXISTS (SELECT 1 FROM LIB_MOVIES m WHERE m.TITLE = s.TITLE AND m.YEAR = s.YEAR)
+        ''')
+        new_movies = cursor.fetchall()
+
+        # 同名同年份的多个文件按扫描顺序处理，最后一个非空的 TMDB ID 生效
+        cursor.execute('''
+            INSERT INTO LIB_MOVIES (TITLE, YEAR, TMDB_ID)
+            SELECT TITLE, YEAR, TMDB_ID FROM SCAN_MOVIES WHERE true ORDER BY ROWID
+            ON CONFLICT(TITLE, YEAR) DO UPDATE SET TMDB_ID = excluded.TMDB_ID
+            WHERE excluded.TMDB_ID IS NOT NULL AND LIB_MOVIES.TMDB_ID IS NOT excluded.TMDB_ID
+        ''')
+        updated_count = cursor.rowcount - len(new_movies)
+
+        cursor.execute('''
+            DELETE FROM LIB_MOVIES
+            WHERE NOT EXISTS (SELECT 1 FROM SCAN_MOVIES s WHERE s.TITLE = LIB_MOVIES.TITLE AND s.YEAR = LIB_MOVIES.YEAR)
+            RETURNING TITLE, YEAR
+        ''')
+        deleted_movies = cursor.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+    for title, year in new_movies:
+        logging.info(f"已将电影 '{title} ({year})' 插入数据库。")
+    for title, year in deleted_movies:
+        logging.info(f"已从数据库中删除电影 '{title} ({year})'。")
+    logging.info(f"电影数据同步完成：新增 {len(new_movies)} 部，更新 TMDB ID {max(updated_count, 0)} 部，删除 {len(deleted_movies)} 部")
 
-def insert_or_update_episodes(db_path, episodes):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def save_episodes(db_path, episodes):
+    """
+    将电视剧扫描结果同步到 LIB_TVS、LIB_TV_SEASONS 和 LIB_TV_EPISODES，同一事务中按集合批量完成：
+    1. 同名电视剧只保留一条（优先保留有 TMDB ID 的条目），缺少 TMDB ID 时用扫描结果补全。
+    2. 插入新电视剧，删除已不存在的电视剧及其所有季。
+    3. 季和每一集与扫描结果保持一致，删除已不存在的季和集。
+    """
+    conn = connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE SCAN_TVS (TITLE TEXT PRIMARY KEY, TMDB_ID INTEGER)')
+        cursor.execute('CREATE TEMP TABLE SCAN_SEASONS (TITLE TEXT NOT NULL, SEASON INTEGER NOT NULL, YEAR INTEGER, EPISODES TEXT, PRIMARY KEY (TITLE, SEASON))')
+        cursor.execute('CREATE TEMP TABLE SCAN_EPISODES (TITLE TEXT NOT NULL, SEASON INTEGER NOT NULL, EPISODE INTEGER NOT NULL, PRIMARY KEY (TITLE, SEASON, EPISODE))')
+        cursor.executemany(
+            'INSERT INTO SCAN_TVS (TITLE, TMDB_ID) VALUES (?, ?)',
+            [(show_name, str(show_info['tmdb_id']).strip() or None if show_info['tmdb_id'] else None) for show_name, show_info in episodes.items()]
+        )
+        cursor.executemany(
+            'INSERT INTO SCAN_SEASONS (TITLE, SEASON, YEAR, EPISODES) VALUES (?, ?, ?, ?)',
+            [(show_name, season, season_info['year'], format_episodes(set(season_info['episodes'])))
+             for show_name, show_info in episodes.items()
+             for season, season_info in show_info['seasons'].items()]
+        )
+        cursor.executemany(
+            'INSERT OR IGNORE INTO SCAN_EPISODES (TITLE, SEASON, EPISODE) VALUES (?, ?, ?)',
+            [(show_name, season, episode)
+             for show_name, show_info in episodes.items()
+             for season, season_info in show_info['seasons'].items()
+             for episode in season_info['episodes']]
+        )
+
+        # 删除同名的重复电视剧条目
+        cursor.execute('''
+            CREATE TEMP TABLE DUPLICATE_TVS AS
+            SELECT t.ID AS ID, t.TITLE AS TITLE FROM LIB_TVS t JOIN SCAN_TVS s ON s.TITLE = t.TITLE
+            WHERE t.ID != (
+                SELECT k.ID FROM LIB_TVS k WHERE k.TITLE = t.TITLE
+                ORDER BY (k.TMDB_ID IS NULL OR k.TMDB_ID = ''), k.YEAR, k.ID LIMIT 1
+            )
+        ''')
+        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE TV_ID IN (SELECT ID FROM DUPLICATE_TVS)')
+        cursor.execute('DELETE FROM LIB_TVS WHERE ID IN (SELECT ID FROM DUPLICATE_TVS) RETURNING TITLE, ID')
+        duplicate_tvs = cursor.fetchall()
+
+        cursor.execute('''
+            UPDATE LIB_TVS SET TMDB_ID = s.TMDB_ID
+            FROM SCAN_TVS s
+            WHERE s.TITLE = LIB_TVS.TITLE AND s.TMDB_ID IS NOT NULL
+              AND (LIB_TVS.TMDB_ID IS NULL OR LIB_TVS.TMDB_ID = '')
+            RETURNING TITLE, TMDB_ID
+        ''')
+        updated_tvs = cursor.fetchall()
+
+        cursor.execute('''
+            INSERT INTO LIB_TVS (TITLE, TMDB_ID)
+            SELECT TITLE, TMDB_ID FROM SCAN_TVS s
+            WHERE NOT EXISTS (SELECT 1 FROM LIB_TVS t WHERE t.TITLE = s.TITLE)
+            RETURNING TITLE
+        ''')
+        new_tvs = cursor.fetchall()
+
+        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE TV_ID IN (SELECT ID FROM LIB_TVS t WHERE NOT EXISTS (SELECT 1 FROM SCAN_TVS s WHERE s.TITLE = t.TITLE))')
+        cursor.execute('DELETE FROM LIB_TVS WHERE NOT EXISTS (SELECT 1 FROM SCAN_TVS s WHERE s.TITLE = LIB_TVS.TITLE) RETURNING TITLE')
+        deleted_tvs = cursor.fetchall()
+
+        # 此时每个扫描到的标题在 LIB_TVS 中恰好对应一条记录
+        cursor.execute('''
+            CREATE TEMP TABLE SCAN_SEASON_IDS AS
+            SELECT t.ID AS TV_ID, t.TITLE AS TITLE, s.SEASON AS SEASON, s.YEAR AS YEAR, s.EPISODES AS EPISODES
+            FROM SCAN_SEASONS s JOIN LIB_TVS t ON t.TITLE = s.TITLE
+        ''')
+        cursor.execute('CREATE INDEX temp.IDX_SCAN_SEASON_IDS ON SCAN_SEASON_IDS (TV_ID, SEASON)')
+        cursor.execute('''
+            CREATE TEMP TABLE SCAN_EPISODE_IDS AS
+            SELECT s.TV_ID AS TV_ID, e.SEASON AS SEASON, e.EPISODE AS EPISODE
+            FROM SCAN_EPISODES e JOIN SCAN_SEASON_IDS s ON s.TITLE = e.TITLE AND s.SEASON = e.SEASON
+        ''')
+        cursor.execute('CREATE INDEX temp.IDX_SCAN_EPISODE_IDS ON SCAN_EPISODE_IDS (TV_ID, SEASON, EPISODE)')
+        cursor.execute('SELECT DISTINCT TV_ID, TITLE FROM SCAN_SEASON_IDS')
+        titles = dict(cursor.fetchall())
+
+        cursor.execute('''
+            DELETE FROM LIB_TV_SEASONS
+            WHERE NOT EXISTS (SELECT 1 FROM SCAN_SEASON_IDS s WHERE s.TV_ID = LIB_TV_SEASONS.TV_ID AND s.SEASON = LIB_TV_SEASONS.SEASON)
+            RETURNING TV_ID, SEASON
+        ''')
+        deleted_seasons = cursor.fetchall()
+
+        # 有新增集数或数据库中缺少年份时，使用扫描到的季年份
+        cursor.execute('''
+            UPDATE LIB_TV_SEASONS SET
+                YEAR = CASE
+                    WHEN s.YEAR IS NOT NULL AND s.YEAR != 0
+                         AND (LIB_TV_SEASONS.YEAR IS NULL OR LIB_TV_SEASONS.YEAR IN (0, '') OR EXISTS (
+                             SELECT 1 FROM SCAN_EPISODE_IDS n
+                             WHERE n.TV_ID = LIB_TV_SEASONS.TV_ID AND n.SEASON = LIB_TV_SEASONS.SEASON
+                               AND NOT EXISTS (
+                                   SELECT 1 FROM LIB_TV_EPISODES x
+                                   WHERE x.TV_ID = n.TV_ID AND x.SEASON = n.SEASON AND x.EPISODE = n.EPISODE
+                               )
+                         ))
+                    THEN s.YEAR ELSE LIB_TV_SEASONS.YEAR END,
+                EPISODES = s.EPISODES
+            FROM SCAN_SEASON_IDS s
+            WHERE s.TV_ID = LIB_TV_SEASONS.TV_ID AND s.SEASON = LIB_TV_SEASONS.SEASON
+              AND (LIB_TV_SEASONS.EPISODES IS NOT s.EPISODES
+                   OR (s.YEAR IS NOT NULL AND s.YEAR != 0 AND (LIB_TV_SEASONS.YEAR IS NULL OR LIB_TV_SEASONS.YEAR IN (0, ''))))
+            RETURNING TV_ID, SEASON, YEAR, EPISODES
+        ''')
+        updated_seasons = cursor.fetchall()
+
+        cursor.execute('''
+            INSERT INTO LIB_TV_SEASONS (TV_ID, SEASON, YEAR, EPISODES)
+            SELECT TV_ID, SEASON, YEAR, EPISODES FROM SCAN_SEASON_IDS s
+            WHERE NOT EXISTS (SELECT 1 FROM LIB_TV_SEASONS x WHERE x.TV_ID = s.TV_ID AND x.SEASON = s.SEASON)
+            RETURNING TV_ID, SEASON, YEAR, EPISODES
+        ''')
+        new_seasons = cursor.fetchall()
+
+        # 每一集与扫描结果保持一致
+        cursor.execute('''
+            DELETE FROM LIB_TV_EPISODES
+            WHERE NOT EXISTS (
+                SELECT 1 FROM SCAN_EPISODE_IDS n
+                WHERE n.TV_ID = LIB_TV_EPISODES.TV_ID AND n.SEASON = LIB_TV_EPISODES.SEASON AND n.EPISODE = LIB_TV_EPISODES.EPISODE
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO LIB_TV_EPISODES (TV_ID, SEASON, EPISODE)
+            SELECT TV_ID, SEASON, EPISODE FROM SCAN_EPISODE_IDS WHERE true
+            ON CONFLICT DO NOTHING
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
 
-    for show_name, show_info in episodes.items():
-        tmdb_id = show_info['tmdb_id']
-        # 查询所有同名电视剧
-        cursor.execute('SELECT id, tmdb_id FROM LIB_TVS WHERE title = ?', (show_name,))
-        existing_tvs = cursor.fetchall()
-        
-        tv_id = None
-        if existing_tvs:
-            # 优先使用有tmdb_id的条目
-            for existing_tv in existing_tvs:
-                if existing_tv[1] is not None and existing_tv[1] != '':
-                    tv_id = existing_tv[0]
-                    logging.debug(f"电视剧 '{show_name}' 已存在于数据库中。")
-                    break
-            
-            # 如果没有tmdb_id，则使用第一个条目
-            if tv_id is None:
-                tv_id = existing_tvs[0][0]
-                # 如果扫描到tmdb_id而数据库中没有，则更新
-                if tmdb_id:
-                    cursor.execute('UPDATE LIB_TVS SET tmdb_id = ? WHERE id = ?', (tmdb_id, tv_id))
-                    logging.info(f"已更新电视剧 '{show_name}' 的 TMDB ID: {tmdb_id}")
-                
-            # 删除其他重复条目
-            if len(existing_tvs) > 1:
-                for existing_tv in existing_tvs:
-                    if existing_tv[0] != tv_id:
-                        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE tv_id = ?', (existing_tv[0],))
-                        cursor.execute('DELETE FROM LIB_TVS WHERE id = ?', (existing_tv[0],))
-                        logging.info(f"已删除重复的电视剧条目: {show_name} (ID: {existing_tv[0]})")
-        else:
-            cursor.execute('INSERT INTO LIB_TVS (title, tmdb_id) VALUES (?, ?)', (show_name, tmdb_id))
-            tv_id = cursor.lastrowid
-            logging.info(f"已将电视剧 '{show_name}' 插入数据库。")
-
-        for season, season_info in show_info['seasons'].items():
-            year = season_info['year']
-            current_episodes = set(season_info['episodes'])
-
-            cursor.execute('SELECT id, episodes FROM LIB_TV_SEASONS WHERE tv_id = ? AND season = ?', (tv_id, season))
-            existing_season = cursor.fetchone()
-
-            if existing_season:
-                existing_episodes_str = existing_season[1]
-                logging.debug(f"现有集数字符串: {existing_episodes_str}")
-                
-                # 确保 existing_episodes_str 是字符串
-                if isinstance(existing_episodes_str, int):
-                    existing_episodes_str = str(existing_episodes_str)
-                    logging.warning(f"集数字符串被错误地存储为整数，已转换为字符串: {existing_episodes_str}")
+    for title, tv_id in duplicate_tvs:
+        logging.info(f"已删除重复的电视剧条目: {title} (ID: {tv_id})")
+    for title, tmdb_id in updated_tvs:
+        logging.info(f"已更新电视剧 '{title}' 的 TMDB ID: {tmdb_id}")
+    for (title,) in new_tvs:
+        logging.info(f"已将电视剧 '{title}' 插入数据库。")
+    for (title,) in deleted_tvs:
+        logging.info(f"已从数据库中删除电视剧 '{title}' 及其所有季。")
+    for tv_id, season in deleted_seasons:
+        logging.info(f"电视剧 '{titles.get(tv_id, tv_id)}' 第 {season} 季已不存在，移除该季记录。")
+    for tv_id, season, year, episodes_str in updated_seasons:
+        logging.info(f"已更新电视剧 '{titles.get(tv_id, tv_id)}' 第 {season} 季的集数和年份：{episodes_str}, {year}")
+    for tv_id, season, year, episodes_str in new_seasons:
+        logging.info(f"已将电视剧 '{titles.get(tv_id, tv_id)}' 第 {season} 季的集数 {episodes_str} 和年份 {year} 插入数据库。")
+
+def scan_media_directory(db_path, path, build_record, root_type):
+    """遍历单个电影或剧集目录（不读写扫描快照），NFO 信息从目录索引中读取"""
+    catalog = NfoCatalog(db_path, [path], [(path, root_type)])
+    records, changed = walk_library(path, {}, build_record, catalog)
+    catalog.save()
+    return records
+
+def add_movie_directory(db_path, movie_dir):
+    """
+    文件转移到电影目录后增量登记：只扫描该目录，插入新电影或补全 TMDB ID，不删除任何记录
+    （删除和改名仍由全量扫描处理）。返回扫描到的 (标题, 年份) 列表。
+    """
+    movies = collect_movies(scan_media_directory(db_path, movie_dir, build_movie_record, 'movie'))
+    if not movies:
+        return []
+    conn = connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for title, year, tmdb_id in movies:
+            tmdb_id = str(tmdb_id).strip() or None if tmdb_id else None
+            if not cursor.execute('SELECT 1 FROM LIB_MOVIES WHERE TITLE = ? AND YEAR = ?', (title, year)).fetchone():
+                logging.info(f"已将电影 '{title} ({year})' 插入数据库。")
+            cursor.execute('''
+                INSERT INTO LIB_MOVIES (TITLE, YEAR, TMDB_ID) VALUES (?, ?, ?)
+                ON CONFLICT(TITLE, YEAR) DO UPDATE SET TMDB_ID = excluded.TMDB_ID
+                WHERE excluded.TMDB_ID IS NOT NULL AND LIB_MOVIES.TMDB_ID IS NOT excluded.TMDB_ID
+            ''', (title, year, tmdb_id))
+        conn.commit()
+    finally:
+        conn.close()
+    return [(title, year) for title, year, _ in movies]
 
-                if existing_episodes_str:  # 检查是否为空字符串
-                    existing_episodes = set(map(int, existing_episodes_str.split(',')))
-                else:
-                    existing_episodes = set()
-                    logging.debug(f"现有集数为空，初始化为空集。")
-
-                # 检查数据库中季年份是否为空，如果为空且本次扫描到季年份，则更新
-                cursor.execute('SELECT year FROM LIB_TV_SEASONS WHERE id = ?', (existing_season[0],))
-                db_year = cursor.fetchone()[0]
-                if (db_year is None or db_year == 0 or db_year == '') and year:
-                    cursor.execute('UPDATE LIB_TV_SEASONS SET year = ? WHERE id = ?', (year, existing_season[0]))
-                    logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的年份：{year}")
-
-                # 只更新新增的集数
-                new_episodes = current_episodes - existing_episodes
-                if new_episodes:
-                    updated_episodes_str = ','.join(map(str, sorted(existing_episodes.union(new_episodes))))
-                    cursor.execute('UPDATE LIB_TV_SEASONS SET episodes = ?, year = ? WHERE id = ?', (updated_episodes_str, year, existing_season[0]))
-                    logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的集数和年份：{updated_episodes_str}, {year}")
-                else:
-                    logging.debug(f"电视剧 '{show_name}' 第 {season} 季已是最新状态。")
+def add_show_directory(db_path, show_dir):
+    """
+    文件转移到剧集目录后增量登记：只扫描该剧集目录，插入新的电视剧、季和集，补全缺少的 TMDB ID 和年份，
+    不删除任何记录（删除和改名仍由全量扫描处理）。返回扫描到的剧集标题列表。
+    """
+    episodes = collect_episodes(scan_media_directory(db_path, show_dir, build_episode_record, 'tv'))
+    if not episodes:
+        return []
+    # 与 update_tv_year 相同，剧集目录名为“标题 (年份)”时使用其中的年份
+    match = re.match(r'^(.*)\s+\((\d{4})\)', os.path.basename(os.path.normpath(show_dir)))
+    conn = connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for show_name, show_info in episodes.items():
+            tmdb_id = str(show_info['tmdb_id']).strip() or None if show_info['tmdb_id'] else None
+            # 与 save_episodes 相同，同名电视剧优先使用有 TMDB ID 的条目
+            row = cursor.execute('''
+                SELECT ID, TMDB_ID FROM LIB_TVS WHERE TITLE = ?
+                ORDER BY (TMDB_ID IS NULL OR TMDB_ID = ''), YEAR, ID LIMIT 1
+            ''', (show_name,)).fetchone()
+            if row is None:
+                year = int(match.group(2)) if match and match.group(1).strip() == show_name else None
+                tv_id = cursor.execute(
+                    'INSERT INTO LIB_TVS (TITLE, YEAR, TMDB_ID) VALUES (?, ?, ?)', (show_name, year, tmdb_id)
+                ).lastrowid
+                logging.info(f"已将电视剧 '{show_name}' 插入数据库。")
             else:
-                episodes_str = ','.join(map(str, sorted(current_episodes)))
-                cursor.execute('INSERT INTO LIB_TV_SEASONS (tv_id, season, year, episodes) VALUES (?, ?, ?, ?)', (tv_id, season, year, episodes_str))
-                logging.info(f"已将电视剧 '{show_name}' 第 {season} 季的集数 {episodes_str} 和年份 {year} 插入数据库。")
-
-    conn.commit()
-    conn.close()
-
-def delete_obsolete_movies(db_path, current_movies):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT title, year FROM LIB_MOVIES')
-    all_movies = cursor.fetchall()
-
-    # 将 current_movies 转换为 {(title, year)} 集合，并确保 year 是整数类型
-    current_movies_set = {(title, int(year)) for title, year, _ in current_movies}
-
-    for title, year in all_movies:
-        if (title, year) not in current_movies_set:
-            cursor.execute('DELETE FROM LIB_MOVIES WHERE title = ? AND year = ?', (title, year))
-            logging.info(f"已从数据库中删除电影 '{title} ({year})'。")
-
-    conn.commit()
-    conn.close()
-
-def delete_obsolete_episodes(db_path, current_episodes):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT id, title FROM LIB_TVS')
-    all_shows = cursor.fetchall()
-
-    for tv_id, title in all_shows:
-        if title not in current_episodes:
-            cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE tv_id = ?', (tv_id,))
-            cursor.execute('DELETE FROM LIB_TVS WHERE id = ?', (tv_id,))
-            logging.info(f"已从数据库中删除电视剧 '{title}' 及其所有季。")
-        else:
-            cursor.execute('SELECT id, season, episodes FROM LIB_TV_SEASONS WHERE tv_id = ?', (tv_id,))
-            all_seasons = cursor.fetchall()
-
-            for season_id, season, episodes_str in all_seasons:
-                # 类型检查，确保 episodes_str 是字符串
-                if isinstance(episodes_str, int):
-                    episodes_str = str(episodes_str)
-                    logging.warning(f"电视剧 '{title}' 第 {season} 季的集数字段为整数，已转换为字符串: {episodes_str}")
-
-                # 检查 episodes_str 是否为空字符串
-                if not episodes_str or not episodes_str.strip():
-                    existing_episodes = set()
-                    logging.warning(f"电视剧 '{title}' 第 {season} 季的集数为空，初始化为空集。")
-                else:
-                    try:
-                        existing_episodes = set(map(int, episodes_str.split(',')))
-                    except ValueError as e:
-                        logging.error(f"无法解析电视剧 '{title}' 第 {season} 季的集数: {episodes_str}. 错误: {e}")
-                        existing_episodes = set()
-
-                # 获取当前扫描到的集数，如果不存在则默认为空集
-                current_episodes_for_season = current_episodes.get(title, {}).get('seasons', {}).get(season, {}).get('episodes', [])
-                current_episodes_set = set(current_episodes_for_season)
-
-                # 检查是否有集数被删除
-                removed_episodes = existing_episodes - current_episodes_set
-                if removed_episodes:
-                    # 从数据库中移除被删除的集数
-                    updated_episodes = existing_episodes - removed_episodes
-                    if updated_episodes:
-                        updated_episodes_str = ','.join(map(str, sorted(updated_episodes)))
-                        cursor.execute('UPDATE LIB_TV_SEASONS SET episodes = ? WHERE id = ?', (updated_episodes_str, season_id))
-                        logging.info(f"已从电视剧 '{title}' 第 {season} 季中移除集数: {sorted(removed_episodes)}")
-                    else:
-                        # 如果该季所有集数都被删除，则删除该季记录
-                        cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE id = ?', (season_id,))
-                        logging.info(f"电视剧 '{title}' 第 {season} 季所有集数已被删除，移除该季记录。")
-                else:
-                    logging.debug(f"电视剧 '{title}' 第 {season} 季没有集数被删除。")
+                tv_id = row[0]
+                if tmdb_id and not row[1]:
+                    cursor.execute('UPDATE LIB_TVS SET TMDB_ID = ? WHERE ID = ?', (tmdb_id, tv_id))
+                    logging.info(f"已更新电视剧 '{show_name}' 的 TMDB ID: {tmdb_id}")
 
-    conn.commit()
-    conn.close()
+            for season, season_info in show_info['seasons'].items():
+                cursor.executemany(
+                    'INSERT OR IGNORE INTO LIB_TV_EPISODES (TV_ID, SEASON, EPISODE) VALUES (?, ?, ?)',
+                    [(tv_id, season, episode) for episode in season_info['episodes']]
+                )
+                added = cursor.rowcount > 0
+                episodes_str = format_episodes(episode for (episode,) in cursor.execute(
+                    'SELECT EPISODE FROM LIB_TV_EPISODES WHERE TV_ID = ? AND SEASON = ?', (tv_id, season)
+                ).fetchall())
+                season_year = season_info['year']
+                season_row = cursor.execute(
+                    'SELECT ID, YEAR, EPISODES FROM LIB_TV_SEASONS WHERE TV_ID = ? AND SEASON = ?', (tv_id, season)
+                ).fetchone()
+                if season_row is None:
+                    cursor.execute(
+                        'INSERT INTO LIB_TV_SEASONS (TV_ID, SEASON, YEAR, EPISODES) VALUES (?, ?, ?, ?)',
+                        (tv_id, season, season_year, episodes_str)
+                    )
+                    logging.info(f"已将电视剧 '{show_name}' 第 {season} 季的集数 {episodes_str} 和年份 {season_year} 插入数据库。")
+                    continue
+                # 与 save_episodes 相同：有新增集数或数据库中缺少年份时，使用扫描到的季年份
+                year = season_row[1]
+                if season_year and (added or year in (None, 0, '')):
+                    year = season_year
+                if episodes_str != season_row[2] or year != season_row[1]:
+                    cursor.execute(
+                        'UPDATE LIB_TV_SEASONS SET YEAR = ?, EPISODES = ? WHERE ID = ?', (year, episodes_str, season_row[0])
+                    )
+                    logging.info(f"已更新电视剧 '{show_name}' 第 {season} 季的集数和年份：{episodes_str}, {year}")
+        conn.commit()
+    finally:
+        conn.close()
+    return list(episodes)
 
 def update_tv_year(base_path, db_path):
     # 正则表达式用于匹配电视剧标题和年份
@@ -408,7 +648,7 @@ def update_tv_year(base_path, db_path):
 
     def update_database(db_path, shows):
         # 连接到数据库
-        conn = sqlite3.connect(db_path)
+        conn = connect(db_path)
         cursor = conn.cursor()
         
         # 更新数据库中的记录
@@ -450,7 +690,7 @@ def clean_duplicate_tvs(db_path):
     """
     清理LIB_TVS表中的重复和无效数据
     """
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
     
     # 查找完全重复的条目(标题相同)
@@ -493,6 +733,7 @@ def clean_duplicate_tvs(db_path):
         for delete_id in entries_to_delete:
             cursor.execute('DELETE FROM LIB_TVS WHERE id = ?', (delete_id,))
             cursor.execute('DELETE FROM LIB_TV_SEASONS WHERE tv_id = ?', (delete_id,))
+            cursor.execute('DELETE FROM LIB_TV_EPISODES WHERE tv_id = ?', (delete_id,))
             logging.info(f"已删除重复的电视剧条目: {title} (ID: {delete_id})")
             
         # 更新保留条目的缺失信息
@@ -511,13 +752,19 @@ def main():
     anime_path = config.get('anime_path', episodes_path)  # 如果没有设置动漫路径，则使用电视剧路径
     variety_path = config.get('variety_path', episodes_path)  # 如果没有设置综艺路径，则使用电视剧路径
 
+    # 各媒体库根目录通常位于不同磁盘，并行扫描（同一路径只扫描一次）
+    with ThreadPoolExecutor(max_workers=WALK_MAX_WORKERS) as executor:
+        movies_future = executor.submit(scan_movies, movies_path, db_path) if os.path.exists(movies_path) else None
+        episode_futures = {}
+        for path in (episodes_path, anime_path, variety_path):
+            if path not in episode_futures and os.path.exists(path):
+                episode_futures[path] = executor.submit(scan_episodes, path, db_path)
+
     # 扫描电影目录
-    if os.path.exists(movies_path):
-        movies = scan_movies(movies_path)
-        # 插入或更新电影数据
-        insert_or_update_movies(db_path, movies)
-        # 删除数据库中多余的电影记录
-        delete_obsolete_movies(db_path, movies)
+    if movies_future:
+        movies = movies_future.result()
+        # 插入或更新电影数据，并删除数据库中多余的电影记录
+        save_movies(db_path, movies)
     else:
         logging.warning(f"电影目录不存在: {movies_path}")
 
@@ -525,8 +772,8 @@ def main():
     all_episodes = {}
 
     # 扫描电视剧目录
-    if os.path.exists(episodes_path):
-        episodes = scan_episodes(episodes_path)
+    if episodes_path in episode_futures:
+        episodes = episode_futures[episodes_path].result()
         # 合并到all_episodes
         for show_name, show_info in episodes.items():
             all_episodes[show_name] = show_info
@@ -534,8 +781,8 @@ def main():
         logging.warning(f"电视剧目录不存在: {episodes_path}")
 
     # 扫描动漫目录
-    if os.path.exists(anime_path) and anime_path != episodes_path:
-        anime_episodes = scan_episodes(anime_path)
+    if anime_path in episode_futures and anime_path != episodes_path:
+        anime_episodes = episode_futures[anime_path].result()
         # 合并到all_episodes
         for show_name, show_info in anime_episodes.items():
             all_episodes[show_name] = show_info
@@ -543,8 +790,8 @@ def main():
         logging.warning(f"动漫目录不存在: {anime_path}")
 
     # 扫描综艺目录
-    if os.path.exists(variety_path) and variety_path != episodes_path:
-        variety_episodes = scan_episodes(variety_path)
+    if variety_path in episode_futures and variety_path != episodes_path:
+        variety_episodes = episode_futures[variety_path].result()
         # 合并到all_episodes
         for show_name, show_info in variety_episodes.items():
             all_episodes[show_name] = show_info
@@ -553,9 +800,8 @@ def main():
 
     # 插入或更新电视剧数据
     if all_episodes:
-        insert_or_update_episodes(db_path, all_episodes)
-        # 删除数据库中多余的电视剧记录
-        delete_obsolete_episodes(db_path, all_episodes)
+        # 同时删除数据库中多余的电视剧记录
+        save_episodes(db_path, all_episodes)
     
     # 更新电视剧年份信息（对所有目录进行操作）
     if os.path.exists(episodes_path):
@@ -569,4 +815,13 @@ def main():
     clean_duplicate_tvs(db_path)
 
 if __name__ == "__main__":
+    # 作为脚本运行时才配置日志（sync.py 导入本模块做增量更新时沿用其日志配置）
+    logging.basicConfig(
+        level=logging.INFO,  # 设置日志级别为 INFO
+        format="%(asctime)s - %(levelname)s - %(message)s",  # 设置日志格式
+        handlers=[
+            logging.FileHandler("/tmp/log/scan_media.log", mode='w'),  # 输出到文件并清空之前的日志
+            logging.StreamHandler()  # 输出到控制台
+        ]
+    )
     main()
\ No newline at end of file
@@ -4,10 +4,60 @@ import sqlite3
 import logging
 import requests
 import xml.etree.ElementTree as ET
-import xml.dom.minidom
 from datetime import datetime
-import time
-import random
+from concurrent.futures import ThreadPoolExecutor
+import media_walker
+from database import connect, load_config
+from nfo_catalog import open_atomic
+from api_cache import RateLimiter
+from artwork_cache import ArtworkCache
+
+# TMDB 请求间隔（秒），所有线程共享同一个限速器
+TMDB_REQUEST_INTERVAL = 0.1
+# TMDB 请求超时时间（秒）
+TMDB_REQUEST_TIMEOUT = 10
+# 同时查询和生成 NFO 的线程数（TMDB 请求仍受限速器约束）
+SCRAPE_MAX_WORKERS = 4
+
+# 需要下载的图片：(配置项, 信息字段, 文件名)
+ARTWORK_FILES = (
+    ('scrape_poster', 'poster', 'poster.jpg'),
+    ('scrape_fanart', 'fanart', 'fanart.jpg'),
+    ('scrape_clearlogo', 'clearlogo', 'clearlogo.png'),
+)
+
+# 使用 CDATA 写入的字段
+CDATA_TAGS = ('plot', 'outline')
+
+# 支持的媒体文件扩展名
+MEDIA_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso')
+
+# 多种电影/电视剧目录命名格式（与 scan_media.py 保持一致）
+TITLE_YEAR_PATTERNS = [
+    re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
+    re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
+    re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
+    re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
+    re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
+]
+
+# 多种季目录命名格式（与 scan_media.py 保持一致）
+SEASON_PATTERNS = [
+    re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
+    re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
+    re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
+    re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
+]
+
+# 多种剧集文件命名格式（扩展自 scan_media.py 的模式）
+EPISODE_PATTERNS = [
+    re.compile(r'^(.*) - S(\d{1,2})E(\d{1,4}) - (.*)$', re.IGNORECASE),  # 格式: Show Name - S1E1 - Episode Title
+    re.compile(r'^(.*)\.S(\d{1,2})E(\d{1,4})\.(.*)$', re.IGNORECASE),    # 格式: Show.Name.S1E1.Episode.Title
+    re.compile(r'^(.*) - (\d{1,2})x(\d{1,4}) - (.*)$', re.IGNORECASE),   # 格式: Show Name - 1x1 - Episode Title
+    re.compile(r'^(.*)\.(\d{1,2})x(\d{1,4})\.(.*)$', re.IGNORECASE),     # 格式: Show.Name.1x1.Episode.Title
+    re.compile(r'^(.*) - S(\d{1,2})E(\d{1,4})$', re.IGNORECASE),         # 格式: Show Name - S1E1 (无标题)
+    re.compile(r'^(.*)\.S(\d{1,2})E(\d{1,4})$', re.IGNORECASE),          # 格式: Show.Name.S1E1 (无标题)
+]
 
 # 配置日志
 logging.basicConfig(
@@ -22,19 +72,16 @@ logging.basicConfig(
 """ 全局缓存：(title, year, media_type) -> tmdb_id """
 tmdb_id_cache = {}
 
-def load_config(db_path):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
+tmdb_session = requests.Session()
+tmdb_limiter = RateLimiter(TMDB_REQUEST_INTERVAL)
+artwork_cache = ArtworkCache()
+
+def tmdb_get(url, params):
+    """经过限速器请求 TMDB API，返回 JSON 数据"""
+    tmdb_limiter.wait()
+    resp = tmdb_session.get(url, params=params, timeout=TMDB_REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
 
 def get_movie_info_from_tmdb(tmdb_id, config):
     """通过TMDB API获取详细电影信息"""
@@ -47,9 +94,7 @@ def get_movie_info_from_tmdb(tmdb_id, config):
         'append_to_response': 'credits,keywords,images'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = tmdb_get(url, params)
         info = {
             "title": data.get("title"),
             "originaltitle": data.get("original_title"),
@@ -142,9 +187,7 @@ def get_tv_info_from_tmdb(tmdb_id, config):
         'append_to_response': 'credits,external_ids,images,keywords'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = tmdb_get(url, params)
         info = {
             "title": data.get("name"),
             "originaltitle": data.get("original_name"),
@@ -240,6 +283,66 @@ def get_tv_info_from_tmdb(tmdb_id, config):
         logging.error(f"获取TMDB剧集详细信息失败: {e}")
         return None
 
+def build_episode_info(data, cast_list, crew_list, season_num, episode_num):
+    """根据 TMDB 单集数据及演职人员列表生成单集信息"""
+    info = {
+        "plot": data.get("overview", ""),
+        "outline": "",
+        "lockdata": "false",
+        "dateadded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "title": data.get("name", f"第 {episode_num} 集"),
+        "originaltitle": data.get("name", f"第 {episode_num} 集"),
+        "actors": [],
+        "director": "",
+        "director_tmdbid": "",
+        "director_thumb": "",
+        "rating": 0,
+        "year": int(data.get("air_date", "1900-01-01")[:4]) if data.get("air_date") else "",
+        "sorttitle": f"第 {episode_num} 集",
+        "tmdbid": data.get("id"),
+        "runtime": data.get("runtime", ""),
+        "studio": "",
+        "episode": episode_num,
+        "season": season_num,
+        "aired": data.get("air_date", ""),
+        "showtitle": "",
+        "userrating": 0,
+        "watched": "false",
+        "playcount": 0,
+        "source": "UNKNOWN",
+        "edition": "NONE",
+        "original_filename": "",
+        "episode_groups": [
+            {"episode": episode_num, "id": "AIRED", "name": "", "season": season_num},
+            {"episode": -1, "id": "DISPLAY", "name": "", "season": -1}
+        ]
+    }
+    # 演员
+    for cast in cast_list[:20]:
+        actor_info = {
+            "name": cast.get("name"),
+            "role": cast.get("character"),
+            "tmdbid": cast.get("id"),
+        }
+        # 添加演员头像
+        if cast.get("profile_path"):
+            actor_info["thumb"] = f"https://image.tmdb.org/t/p/original{cast['profile_path']}"
+        info["actors"].append(actor_info)
+
+    # 导演
+    for crew in crew_list:
+        if crew.get("job") == "Director":
+            info["director"] = crew.get("name")
+            info["director_tmdbid"] = crew.get("id")
+            # 添加导演头像
+            if crew.get("profile_path"):
+                info["director_thumb"] = f"https://image.tmdb.org/t/p/original{crew['profile_path']}"
+            break
+    # studio
+    if data.get("production_companies"):
+        info["studio"] = data["production_companies"][0].get("name", "")
+    return info
+
 def get_episode_info_from_tmdb(tv_id, season_num, episode_num, config):
     """通过TMDB API获取单集详细信息"""
     TMDB_API_KEY = config['tmdb_api_key']
@@ -251,128 +354,93 @@ def get_episode_info_from_tmdb(tv_id, season_num, episode_num, config):
         'append_to_response': 'credits'
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        info = {
-            "plot": data.get("overview", ""),
-            "outline": "",
-            "lockdata": "false",
-            "dateadded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "title": data.get("name", f"第 {episode_num} 集"),
-            "originaltitle": data.get("name", f"第 {episode_num} 集"),
-            "actors": [],
-            "director": "",
-            "director_tmdbid": "",
-            "director_thumb": "",
-            "rating": 0,
-            "year": int(data.get("air_date", "1900-01-01")[:4]) if data.get("air_date") else "",
-            "sorttitle": f"第 {episode_num} 集",
-            "tmdbid": data.get("id"),
-            "runtime": data.get("runtime", ""),
-            "studio": "",
-            "episode": episode_num,
-            "season": season_num,
-            "aired": data.get("air_date", ""),
-            "showtitle": "",
-            "userrating": 0,
-            "watched": "false",
-            "playcount": 0,
-            "source": "UNKNOWN",
-            "edition": "NONE",
-            "original_filename": "",
-            "episode_groups": [
-                {"episode": episode_num, "id": "AIRED", "name": "", "season": season_num},
-                {"episode": -1, "id": "DISPLAY", "name": "", "season": -1}
-            ]
-        }
-        # 演员
-        for cast in data.get("credits", {}).get("cast", [])[:20]:
-            actor_info = {
-                "name": cast.get("name"),
-                "role": cast.get("character"),
-                "tmdbid": cast.get("id"),
-            }
-            # 添加演员头像
-            if cast.get("profile_path"):
-                actor_info["thumb"] = f"https://image.tmdb.org/t/p/original{cast['profile_path']}"
-            info["actors"].append(actor_info)
-            
-        # 导演
-        for crew in data.get("credits", {}).get("crew", []):
-            if crew.get("job") == "Director":
-                info["director"] = crew.get("name")
-                info["director_tmdbid"] = crew.get("id")
-                # 添加导演头像
-                if crew.get("profile_path"):
-                    info["director_thumb"] = f"https://image.tmdb.org/t/p/original{crew['profile_path']}"
-                break
-        # studio
-        if data.get("production_companies"):
-            info["studio"] = data["production_companies"][0].get("name", "")
-        return info
+        data = tmdb_get(url, params)
+        credits = data.get("credits", {})
+        return build_episode_info(data, credits.get("cast", []), credits.get("crew", []), season_num, episode_num)
     except Exception as e:
         logging.error(f"获取TMDB单集详细信息失败: {e}")
         return None
 
+def get_season_info_from_tmdb(tv_id, season_num, config):
+    """
+    通过TMDB API一次获取整季的单集数据，返回 {集数: 单集原始数据} 和该季的演员列表。
+    单集的演员由该季的常驻演员加上该集的客串演员（guest_stars）组成，同一季的各集无需再逐集请求。
+    """
+    TMDB_API_KEY = config['tmdb_api_key']
+    TMDB_BASE_URL = config['tmdb_base_url']
+    url = f"{TMDB_BASE_URL}/3/tv/{tv_id}/season/{season_num}"
+    params = {
+        'api_key': TMDB_API_KEY,
+        'language': 'zh',
+        'append_to_response': 'credits'
+    }
+    try:
+        data = tmdb_get(url, params)
+        episodes = {ep.get("episode_number"): ep for ep in data.get("episodes", [])}
+        return episodes, data.get("credits", {}).get("cast", [])
+    except Exception as e:
+        logging.error(f"获取TMDB季详细信息失败: {e}")
+        return None
+
 def write_pretty_xml(root, nfo_path):
-    """格式化写入xml文件，并支持CDATA"""
-    # 创建 DOM 文档
-    doc = xml.dom.minidom.Document()
-    
-    # 将 ElementTree 元素转换为 DOM 元素
-    dom_root = _convert_node(root, doc)
-    doc.appendChild(dom_root)
-
-    # 格式化并写入文件
-    pretty_xml = doc.toprettyxml(indent="  ", encoding="utf-8")
-    with open(nfo_path, "wb") as f:
-        f.write(pretty_xml)
-        logging.debug(f"已保存 NFO 文件: {nfo_path}")
-        # 添加随机休眠
-        sleep_time = random.uniform(5, 10)
-        logging.debug(f"随机休眠 {sleep_time:.2f} 秒，避免频繁请求 API")
-        time.sleep(sleep_time)
-
-def _convert_node(element, doc):
-    """递归将 ElementTree 节点转换为 minidom 节点"""
-    node = doc.createElement(element.tag)
-
-    # 添加属性
+    """
+    格式化写入xml文件，并支持CDATA。
+    逐个节点直接写入临时文件后重命名替换原文件，输出与 minidom 的 toprettyxml(indent="  ") 逐字节一致。
+    """
+    with open_atomic(nfo_path, 'w', encoding='utf-8', errors='xmlcharrefreplace') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        _write_node(f.write, root, "")
+    logging.debug(f"已保存 NFO 文件: {nfo_path}")
+
+def _escape_xml(text):
+    """转义文本和属性值中的特殊字符（与 minidom 一致）"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+def _write_node(write, element, indent):
+    """递归写入 ElementTree 节点"""
+    write(indent + "<" + element.tag)
+
+    # 写入属性
     for key, value in element.items():
-        node.setAttribute(key, value)
-
-    # 处理子节点或文本
-    if element.text and element.text.strip():
-        # 如果是 plot 或 outline 字段，则使用 CDATA
-        if element.tag in ["plot", "outline"]:
-            cdata = doc.createCDATASection(element.text.strip())
-            node.appendChild(cdata)
-        else:
-            text_node = doc.createTextNode(element.text.strip())
-            node.appendChild(text_node)
+        write(f' {key}="{_escape_xml(value)}"')
 
-    for child in element:
-        child_node = _convert_node(child, doc)
-        node.appendChild(child_node)
+    text = element.text.strip() if element.text else ""
+    if not text and not len(element):
+        write("/>\n")
+        return
+    write(">")
 
-    return node
+    # 如果是 plot 或 outline 字段，则使用 CDATA
+    if not text:
+        text_xml = ""
+    elif element.tag in CDATA_TAGS:
+        text_xml = "<![CDATA[" + text.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+    else:
+        text_xml = _escape_xml(text)
 
-def download_image(url, save_path):
-    """下载图片并保存"""
-    try:
-        response = requests.get(url, stream=True, timeout=10)
-        if response.status_code == 200:
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            logging.info(f"图片已保存: {save_path}")
-            return True
-        else:
-            logging.warning(f"下载失败，状态码: {response.status_code} - {url}")
-    except Exception as e:
-        logging.error(f"下载图片时出错: {e}")
-    return False
+    if not len(element):
+        write(text_xml)
+    else:
+        write("\n")
+        if text_xml:
+            # 与 minidom 一致：文本前后带缩进和换行，CDATA 则原样紧接写入
+            write(text_xml if element.tag in CDATA_TAGS else indent + "  " + text_xml + "\n")
+        for child in element:
+            _write_node(write, child, indent + "  ")
+        write(indent)
+    write("</" + element.tag + ">\n")
+
+def download_artwork(media_dir, info, config):
+    """下载海报、背景图和ClearLogo（已存在的图片跳过），多张图片并发下载，已缓存的图片直接从缓存复制"""
+    images = []
+    for option, field, filename in ARTWORK_FILES:
+        url = info.get(field)
+        # 根据配置决定是否下载该图片
+        if config.get(option, 'True') == 'True' and url:
+            save_path = os.path.join(media_dir, filename)
+            if not os.path.exists(save_path):
+                images.append((url, save_path))
+    artwork_cache.save_many(images)
 
 def generate_movie_nfo(nfo_path, info, config):
     """生成电影NFO文件，info为包含所有字段的dict"""
@@ -476,32 +544,8 @@ def generate_movie_nfo(nfo_path, info, config):
             fanart_thumb = ET.SubElement(fanart_el, "thumb")
             fanart_thumb.text = info["fanart"]
             
-    movie_dir = os.path.dirname(nfo_path)
-    
-    # 下载海报
-    if config.get('scrape_poster', 'True') == 'True':
-        poster_url = info.get("poster")
-        if poster_url:
-            poster_path = os.path.join(movie_dir, "poster.jpg")
-            if not os.path.exists(poster_path):
-                download_image(poster_url, poster_path)
-                
-    # 下载背景图
-    if config.get('scrape_fanart', 'True') == 'True':
-        fanart_url = info.get("fanart")
-        if fanart_url:
-            fanart_path = os.path.join(movie_dir, "fanart.jpg")
-            if not os.path.exists(fanart_path):
-                download_image(fanart_url, fanart_path)
-                
-    # 下载ClearLogo
-    if config.get('scrape_clearlogo', 'True') == 'True':
-        clearlogo_url = info.get("clearlogo")
-        if clearlogo_url:
-            clearlogo_path = os.path.join(movie_dir, "clearlogo.png")
-            if not os.path.exists(clearlogo_path):
-                download_image(clearlogo_url, clearlogo_path)
-                
+    download_artwork(os.path.dirname(nfo_path), info, config)
+
     logging.info(f"生成影片NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
@@ -621,32 +665,8 @@ def generate_tvshow_nfo(nfo_path, info, config):
     if info.get("namedseason"):
         ET.SubElement(root, "namedseason", number="1").text = info["namedseason"]
         
-    tv_dir = os.path.dirname(nfo_path)
-    
-    # 下载海报
-    if config.get('scrape_poster', 'True') == 'True':
-        poster_url = info.get("poster")
-        if poster_url:
-            poster_path = os.path.join(tv_dir, "poster.jpg")
-            if not os.path.exists(poster_path):
-                download_image(poster_url, poster_path)
-                
-    # 下载背景图
-    if config.get('scrape_fanart', 'True') == 'True':
-        fanart_url = info.get("fanart")
-        if fanart_url:
-            fanart_path = os.path.join(tv_dir, "fanart.jpg")
-            if not os.path.exists(fanart_path):
-                download_image(fanart_url, fanart_path)
-                
-    # 下载ClearLogo
-    if config.get('scrape_clearlogo', 'True') == 'True':
-        clearlogo_url = info.get("clearlogo")
-        if clearlogo_url:
-            clearlogo_path = os.path.join(tv_dir, "clearlogo.png")
-            if not os.path.exists(clearlogo_path):
-                download_image(clearlogo_url, clearlogo_path)
-                
+    download_artwork(os.path.dirname(nfo_path), info, config)
+
     logging.info(f"生成剧集NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
@@ -752,259 +772,229 @@ def generate_episode_nfo(nfo_path, episode_info):
     logging.info(f"生成集NFO: {nfo_path}")
     write_pretty_xml(root, nfo_path)
 
-def scan_metadata(path, config, path_type):
-    """扫描指定路径下的媒体文件，只生成缺失的NFO文件（区分电影/剧集路径）"""
-    media_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.flv', '.wmv', '.iso']
-    
-    for root, dirs, files in os.walk(path):
-        if path_type == 'movie':
-            # 仅处理电影文件，不执行任何剧集相关逻辑
-            process_movies(root, files, media_extensions, config)
-        elif path_type == 'tv':
-            # 仅处理剧集相关逻辑，不执行电影处理逻辑
-            process_tvshow_directory(root, dirs, config)
-            process_season_directory(root, dirs, config)
-            process_episode_files(root, files, media_extensions, config)
-
-def process_movies(root, files, media_extensions, config):
-    """处理电影文件"""
-    
-    # 多种电影命名格式（与 scan_media.py 保持一致）
-    movie_patterns = [
-        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-    ]
+def match_title_year(name):
+    """从目录名或文件名中提取标题和年份，无法识别时返回 None"""
+    for pattern in TITLE_YEAR_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            return match.group(1).strip(), int(match.group(2))
+    return None
 
-    for file in files:
-        if any(file.lower().endswith(ext) for ext in media_extensions):
-            matched = False
-            for pattern in movie_patterns:
-                match = pattern.match(os.path.splitext(file)[0])
-                if match:
-                    movie_name = match.group(1).strip()
-                    year = int(match.group(2))
-                    media_file_name = os.path.splitext(file)[0]
-                    nfo_file_path = os.path.join(root, media_file_name + '.nfo')
-                    
-                    if os.path.exists(nfo_file_path):
-                        logging.debug(f"电影NFO已存在，跳过: {nfo_file_path}")
-                        matched = True
-                        break
-                    
-                    tmdb_id = query_tmdb_id(movie_name, year, 'movie', config)
-                    if not tmdb_id:
-                        tmdb_id = query_tmdb_api(movie_name, year, 'movie', config)
-                    if tmdb_id:
-                        info = get_movie_info_from_tmdb(tmdb_id, config)
-                        if info:
-                            generate_movie_nfo(nfo_file_path, info, config)  # 传递配置
-                    else:
-                        logging.warning(f"未找到TMDB_ID: {movie_name} ({year})，跳过NFO生成")
-                    
-                    matched = True
-                    break
-            
-            if not matched:
-                logging.warning(f"无法从文件名提取标题和年份: {file}")
+def match_season(name):
+    """从季目录名中提取季号，不是季目录时返回 None"""
+    for pattern in SEASON_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            return int(match.group(1))
+    return None
 
-def process_tvshow_directory(root, dirs, config):
-    """处理剧集主目录"""
-    
-    # 多种电视剧目录命名格式（与 scan_media.py 保持一致）
-    tv_patterns = [
-        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-    ]
-    
-    dir_name = os.path.basename(root)
-    dir_matched = False
-    
-    for pattern in tv_patterns:
-        dir_match = pattern.match(dir_name)
-        if dir_match:
-            tv_name = dir_match.group(1).strip()
-            tv_year = int(dir_match.group(2))
-            dir_matched = True
-            break
-    
-    if not dir_matched:
-        return  # 不是剧集主目录，跳过
-    
-    tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
-    if os.path.exists(tvshow_nfo_path):
-        logging.debug(f"剧集NFO已存在，跳过: {tvshow_nfo_path}")
-        return  # 跳出函数，不处理此目录
+def is_media_file(file):
+    return file.lower().endswith(MEDIA_EXTENSIONS)
 
-    tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
+def resolve_tmdb_id(title, year, media_type, config):
+    """先查询数据库，未找到时再通过TMDB API搜索"""
+    tmdb_id = query_tmdb_id(title, year, media_type, config)
     if not tmdb_id:
-        tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-    if tmdb_id:
-        info = get_tv_info_from_tmdb(tmdb_id, config)
-        if info:
-            generate_tvshow_nfo(tvshow_nfo_path, info, config)
+        tmdb_id = query_tmdb_api(title, year, media_type, config)
+    return tmdb_id
 
-def process_season_directory(root, dirs, config):
-    """处理剧集季目录"""
-    parent_dir = os.path.dirname(root)
-    parent_name = os.path.basename(parent_dir)
-    
-    # 多种电视剧目录命名格式（与 scan_media.py 保持一致）
-    tv_patterns = [
-        re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-        re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-        re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-        re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-        re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-    ]
-    
-    parent_matched = False
-    for pattern in tv_patterns:
-        parent_match = pattern.match(parent_name)
-        if parent_match:
-            tv_name = parent_match.group(1).strip()
-            tv_year = int(parent_match.group(2))
-            parent_matched = True
-            break
-    
-    if not parent_matched:
-        return  # 没有找到父目录中的剧集信息，跳过
-    
-    # 多种季目录命名格式（与 scan_media.py 保持一致）
-    season_patterns = [
-        re.compile(r'^Season\s+(\d+)$', re.IGNORECASE),    # Season 1
-        re.compile(r'^S(\d+)$', re.IGNORECASE),            # S01
-        re.compile(r'^Season\.?(\d+)$', re.IGNORECASE),    # Season1 or Season.1
-        re.compile(r'^第(\d+)季$', re.IGNORECASE),          # 第1季 (中文)
-    ]
-    
-    dir_name = os.path.basename(root)
-    
-    # 检查是否为季目录
-    season_number = None
-    for pattern in season_patterns:
-        match = pattern.match(dir_name)
-        if match:
-            season_number = int(match.group(1))
-            break
-    
-    if season_number is None:
-        return  # 不是季目录，跳过
-    
-    season_nfo_path = os.path.join(root, 'season.nfo')
-    if os.path.exists(season_nfo_path):
-        logging.debug(f"季NFO已存在，跳过: {season_nfo_path}")
-        return  # 跳出函数，不处理此目录
+def run_tasks(func, tasks):
+    """
+    在线程池中对每个任务执行 func，按任务顺序返回结果。
+    任务为元组，第一项用于日志；单个任务出错时记录日志，结果为 None。
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=SCRAPE_MAX_WORKERS) as executor:
+        futures = [executor.submit(func, task) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"处理 {task[0]} 时出错: {e}")
+                results.append(None)
+    return results
 
-    tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-    if not tmdb_id:
-        tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
+def scan_metadata(paths, config, path_type):
+    """
+    扫描指定路径（可为多个同类型路径）下的媒体文件，只生成缺失的NFO文件（区分电影/剧集路径）：
+    1. 遍历目录，找出缺失的NFO文件。
+    2. 每部电视剧只查询一次TMDB信息，每季只请求一次单集数据。
+    3. 在线程池中生成NFO文件，TMDB请求由共享的限速器控制频率。
+    """
+    if path_type == 'movie':
+        # 仅处理电影文件，不执行任何剧集相关逻辑
+        movie_tasks = []
+        for root, dirs, files in media_walker.walk(paths):
+            movie_tasks.extend(find_missing_movie_nfos(root, files))
+        logging.info(f"共 {len(movie_tasks)} 个电影NFO待生成")
+        run_tasks(lambda task: scrape_movie(*task, config), movie_tasks)
+    elif path_type == 'tv':
+        # 仅处理剧集相关逻辑，不执行电影处理逻辑
+        scan_tv_metadata(paths, config)
+
+def find_missing_movie_nfos(root, files):
+    """找出目录中缺少NFO的电影文件，返回 (NFO路径, 标题, 年份) 列表"""
+    tasks = []
+    for file in files:
+        if not is_media_file(file):
+            continue
+        media_file_name = os.path.splitext(file)[0]
+        matched = match_title_year(media_file_name)
+        if not matched:
+            logging.warning(f"无法从文件名提取标题和年份: {file}")
+            continue
+        nfo_file_path = os.path.join(root, media_file_name + '.nfo')
+        if os.path.exists(nfo_file_path):
+            logging.debug(f"电影NFO已存在，跳过: {nfo_file_path}")
+            continue
+        tasks.append((nfo_file_path, *matched))
+    return tasks
+
+def scrape_movie(nfo_file_path, movie_name, year, config):
+    """查询电影信息并生成NFO文件"""
+    tmdb_id = resolve_tmdb_id(movie_name, year, 'movie', config)
     if tmdb_id:
-        info = get_tv_info_from_tmdb(tmdb_id, config)
+        info = get_movie_info_from_tmdb(tmdb_id, config)
         if info:
-            generate_season_nfo(season_nfo_path, info, season_number=season_number)
+            generate_movie_nfo(nfo_file_path, info, config)  # 传递配置
+    else:
+        logging.warning(f"未找到TMDB_ID: {movie_name} ({year})，跳过NFO生成")
 
-def process_episode_files(root, files, media_extensions, config):
-    """处理单集文件"""
-    
-    # 多种剧集文件命名格式（扩展自 scan_media.py 的模式）
-    episode_patterns = [
-        re.compile(r'^(.*) - S(\d{1,2})E(\d{1,4}) - (.*)$', re.IGNORECASE),  # 格式: Show Name - S1E1 - Episode Title
-        re.compile(r'^(.*)\.S(\d{1,2})E(\d{1,4})\.(.*)$', re.IGNORECASE),    # 格式: Show.Name.S1E1.Episode.Title
-        re.compile(r'^(.*) - (\d{1,2})x(\d{1,4}) - (.*)$', re.IGNORECASE),   # 格式: Show Name - 1x1 - Episode Title
-        re.compile(r'^(.*)\.(\d{1,2})x(\d{1,4})\.(.*)$', re.IGNORECASE),     # 格式: Show.Name.1x1.Episode.Title
-        re.compile(r'^(.*) - S(\d{1,2})E(\d{1,4})$', re.IGNORECASE),         # 格式: Show Name - S1E1 (无标题)
-        re.compile(r'^(.*)\.S(\d{1,2})E(\d{1,4})$', re.IGNORECASE),          # 格式: Show.Name.S1E1 (无标题)
-    ]
-    
+def find_show(root):
+    """向上查找单集所在目录的剧集主目录，返回 (标题, 年份)，未找到时返回 None"""
+    parent = root
+    while parent != os.path.dirname(parent):  # 防止无限循环
+        parent = os.path.dirname(parent)
+        show = match_title_year(os.path.basename(parent))
+        if show:
+            return show
+    return None
+
+def find_missing_episode_nfos(root, files):
+    """找出目录中缺少NFO的单集文件，返回 (NFO路径, 剧集, 季, 集, 文件名) 列表"""
+    tasks = []
+    show = None
+    show_found = False
     for file in files:
         # 首先检查是否为支持的媒体文件
-        if not any(file.lower().endswith(ext) for ext in media_extensions):
+        if not is_media_file(file):
             logging.debug(f"文件不是媒体文件，跳过: {file}")
             continue
-            
+
         # 对于媒体文件，检查是否符合剧集命名规范
         episode_match = None
-        for pattern in episode_patterns:
+        for pattern in EPISODE_PATTERNS:
             episode_match = pattern.match(os.path.splitext(file)[0])
             if episode_match:
                 break
-                
         if not episode_match:
             # 不是剧集文件命名格式，跳过
             logging.debug(f"文件不符合剧集命名格式，跳过: {file}")
             continue
-        
-        show_name = episode_match.group(1).strip()
-        season_num = int(episode_match.group(2))
-        episode_num = int(episode_match.group(3))
+
         episode_nfo_path = os.path.join(root, os.path.splitext(file)[0] + '.nfo')
-        
         if os.path.exists(episode_nfo_path):
             logging.debug(f"集NFO已存在，跳过: {episode_nfo_path}")
             continue
-        
-        # 向上查找剧集主目录
-        parent = root
-        info = None
-        found_tv = False
-        
-        # 多种电视剧目录命名格式（用于向上搜索）
-        tv_patterns = [
-            re.compile(r'^(.*?)\s*-\s*\((\d{4})\)'),     # Title - (Year)
-            re.compile(r'^(.*?)\s*\((\d{4})\)'),         # Title (Year)
-            re.compile(r'^(.*?)\s*\[([12]\d{3})\]'),     # Title [Year]
-            re.compile(r'^(.*?)\s*([12]\d{3})\s*-'),     # Title Year -
-            re.compile(r'^(.*?)\s*\.\s*([12]\d{3})\s*\.'), # Title.Year.
-        ]
-        
-        while not found_tv and parent != os.path.dirname(parent):  # 防止无限循环
-            parent_dir = os.path.dirname(parent)
-            parent_name = os.path.basename(parent_dir)
-            
-            for pattern in tv_patterns:
-                parent_match = pattern.match(parent_name)
-                if parent_match:
-                    tvshow_nfo_path = os.path.join(parent_dir, 'tvshow.nfo')
-                    if os.path.exists(tvshow_nfo_path):
-                        tv_name = parent_match.group(1).strip()
-                        tv_year = int(parent_match.group(2))
-                        tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-                        if not tmdb_id:
-                            tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-                        if tmdb_id:
-                            info = get_tv_info_from_tmdb(tmdb_id, config)
-                            found_tv = True
-                        break
-                    else:
-                        tv_name = parent_match.group(1).strip()
-                        tv_year = int(parent_match.group(2))
-                        tmdb_id = query_tmdb_id(tv_name, tv_year, 'tv', config)
-                        if not tmdb_id:
-                            tmdb_id = query_tmdb_api(tv_name, tv_year, 'tv', config)
-                        if tmdb_id:
-                            info = get_tv_info_from_tmdb(tmdb_id, config)
-                            found_tv = True
-                        break
-            if found_tv:
-                break
-            parent = parent_dir
-        
-        if info:
-            episode_info = get_episode_info_from_tmdb(info["tmdbid"], season_num, episode_num, config)
-            if episode_info:
-                episode_info["showtitle"] = info.get("showtitle", info.get("title", ""))
-                episode_info["original_filename"] = file
-                if not episode_info.get("studio"):
-                    episode_info["studio"] = info.get("studios", [""])[0] if info.get("studios") else ""
-                generate_episode_nfo(episode_nfo_path, episode_info)
+
+        # 同一目录下的单集只查找一次剧集主目录
+        if not show_found:
+            show = find_show(root)
+            show_found = True
+        season_num = int(episode_match.group(2))
+        episode_num = int(episode_match.group(3))
+        tasks.append((episode_nfo_path, show, season_num, episode_num, file))
+    return tasks
+
+def scan_tv_metadata(paths, config):
+    """生成剧集路径下缺失的剧集、季和单集NFO文件"""
+    tvshow_tasks = []
+    season_tasks = []
+    episode_tasks = []
+    for root, dirs, files in media_walker.walk(paths):
+        # 剧集主目录
+        show = match_title_year(os.path.basename(root))
+        if show:
+            tvshow_nfo_path = os.path.join(root, 'tvshow.nfo')
+            if os.path.exists(tvshow_nfo_path):
+                logging.debug(f"剧集NFO已存在，跳过: {tvshow_nfo_path}")
+            else:
+                tvshow_tasks.append((tvshow_nfo_path, show))
+
+        # 季目录（父目录为剧集主目录）
+        parent_show = match_title_year(os.path.basename(os.path.dirname(root)))
+        season_number = match_season(os.path.basename(root)) if parent_show else None
+        if season_number is not None:
+            season_nfo_path = os.path.join(root, 'season.nfo')
+            if os.path.exists(season_nfo_path):
+                logging.debug(f"季NFO已存在，跳过: {season_nfo_path}")
+            else:
+                season_tasks.append((season_nfo_path, parent_show, season_number))
+
+        episode_tasks.extend(find_missing_episode_nfos(root, files))
+
+    logging.info(f"待生成剧集NFO {len(tvshow_tasks)} 个，季NFO {len(season_tasks)} 个，集NFO {len(episode_tasks)} 个")
+
+    # 每部电视剧只查询一次TMDB信息
+    show_keys = list(dict.fromkeys(
+        [task[1] for task in tvshow_tasks + season_tasks] + [task[1] for task in episode_tasks if task[1]]
+    ))
+    shows = dict(zip(show_keys, run_tasks(lambda key: get_show_info(*key, config), show_keys)))
+
+    # 每季只请求一次单集数据
+    season_keys = list(dict.fromkeys(
+        (task[1], task[2]) for task in episode_tasks if shows.get(task[1])
+    ))
+    seasons = dict(zip(season_keys, run_tasks(
+        lambda key: get_season_info_from_tmdb(shows[key[0]]["tmdbid"], key[1], config), season_keys
+    )))
+
+    # 生成NFO文件
+    jobs = []
+    for tvshow_nfo_path, show in tvshow_tasks:
+        if shows.get(show):
+            jobs.append((tvshow_nfo_path, generate_tvshow_nfo, shows[show], config))
+    for season_nfo_path, show, season_number in season_tasks:
+        if shows.get(show):
+            jobs.append((season_nfo_path, generate_season_nfo, shows[show], season_number))
+    for episode_nfo_path, show, season_num, episode_num, file in episode_tasks:
+        if shows.get(show):
+            jobs.append((episode_nfo_path, scrape_episode, shows[show], seasons.get((show, season_num)),
+                         season_num, episode_num, file, config))
         else:
             logging.warning(f"未找到TMDB_ID，跳过NFO生成: {file}")
+    run_tasks(lambda job: job[1](job[0], *job[2:]), jobs)
+
+def get_show_info(tv_name, tv_year, config):
+    """查询电视剧的TMDB详细信息，未找到时返回 None"""
+    tmdb_id = resolve_tmdb_id(tv_name, tv_year, 'tv', config)
+    if tmdb_id:
+        return get_tv_info_from_tmdb(tmdb_id, config)
+    return None
+
+def episode_cast(season_cast, episode):
+    """该季常驻演员加上该集客串演员（按演员ID去重），与单集接口返回的演员一致"""
+    cast_list = list(season_cast)
+    seen = {cast.get("id") for cast in cast_list}
+    for cast in episode.get("guest_stars", []):
+        if cast.get("id") not in seen:
+            seen.add(cast.get("id"))
+            cast_list.append(cast)
+    return cast_list
+
+def scrape_episode(episode_nfo_path, info, season_data, season_num, episode_num, file, config):
+    """根据整季数据生成单集NFO文件，季数据中没有该集时单独请求"""
+    if season_data and episode_num in season_data[0]:
+        data = season_data[0][episode_num]
+        episode_info = build_episode_info(data, episode_cast(season_data[1], data), data.get("crew", []), season_num, episode_num)
+    else:
+        episode_info = get_episode_info_from_tmdb(info["tmdbid"], season_num, episode_num, config)
+    if episode_info:
+        episode_info["showtitle"] = info.get("showtitle", info.get("title", ""))
+        episode_info["original_filename"] = file
+        if not episode_info.get("studio"):
+            episode_info["studio"] = info.get("studios", [""])[0] if info.get("studios") else ""
+        generate_episode_nfo(episode_nfo_path, episode_info)
 
 def query_tmdb_id(title, year, media_type, config):
     """通过数据库查询获取tmdb_id"""
@@ -1015,7 +1005,7 @@ def query_tmdb_id(title, year, media_type, config):
 
     db_path = config['db_path']
     try:
-        with sqlite3.connect(db_path) as conn:
+        with connect(db_path) as conn:
             cursor = conn.cursor()
             if media_type == 'movie':
                 cursor.execute("SELECT tmdb_id FROM LIB_MOVIES WHERE title = ? AND year = ?", (title, year))
@@ -1052,9 +1042,7 @@ def query_tmdb_api(title, year, media_type, config):
     }
     logging.info(f"通过TMDB API查询 {title} 获取TMDB_ID")
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        search_results = response.json().get('results', [])
+        search_results = tmdb_get(url, params).get('results', [])
         for result in search_results:
             if media_type == 'movie':
                 release_date = result.get('release_date', '')
@@ -1098,14 +1086,11 @@ def main():
     # 扫描电影路径（指定path_type为'movie'）
     scan_metadata(movies_path, config, path_type='movie')
     
-    # 扫描剧集路径（指定path_type为'tv'）
-    scan_metadata(episodes_path, config, path_type='tv')
-
-    # 扫描动漫路径（指定path_type为'tv'）
-    scan_metadata(anime_path, config, path_type='tv')
+    # 并行遍历剧集、动漫、综艺路径（均指定path_type为'tv'）
+    scan_metadata([episodes_path, anime_path, variety_path], config, path_type='tv')
 
-    # 扫描综艺路径（指定path_type为'variety'）
-    scan_metadata(variety_path, config, path_type='tv')
+    # 图片缓存超过容量上限时淘汰最早缓存的图片
+    artwork_cache.prune()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+import os
+import sys
+import timeit
+import tempfile
+import xml.dom.minidom
+import xml.etree.ElementTree as ET
+
+# 从 scripts 目录运行时也能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.makedirs("/tmp/log", exist_ok=True)
+
+from scrape_metadata import write_pretty_xml, CDATA_TAGS
+
+# 每种写法的执行次数
+ROUNDS = 500
+# 演员数量
+ACTOR_COUNT = 50
+
+def build_movie_nfo():
+    """生成包含 50 名演员的电影 NFO 节点树"""
+    root = ET.Element("movie")
+    ET.SubElement(root, "plot").text = "一段包含 <特殊字符> & \"引号\" 的剧情简介。" * 5
+    ET.SubElement(root, "outline")
+    ET.SubElement(root, "lockdata").text = "false"
+    ET.SubElement(root, "dateadded").text = "2024-01-01 12:00:00"
+    ET.SubElement(root, "title").text = "测试电影"
+    ET.SubElement(root, "originaltitle").text = "Test Movie"
+    for i in range(ACTOR_COUNT):
+        actor_el = ET.SubElement(root, "actor")
+        ET.SubElement(actor_el, "name").text = f"演员 {i}"
+        ET.SubElement(actor_el, "role").text = f"角色 {i}"
+        ET.SubElement(actor_el, "type").text = "Actor"
+        ET.SubElement(actor_el, "tmdbid").text = str(1000 + i)
+        ET.SubElement(actor_el, "thumb").text = f"https://image.tmdb.org/t/p/original/actor{i}.jpg"
+    ET.SubElement(root, "director", {"tmdbid": "42", "thumb": "https://image.tmdb.org/t/p/original/d.jpg"}).text = "导演"
+    ET.SubElement(root, "rating").text = "7.5"
+    ET.SubElement(root, "year").text = "2024"
+    for genre in ("剧情", "动作", "科幻"):
+        ET.SubElement(root, "genre").text = genre
+    ET.SubElement(root, "uniqueid", type="tmdb").text = "12345"
+    ET.SubElement(root, "uniqueid", type="imdb").text = "tt1234567"
+    return root
+
+def convert_node(element, doc):
+    """原写法：递归将 ElementTree 节点转换为 minidom 节点"""
+    node = doc.createElement(element.tag)
+    for key, value in element.items():
+        node.setAttribute(key, value)
+    if element.text and element.text.strip():
+        if element.tag in CDATA_TAGS:
+            node.appendChild(doc.createCDATASection(element.text.strip()))
+        else:
+            node.appendChild(doc.createTextNode(element.text.strip()))
+    for child in element:
+        node.appendChild(convert_node(child, doc))
+    return node
+
+def write_minidom_xml(root, nfo_path):
+    """原写法：转换为 minidom 文档后 toprettyxml 写入"""
+    doc = xml.dom.minidom.Document()
+    doc.appendChild(convert_node(root, doc))
+    pretty_xml = doc.toprettyxml(indent="  ", encoding="utf-8")
+    with open(nfo_path, "wb") as f:
+        f.write(pretty_xml)
+
+def main():
+    root = build_movie_nfo()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        minidom_path = os.path.join(tmp_dir, "minidom.nfo")
+        stream_path = os.path.join(tmp_dir, "stream.nfo")
+
+        write_minidom_xml(root, minidom_path)
+        write_pretty_xml(root, stream_path)
+        with open(minidom_path, "rb") as f1, open(stream_path, "rb") as f2:
+            identical = f1.read() == f2.read()
+        print(f"输出是否逐字节一致: {identical}")
+
+        minidom_time = timeit.timeit(lambda: write_minidom_xml(root, minidom_path), number=ROUNDS)
+        stream_time = timeit.timeit(lambda: write_pretty_xml(root, stream_path), number=ROUNDS)
+        print(f"minidom 转换写入: {minidom_time / ROUNDS * 1000:.3f} ms/次")
+        print(f"流式写入（含临时文件、fsync 和重命名）: {stream_time / ROUNDS * 1000:.3f} ms/次")
+        print(f"加速比: {minidom_time / stream_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import logging
+import tempfile
+
+# 从 scripts 目录运行时也能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.makedirs("/tmp/log", exist_ok=True)
+
+import check_subscr
+from tv_episodes import parse_episodes, format_episodes, get_library_episodes
+
+# 订阅数量
+SUBSCRIPTION_COUNT = 1000
+# 媒体库中未订阅的剧集数量
+LIBRARY_EXTRA_COUNT = 3000
+# 每种写法的执行次数（取最短耗时）
+ROUNDS = 5
+# 随机数种子，保证每次生成的数据相同
+SEED = 42
+
+SCHEMA = '''
+    CREATE TABLE LIB_MOVIES (ID INTEGER PRIMARY KEY AUTOINCREMENT, TITLE TEXT NOT NULL, YEAR INTEGER, UNIQUE(TITLE, YEAR));
+    CREATE TABLE LIB_TVS (ID INTEGER PRIMARY KEY AUTOINCREMENT, TITLE TEXT NOT NULL, YEAR INTEGER, UNIQUE(TITLE, YEAR));
+    CREATE TABLE LIB_TV_SEASONS (ID INTEGER PRIMARY KEY AUTOINCREMENT, TV_ID INTEGER NOT NULL, SEASON INTEGER NOT NULL, YEAR INTEGER, EPISODES INTEGER);
+    CREATE INDEX IDX_LIB_TV_SEASONS_TV_ID_SEASON ON LIB_TV_SEASONS (TV_ID, SEASON);
+    CREATE TABLE LIB_TV_EPISODES (TV_ID INTEGER NOT NULL, SEASON INTEGER NOT NULL, EPISODE INTEGER NOT NULL,
+                                  PRIMARY KEY (TV_ID, SEASON, EPISODE)) WITHOUT ROWID;
+    CREATE TABLE RSS_TVS (ID INTEGER PRIMARY KEY AUTOINCREMENT, TITLE TEXT NOT NULL, DOUBAN_ID INTEGER, YEAR INTEGER,
+                          SEASON INTEGER, EPISODE INTEGER, STATUS TEXT DEFAULT '想看', UNIQUE(TITLE, YEAR));
+    CREATE TABLE MISS_MOVIES (ID INTEGER PRIMARY KEY AUTOINCREMENT, TITLE TEXT NOT NULL, YEAR INTEGER, DOUBAN_ID INTEGER,
+                              UNIQUE(TITLE, YEAR));
+    CREATE TABLE MISS_TVS (ID INTEGER PRIMARY KEY AUTOINCREMENT, TITLE TEXT NOT NULL, YEAR INTEGER, SEASON INTEGER,
+                           MISSING_EPISODES TEXT, DOUBAN_ID INTEGER, UNIQUE(TITLE, YEAR, SEASON));
+    CREATE INDEX IDX_MISS_TVS_DOUBAN_ID ON MISS_TVS (DOUBAN_ID);
+    CREATE TABLE LIB_TV_ALIAS (ID INTEGER PRIMARY KEY AUTOINCREMENT, ALIAS TEXT NOT NULL, TARGET_TITLE TEXT NOT NULL,
+                               TARGET_SEASON TEXT, UNIQUE(ALIAS));
+'''
+
+def build_database(db_path):
+    """生成 1000 个电视剧订阅（部分未入库、部分已入库若干集、部分通过别名关联、部分已看过）及其他媒体库剧集"""
+    rng = random.Random(SEED)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    for i in range(SUBSCRIPTION_COUNT):
+        title = f"剧集{i}"
+        year = 2000 + i % 25
+        season = 1 + i % 3
+        total = rng.randint(6, 40)
+        status = '看过' if i % 20 == 0 else '想看'
+        conn.execute('INSERT INTO RSS_TVS (TITLE, DOUBAN_ID, YEAR, SEASON, EPISODE, STATUS) VALUES (?, ?, ?, ?, ?, ?)',
+                     (title, 100000 + i, year, season, total, status))
+        library_title = title
+        if i % 10 == 1:
+            # 豆瓣标题与媒体库标题不同，通过别名关联
+            library_title = f"Series {i}"
+            conn.execute('INSERT INTO LIB_TV_ALIAS (ALIAS, TARGET_TITLE, TARGET_SEASON) VALUES (?, ?, ?)',
+                         (title, library_title, str(season)))
+        if i % 3:
+            # 已入库部分或全部集数
+            tv_id = conn.execute('INSERT INTO LIB_TVS (TITLE, YEAR) VALUES (?, ?)', (library_title, year)).lastrowid
+            owned = sorted(rng.sample(range(1, total + 1), rng.randint(0, total)))
+            conn.execute('INSERT INTO LIB_TV_SEASONS (TV_ID, SEASON, EPISODES) VALUES (?, ?, ?)',
+                         (tv_id, season, format_episodes(owned)))
+            conn.executemany('INSERT INTO LIB_TV_EPISODES (TV_ID, SEASON, EPISODE) VALUES (?, ?, ?)',
+                             [(tv_id, season, episode) for episode in owned])
+        if i % 4 == 0:
+            # 已有订阅记录（集数可能已过时）
+            missing = rng.sample(range(1, total + 3), rng.randint(1, total))
+            conn.execute('INSERT INTO MISS_TVS (TITLE, YEAR, SEASON, MISSING_EPISODES, DOUBAN_ID) VALUES (?, ?, ?, ?, ?)',
+                         (title, year, season, format_episodes(missing), 100000 + i))
+    for i in range(LIBRARY_EXTRA_COUNT):
+        # 媒体库中其他未订阅的剧集
+        tv_id = conn.execute('INSERT INTO LIB_TVS (TITLE, YEAR) VALUES (?, ?)', (f"其他剧集{i}", 2000 + i % 25)).lastrowid
+        conn.execute('INSERT INTO LIB_TV_SEASONS (TV_ID, SEASON, EPISODES) VALUES (?, 1, 20)', (tv_id,))
+        conn.executemany('INSERT INTO LIB_TV_EPISODES (TV_ID, SEASON, EPISODE) VALUES (?, 1, ?)',
+                         [(tv_id, episode) for episode in range(1, 21)])
+    conn.commit()
+    conn.close()
+
+def legacy_subscribe_tvs(cursor):
+    """原写法：逐条查询别名、订阅和媒体库"""
+    for title, season, total_episodes, year, douban_id, status in cursor.execute(
+        'SELECT title, season, episode, year, douban_id, status FROM RSS_TVS'
+    ).fetchall():
+        if status == "看过":
+            if cursor.execute('SELECT 1 FROM MISS_TVS WHERE douban_id = ?', (douban_id,)).fetchone():
+                cursor.execute('DELETE FROM MISS_TVS WHERE douban_id = ?', (douban_id,))
+            continue
+        total_episodes = int(total_episodes)
+        alias_row = cursor.execute('SELECT TARGET_TITLE, TARGET_SEASON FROM LIB_TV_ALIAS WHERE ALIAS = ?', (title,)).fetchone()
+        actual_title = alias_row[0] if alias_row else title
+        actual_season = alias_row[1] if alias_row else season
+        miss_row = cursor.execute('SELECT missing_episodes FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?',
+                                  (title, year, season)).fetchone()
+        lib_exists = cursor.execute('SELECT 1 FROM LIB_TVS WHERE title = ?', (actual_title,)).fetchone()
+        total_episodes_set = set(range(1, total_episodes + 1))
+        if not lib_exists:
+            if not miss_row:
+                cursor.execute('INSERT INTO MISS_TVS (title, year, season, missing_episodes, douban_id) VALUES (?, ?, ?, ?, ?)',
+                               (title, year, season, format_episodes(total_episodes_set), douban_id))
+            elif len(total_episodes_set) != len(parse_episodes(miss_row[0])):
+                cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE title = ? AND year = ? AND season = ?',
+                               (format_episodes(total_episodes_set), title, year, season))
+            continue
+        existing_episodes = get_library_episodes(cursor, actual_title, actual_season) or set()
+        missing_episodes_set = total_episodes_set - existing_episodes
+        subscribed_missing = parse_episodes(miss_row[0]) if miss_row else set()
+        need_add_missing = missing_episodes_set - subscribed_missing
+        if miss_row:
+            if len(total_episodes_set) != len(subscribed_missing) + len(existing_episodes) or need_add_missing:
+                cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE title = ? AND year = ? AND season = ?',
+                               (format_episodes(subscribed_missing | need_add_missing), title, year, season))
+            elif not missing_episodes_set:
+                cursor.execute('DELETE FROM MISS_TVS WHERE title = ? AND year = ? AND season = ?', (title, year, season))
+        elif missing_episodes_set:
+            cursor.execute('INSERT INTO MISS_TVS (title, year, season, missing_episodes, douban_id) VALUES (?, ?, ?, ?, ?)',
+                           (title, year, season, format_episodes(missing_episodes_set), douban_id))
+
+def legacy_update_tvs(cursor, alias_only):
+    """原写法：逐条查询别名和已入库集数，更新或删除订阅"""
+    for record_id, title, season, missing_episodes in cursor.execute(
+        'SELECT id, title, season, missing_episodes FROM MISS_TVS'
+    ).fetchall():
+        alias_row = cursor.execute('SELECT TARGET_TITLE, TARGET_SEASON FROM LIB_TV_ALIAS WHERE ALIAS = ?', (title,)).fetchone()
+        if alias_only and not alias_row:
+            continue
+        actual_title, actual_season = alias_row if alias_row else (title, season)
+        existing_episodes = get_library_episodes(cursor, actual_title, actual_season)
+        if existing_episodes is None:
+            continue
+        new_missing_episodes_set = parse_episodes(missing_episodes) - existing_episodes
+        if not new_missing_episodes_set:
+            cursor.execute('DELETE FROM MISS_TVS WHERE id = ?', (record_id,))
+        elif format_episodes(new_missing_episodes_set) != missing_episodes:
+            cursor.execute('UPDATE MISS_TVS SET missing_episodes = ? WHERE id = ?',
+                           (format_episodes(new_missing_episodes_set), record_id))
+
+def run_legacy(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    legacy_subscribe_tvs(cursor)
+    legacy_update_tvs(cursor, alias_only=True)
+    legacy_update_tvs(cursor, alias_only=False)
+    conn.commit()
+    conn.close()
+
+def run_current(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    library = check_subscr.load_library(cursor)
+    check_subscr.subscribe_tvs(cursor, library)
+    check_subscr.update_alias_subscriptions(cursor, library)
+    check_subscr.update_subscriptions(cursor, library)
+    conn.commit()
+    conn.close()
+
+def miss_tvs_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT title, year, season, missing_episodes, douban_id FROM MISS_TVS ORDER BY title, year, season').fetchall()
+    conn.close()
+    return rows
+
+def timed(func, template, db_path):
+    """每次从同一份数据开始执行，返回多次执行中的最短耗时"""
+    best = None
+    for _ in range(ROUNDS):
+        shutil.copyfile(template, db_path)
+        start = time.perf_counter()
+        func(db_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    # 关闭日志输出和通知，只比较耗时和结果
+    logging.disable(logging.CRITICAL)
+    check_subscr.config = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template = os.path.join(tmp_dir, "template.db")
+        legacy_path = os.path.join(tmp_dir, "legacy.db")
+        current_path = os.path.join(tmp_dir, "current.db")
+        build_database(template)
+
+        legacy_time = timed(run_legacy, template, legacy_path)
+        current_time = timed(run_current, template, current_path)
+        print(f"订阅数量: {SUBSCRIPTION_COUNT}")
+        print(f"结果是否一致: {miss_tvs_rows(legacy_path) == miss_tvs_rows(current_path)}")
+        print(f"逐条查询: {legacy_time * 1000:.1f} ms")
+        print(f"批量读取后在内存中比对: {current_time * 1000:.1f} ms")
+        print(f"加速比: {legacy_time / current_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
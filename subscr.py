@@ -1,11 +1,31 @@
 import requests
 import xml.etree.ElementTree as ET
 from urllib.parse import urlparse, parse_qs
-import time
-import random
 import sqlite3
 import logging
 import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from datetime import date
+from api_cache import ApiCache, RateLimiter, RefreshQueue
+
+# 豆瓣兴趣 RSS 的请求超时时间（秒）及同时请求的用户数
+DOUBAN_RSS_TIMEOUT = 10
+DOUBAN_RSS_MAX_WORKERS = 4
+# 各用户 RSS 的 ETag、Last-Modified 和内容的缓存有效期（秒），过期后重新完整获取
+DOUBAN_RSS_CACHE_TTL = 7 * 24 * 3600
+# 已处理条目内容哈希的缓存有效期（秒）
+DOUBAN_RSS_ITEMS_CACHE_TTL = 30 * 24 * 3600
+# 豆瓣搜索接口的请求间隔（秒）及随机抖动，替代每处理一个新条目后固定休眠 10~15 秒
+DOUBAN_REQUEST_INTERVAL = 10
+DOUBAN_REQUEST_JITTER = 5
+# 豆瓣条目信息（类型、年份、季数、集数、副标题等）的缓存有效期（秒）：
+# 近两年上映/播出或集数未定的条目每天刷新，其余条目很少变化
+DOUBAN_SUBJECT_AIRING_TTL = 24 * 3600
+DOUBAN_SUBJECT_TTL = 30 * 24 * 3600
+# 无效的集数
+INVALID_EPISODES = ('unknow', 'unknown', 'n/a', 'null', 'none')
 
 # 配置日志
 logging.basicConfig(
@@ -37,6 +57,18 @@ def chinese_to_int(chinese_num):
     else:
         raise ValueError(f"无法解析中文数字: {chinese_num}")
 
+def item_hash(title, douban_id, status):
+    """豆瓣兴趣条目的内容哈希，标题和状态都未变化的条目无需重复处理"""
+    return hashlib.sha1(f"{title}|{douban_id}|{status}".encode('utf-8')).hexdigest()
+
+def subject_ttl(movie_info):
+    """按条目状态确定缓存有效期：可能仍在播出的条目每天刷新，已完结的条目和较早的电影很少刷新"""
+    episode = str(movie_info.get('episode', '')).strip().lower()
+    year = str(movie_info.get('year', '')).strip()
+    if episode in INVALID_EPISODES or not year.isdigit() or int(year) >= date.today().year - 1:
+        return DOUBAN_SUBJECT_AIRING_TTL
+    return DOUBAN_SUBJECT_TTL
+
 class DouBanRSSParser:
     def __init__(self):
         self.load_config()
@@ -49,7 +81,21 @@ class DouBanRSSParser:
             "Cookie": self.cookie,
             "Connection": "keep-alive",
         }
+        self.rss_headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+        }
         self.db_connection = sqlite3.connect(self.db_path)
+        # 所有豆瓣请求共用一个会话（连接复用），搜索接口经过限速器
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DOUBAN_RSS_MAX_WORKERS, pool_maxsize=DOUBAN_RSS_MAX_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.limiter = RateLimiter(DOUBAN_REQUEST_INTERVAL, DOUBAN_REQUEST_JITTER)
+        self.rss_cache = ApiCache('douban_rss', DOUBAN_RSS_CACHE_TTL, self.db_path)
+        self.items_cache = ApiCache('douban_rss_items', DOUBAN_RSS_ITEMS_CACHE_TTL, self.db_path)
+        # 豆瓣条目信息缓存，缺失或过期的已订阅条目由后台队列刷新
+        self.subject_cache = ApiCache('douban_subject', DOUBAN_SUBJECT_TTL, self.db_path)
+        self.refresh_queue = RefreshQueue(self.refresh_subject, 'douban-subject-refresh')
 
     def load_config(self, db_path='/config/data.db'):
         """从数据库中加载配置"""
@@ -69,28 +115,51 @@ class DouBanRSSParser:
         """获取配置项的值"""
         return self.config.get(key, default)
 
+    def fetch_user_rss(self, user_id):
+        """
+        获取单个用户的兴趣 RSS，带上次响应的 ETag/Last-Modified 发送条件请求。
+        返回 (RSS 内容, 内容是否有变化)；服务器返回 304 时使用缓存的内容，请求失败时内容为 None。
+        """
+        rss_url = f"https://www.douban.com/feed/people/{user_id}/interests"
+        cached = self.rss_cache.get(user_id)
+        headers = dict(self.rss_headers)
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        try:
+            response = self.session.get(rss_url, headers=headers, timeout=DOUBAN_RSS_TIMEOUT)
+        except requests.RequestException as e:
+            logging.error(f"请求豆瓣用户 {user_id} 的兴趣数据时发生错误: {e}")
+            return None, False
+
+        if response.status_code == 304 and cached:
+            logging.info(f"豆瓣用户 {user_id} 的兴趣数据无变化")
+            return cached['text'], False
+        if response.status_code != 200:
+            logging.error(f"获取豆瓣用户 {user_id} 的兴趣数据失败，状态码: {response.status_code}")
+            return None, False
+
+        logging.info(f"成功获取豆瓣用户 {user_id} 的兴趣数据")
+        self.rss_cache.set(user_id, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'text': response.text,
+        })
+        return response.text, cached is None or cached.get('text') != response.text
+
     def fetch_rss_data(self):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        
+        """并发获取所有用户的兴趣 RSS，返回 (RSS 内容列表, 是否有用户的内容发生变化)"""
         # 解析多个用户ID
         user_ids = [uid.strip() for uid in self.douban_user_ids.split(',') if uid.strip() and uid.strip() != "your_douban_id"]
-        all_rss_data = []
-        
-        for user_id in user_ids:
-            rss_url = f"https://www.douban.com/feed/people/{user_id}/interests"
-            try:
-                response = requests.get(rss_url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    logging.info(f"成功获取豆瓣用户 {user_id} 的兴趣数据")
-                    all_rss_data.append(response.text)
-                else:
-                    logging.error(f"获取豆瓣用户 {user_id} 的兴趣数据失败，状态码: {response.status_code}")
-            except requests.RequestException as e:
-                logging.error(f"请求豆瓣用户 {user_id} 的兴趣数据时发生错误: {e}")
-        
-        return all_rss_data
+        if not user_ids:
+            return [], False
+
+        with ThreadPoolExecutor(max_workers=min(DOUBAN_RSS_MAX_WORKERS, len(user_ids))) as executor:
+            results = list(executor.map(self.fetch_user_rss, user_ids))
+        all_rss_data = [rss_data for rss_data, changed in results if rss_data is not None]
+        return all_rss_data, any(changed for rss_data, changed in results)
 
     def parse_rss_data(self, rss_data_list):
         # 如果传入的是单个字符串而非列表，则转换为列表
@@ -156,75 +225,112 @@ class DouBanRSSParser:
         existing_tv_ids = {int(row[0]) for row in cursor.fetchall()}  # 将豆瓣ID转换为整数类型
         return existing_movie_ids.union(existing_tv_ids)
 
+    def fetch_subject(self, query, douban_id):
+        """
+        通过豆瓣搜索接口获取指定豆瓣ID的条目信息并写入缓存。
+        返回 (状态, 条目信息)，状态为 found、not_found（搜索结果中没有该ID）或 empty（没有搜索结果）；
+        请求失败时抛出 requests.RequestException。
+        """
+        api_url = f'https://movie.douban.com/j/subject_suggest?q={query}'
+        self.limiter.wait()
+        response = self.session.get(api_url, headers=self.pcheaders, timeout=10)
+        response.raise_for_status()
+        api_data = response.json()
+        if not api_data:
+            return 'empty', None
+        for movie_info in api_data:
+            if movie_info.get('id') == str(douban_id):  # 将豆瓣ID转换为字符串进行匹配
+                self.subject_cache.set(douban_id, movie_info, subject_ttl(movie_info))
+                return 'found', movie_info
+        return 'not_found', None
+
+    def refresh_subject(self, query, douban_id):
+        """后台刷新队列的任务：重新获取条目信息写入缓存"""
+        try:
+            result, movie_info = self.fetch_subject(query, douban_id)
+            if result != 'found':
+                logging.warning(f"刷新条目信息时未找到豆瓣ID为 {douban_id} 的信息")
+        except (requests.RequestException, ValueError) as e:
+            logging.error(f"刷新豆瓣ID {douban_id} 的条目信息时发生错误: {e}")
+
+    def schedule_subject_refresh(self, movies_list=None, tvs_list=None):
+        """将缓存中缺失或已过期的已订阅条目加入后台刷新队列，不等待刷新完成"""
+        if movies_list is None or tvs_list is None:
+            movies_list, tvs_list = self.fetch_media_items()
+        cached = self.subject_cache.get_all()
+        queued = 0
+        for douban_id, local_title, *_ in movies_list + tvs_list:
+            if str(douban_id) not in cached:
+                queued += self.refresh_queue.put(douban_id, local_title, douban_id)
+        if queued:
+            logging.info(f"已将 {queued} 个条目加入后台刷新队列，其余 {len(movies_list) + len(tvs_list) - queued} 个条目使用缓存信息")
+
     def fetch_movie_details(self, title, douban_id, status):
         # 去除常见标点符号和空白符
         cleaned_title = re.sub(r'[：:.，,！!？?“”‘’"\'（）()【】\[\]「」{}《》<>\u00B7\u2027]', '', title)
         logging.info(f"正在获取标题为 {cleaned_title} 的详细信息，豆瓣ID: {douban_id}，状态: {status}")
-        api_url = f'https://movie.douban.com/j/subject_suggest?q={cleaned_title}'
         try:
-            response = requests.get(api_url, headers=self.pcheaders, timeout=10)
-            if response.status_code == 200:
-                api_data = response.json()
-                if api_data:
-                    # 使用豆瓣ID匹配最佳结果
-                    for movie_info in api_data:
-                        if movie_info.get('id') == str(douban_id):  # 将豆瓣ID转换为字符串进行匹配
-                            episode = movie_info.get('episode', '')
-                            # 新增：跳过无效集数
-                            if str(episode).lower() == 'unknow':
-                                logging.warning(f"跳过集数无效的项目: {title} (获取到集数为：{episode})")
-                                return None
-                            year = movie_info.get('year', '')
-                            img = movie_info.get('img', '')
-                            title = movie_info.get('title', '')
-                            url = movie_info.get('url', '')
-                            sub_title = movie_info.get('sub_title', '')
-                            douban_id = int(movie_info.get('id', ''))  # 确保豆瓣ID为整数类型
-
-                            # 判断影片类型
-                            media_type = '电影' if episode == '' else '电视剧'
-
-                            # 提取季数
-                            season_match = re.search(r'第(\d+|零|一|二|三|四|五|六|七|八|九|十|十一|十二|十三|十四|十五|十六|十七|十八|十九|二十|二十一|二十二|二十三|二十四|二十五|二十六|二十七|二十八|二十九|三十)季', title)
-                            if season_match:
-                                season_str = season_match.group(1)
-                                if season_str.isdigit():
-                                    season = int(season_str)
-                                else:
-                                    season = chinese_to_int(season_str)
-                                # 去除标题中的"第X季"
-                                title = re.sub(r'第\d+季|第零季|第一季|第二季|第三季|第四季|第五季|第六季|第七季|第八季|第九季|第十季|第十一季|第十二季|第十三季|第十四季|第十五季|第十六季|第十七季|第十八季|第十九季|第二十季|第二十一季|第二十二季|第二十三季|第二十四季|第二十五季|第二十六季|第二十七季|第二十八季|第二十九季|第三十季', '', title)
-                            else:
-                                season = 1
-
-                            # 去除标题中的多余空格
-                            title = re.sub(r'\s+', ' ', title).strip()
-
-                            return {
-                                'title': title,
-                                'douban_id': douban_id,
-                                'episode': episode,
-                                'year': year,
-                                'img': img,
-                                'url': url,
-                                'sub_title': sub_title,
-                                'media_type': media_type,
-                                'season': season,
-                                'status': status  # 添加状态信息
-                            }
-                    logging.warning(f"未找到豆瓣ID为 {douban_id} 的信息")
+            movie_info = self.subject_cache.get(douban_id)
+            if movie_info is not None:
+                logging.info(f"使用缓存的豆瓣条目信息: {cleaned_title}")
+                result = 'found'
+            else:
+                result, movie_info = self.fetch_subject(cleaned_title, douban_id)
+            if result == 'found':
+                episode = movie_info.get('episode', '')
+                # 新增：跳过无效集数
+                if str(episode).lower() == 'unknow':
+                    logging.warning(f"跳过集数无效的项目: {title} (获取到集数为：{episode})")
                     return None
+                year = movie_info.get('year', '')
+                img = movie_info.get('img', '')
+                title = movie_info.get('title', '')
+                url = movie_info.get('url', '')
+                sub_title = movie_info.get('sub_title', '')
+                douban_id = int(movie_info.get('id', ''))  # 确保豆瓣ID为整数类型
+
+                # 判断影片类型
+                media_type = '电影' if episode == '' else '电视剧'
+
+                # 提取季数
+                season_match = re.search(r'第(\d+|零|一|二|三|四|五|六|七|八|九|十|十一|十二|十三|十四|十五|十六|十七|十八|十九|二十|二十一|二十二|二十三|二十四|二十五|二十六|二十七|二十八|二十九|三十)季', title)
+                if season_match:
+                    season_str = season_match.group(1)
+                    if season_str.isdigit():
+                        season = int(season_str)
+                    else:
+                        season = chinese_to_int(season_str)
+                    # 去除标题中的"第X季"
+                    title = re.sub(r'第\d+季|第零季|第一季|第二季|第三季|第四季|第五季|第六季|第七季|第八季|第九季|第十季|第十一季|第十二季|第十三季|第十四季|第十五季|第十六季|第十七季|第十八季|第十九季|第二十季|第二十一季|第二十二季|第二十三季|第二十四季|第二十五季|第二十六季|第二十七季|第二十八季|第二十九季|第三十季', '', title)
                 else:
-                    logging.warning(f"未找到标题为 {title} 的信息")
-                    return None
+                    season = 1
+
+                # 去除标题中的多余空格
+                title = re.sub(r'\s+', ' ', title).strip()
+
+                return {
+                    'title': title,
+                    'douban_id': douban_id,
+                    'episode': episode,
+                    'year': year,
+                    'img': img,
+                    'url': url,
+                    'sub_title': sub_title,
+                    'media_type': media_type,
+                    'season': season,
+                    'status': status  # 添加状态信息
+                }
+            elif result == 'not_found':
+                logging.warning(f"未找到豆瓣ID为 {douban_id} 的信息")
             else:
-                logging.error(f"获取标题为 {title} 的详细信息失败，状态码: {response.status_code}")
-                return None
+                logging.warning(f"未找到标题为 {title} 的信息")
+            return None
         except requests.RequestException as e:
             logging.error(f"请求豆瓣API时发生错误: {e}")
             return None
 
     def insert_into_db(self, movie_details):
+        """插入新的订阅，返回是否插入成功"""
         cursor = self.db_connection.cursor()
         try:
             if movie_details['media_type'] == '电影':
@@ -241,10 +347,12 @@ class DouBanRSSParser:
             self.db_connection.commit()
             logging.info(f"成功插入 {movie_details['title']} 到数据库，状态: {movie_details['status']}")
             logging.info("-" * 80)
+            return True
         except sqlite3.IntegrityError:
             logging.warning(f"已存在相同的豆瓣ID {movie_details['douban_id']}，跳过插入")
         except sqlite3.Error as e:
             logging.error(f"插入数据库时发生错误: {e}")
+        return False
 
     def delete_old_data(self, existing_douban_ids, new_douban_ids):
         cursor = self.db_connection.cursor()
@@ -258,49 +366,47 @@ class DouBanRSSParser:
         else:
             logging.info("没有过时的数据需要删除")
 
+    def fetch_media_items(self):
+        """查询所有已订阅的电影 (豆瓣ID, 标题) 和剧集 (豆瓣ID, 标题, 集数)"""
+        cursor = self.db_connection.cursor()
+        cursor.execute('SELECT douban_id, title FROM RSS_MOVIES')
+        movies_list = cursor.fetchall()
+        cursor.execute('SELECT douban_id, title, episode FROM RSS_TVS')
+        tvs_list = cursor.fetchall()
+        return movies_list, tvs_list
+
     def check_and_update_media_info(self):
         """
         统一检查并更新数据库中电影和剧集的信息
         包括电影标题和TV剧集的标题及集数
-        通过合并查询减少API请求次数
+        条目信息来自豆瓣条目缓存，只有缓存缺失或过期的条目经后台刷新队列重新请求
         """
         cursor = self.db_connection.cursor()
-        
-        # 查询RSS_MOVIES表中的所有电影
-        cursor.execute('SELECT douban_id, title FROM RSS_MOVIES')
-        movies_list = cursor.fetchall()
-        
-        # 查询RSS_TVS表中的所有剧集（包含标题和集数）
-        cursor.execute('SELECT douban_id, title, episode FROM RSS_TVS')
-        tvs_list = cursor.fetchall()
+        movies_list, tvs_list = self.fetch_media_items()
         
         if not movies_list and not tvs_list:
             logging.info("数据库中没有项目需要检查信息")
             return
         
         logging.info(f"开始检查媒体信息更新：共 {len(movies_list)} 个电影和 {len(tvs_list)} 个剧集")
+        # 运行开始时已加入队列的条目不会重复加入，这里补充处理期间新增的条目
+        self.schedule_subject_refresh(movies_list, tvs_list)
+        self.refresh_queue.join()
+        subjects = self.subject_cache.get_all()
         
         # 处理电影标题检查
         for douban_id, local_title in movies_list:
             logging.info(f"检查电影: {local_title} (豆瓣ID: {douban_id})")
-            self._check_and_update_single_item("电影", douban_id, local_title, cursor)
-            
-            # 随机休眠避免频繁请求
-            sleep_time = random.uniform(10, 15)
-            time.sleep(sleep_time)
+            self._check_and_update_single_item("电影", douban_id, local_title, cursor, subjects.get(str(douban_id)))
         
         # 处理TV剧集标题和集数检查
         for douban_id, local_title, local_episode in tvs_list:
             logging.info(f"检查剧集: {local_title} (豆瓣ID: {douban_id})")
-            self._check_and_update_single_item("剧集", douban_id, local_title, cursor, local_episode)
-            
-            # 随机休眠避免频繁请求
-            sleep_time = random.uniform(10, 15)
-            time.sleep(sleep_time)
+            self._check_and_update_single_item("剧集", douban_id, local_title, cursor, subjects.get(str(douban_id)), local_episode)
         
         logging.info("媒体信息检查完成")
 
-    def _check_and_update_single_item(self, media_type, douban_id, local_title, cursor, local_episode=None):
+    def _check_and_update_single_item(self, media_type, douban_id, local_title, cursor, movie_info, local_episode=None):
         """
         检查并更新单个项目的信息
         
@@ -309,142 +415,139 @@ class DouBanRSSParser:
             douban_id: 豆瓣ID
             local_title: 本地标题
             cursor: 数据库游标
+            movie_info: 缓存的豆瓣条目信息（未获取到时为 None）
             local_episode: 本地集数(仅对剧集有效)
         """
-        # 获取豆瓣上的最新信息
-        api_url = f'https://movie.douban.com/j/subject_suggest?q={local_title}'
+        if movie_info is None:
+            logging.warning(f"未找到豆瓣ID为 {douban_id} 的{media_type}信息")
+            return
         try:
-            response = requests.get(api_url, headers=self.pcheaders, timeout=10)
-            if response.status_code == 200:
-                api_data = response.json()
-                if api_data:
-                    # 查找匹配的豆瓣ID
-                    for movie_info in api_data:
-                        if movie_info.get('id') == str(douban_id):
-                            latest_title = movie_info.get('title', '')
-                            
-                            # 标准化标题数据格式
-                            local_title_normalized = str(local_title).strip() if local_title is not None else ''
-                            latest_title_normalized = str(latest_title).strip() if latest_title is not None else ''
-                            
-                            # 初始化更新标志
-                            title_updated = False
-                            
-                            # 比较标题是否有变化
-                            if latest_title_normalized != local_title_normalized:
-                                logging.info(f"发现{media_type}标题更新: 本地 '{local_title_normalized}' -> 豆瓣 '{latest_title_normalized}'")
-                                
-                                # 更新数据库中的标题
-                                if media_type == "电影":
-                                    cursor.execute('UPDATE RSS_MOVIES SET title = ? WHERE douban_id = ?', 
-                                                (latest_title_normalized, douban_id))
-                                else:  # 剧集
-                                    cursor.execute('UPDATE RSS_TVS SET title = ? WHERE douban_id = ?', 
-                                                (latest_title_normalized, douban_id))
-                                
-                                title_updated = True
-                            
-                            # 如果是剧集，还要检查集数
-                            episode_updated = False
-                            if media_type == "剧集" and local_episode is not None:
-                                latest_episode = movie_info.get('episode', '')
-                                
-                                # 跳过无效集数
-                                if str(latest_episode).lower() in ['unknow', 'unknown', 'n/a', 'null', 'none']:
-                                    logging.warning(f"跳过集数无效的剧集: {local_title} (豆瓣集数为: {latest_episode})")
-                                else:
-                                    # 标准化集数数据格式
-                                    local_episode_normalized = str(local_episode).strip() if local_episode is not None else ''
-                                    latest_episode_normalized = str(latest_episode).strip() if latest_episode is not None else ''
-                                    
-                                    # 比较集数是否有变化
-                                    if latest_episode_normalized != local_episode_normalized:
-                                        logging.info(f"发现剧集 {local_title} 集数更新: 本地 {local_episode_normalized} -> 豆瓣 {latest_episode_normalized}")
-                                        
-                                        # 更新数据库中的集数
-                                        cursor.execute('UPDATE RSS_TVS SET episode = ? WHERE douban_id = ?', 
-                                                    (latest_episode_normalized, douban_id))
-                                        episode_updated = True
-                            
-                            # 提交数据库更改
-                            if title_updated or episode_updated:
-                                self.db_connection.commit()
-                                if title_updated and episode_updated:
-                                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的标题和集数信息")
-                                elif title_updated:
-                                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的标题信息")
-                                elif episode_updated:
-                                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的集数信息")
-                            else:
-                                logging.info(f"{media_type} '{local_title_normalized}' 的信息无变化")
-                            
-                            return  # 找到匹配项后退出循环
-                    else:
-                        logging.warning(f"未找到豆瓣ID为 {douban_id} 的{media_type}信息")
+            latest_title = movie_info.get('title', '')
+            
+            # 标准化标题数据格式
+            local_title_normalized = str(local_title).strip() if local_title is not None else ''
+            latest_title_normalized = str(latest_title).strip() if latest_title is not None else ''
+            
+            # 初始化更新标志
+            title_updated = False
+            
+            # 比较标题是否有变化
+            if latest_title_normalized != local_title_normalized:
+                logging.info(f"发现{media_type}标题更新: 本地 '{local_title_normalized}' -> 豆瓣 '{latest_title_normalized}'")
+                
+                # 更新数据库中的标题
+                if media_type == "电影":
+                    cursor.execute('UPDATE RSS_MOVIES SET title = ? WHERE douban_id = ?', 
+                                (latest_title_normalized, douban_id))
+                else:  # 剧集
+                    cursor.execute('UPDATE RSS_TVS SET title = ? WHERE douban_id = ?', 
+                                (latest_title_normalized, douban_id))
+                
+                title_updated = True
+            
+            # 如果是剧集，还要检查集数
+            episode_updated = False
+            if media_type == "剧集" and local_episode is not None:
+                latest_episode = movie_info.get('episode', '')
+                
+                # 跳过无效集数
+                if str(latest_episode).lower() in INVALID_EPISODES:
+                    logging.warning(f"跳过集数无效的剧集: {local_title} (豆瓣集数为: {latest_episode})")
                 else:
-                    logging.warning(f"未找到{media_type} '{local_title}' 的豆瓣信息")
+                    # 标准化集数数据格式
+                    local_episode_normalized = str(local_episode).strip() if local_episode is not None else ''
+                    latest_episode_normalized = str(latest_episode).strip() if latest_episode is not None else ''
+                    
+                    # 比较集数是否有变化
+                    if latest_episode_normalized != local_episode_normalized:
+                        logging.info(f"发现剧集 {local_title} 集数更新: 本地 {local_episode_normalized} -> 豆瓣 {latest_episode_normalized}")
+                        
+                        # 更新数据库中的集数
+                        cursor.execute('UPDATE RSS_TVS SET episode = ? WHERE douban_id = ?', 
+                                    (latest_episode_normalized, douban_id))
+                        episode_updated = True
+            
+            # 提交数据库更改
+            if title_updated or episode_updated:
+                self.db_connection.commit()
+                if title_updated and episode_updated:
+                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的标题和集数信息")
+                elif title_updated:
+                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的标题信息")
+                elif episode_updated:
+                    logging.info(f"已更新{media_type} '{local_title_normalized}' 的集数信息")
             else:
-                logging.error(f"获取{media_type} '{local_title}' 信息失败，状态码: {response.status_code}")
-        except requests.RequestException as e:
-            logging.error(f"请求豆瓣API时发生错误: {e}")
+                logging.info(f"{media_type} '{local_title_normalized}' 的信息无变化")
         except sqlite3.Error as e:
             logging.error(f"更新数据库时发生错误: {e}")
         except Exception as e:
             logging.error(f"处理{media_type} '{local_title}' 时发生未知错误: {e}")
 
     def run(self):
-        rss_data_list = self.fetch_rss_data()  # 获取所有用户的RSS数据
-        if rss_data_list:
-            items = self.parse_rss_data(rss_data_list)  # 解析所有数据
-            if items:
-                # 获取数据库中已存在的豆瓣ID
-                existing_douban_ids = self.fetch_existing_douban_ids()
-                new_douban_ids = {douban_id for _, douban_id, _ in items}
-                # 删除数据库中不在新RSS数据中的过时数据
-                self.delete_old_data(existing_douban_ids, new_douban_ids)
-
-                logging.info("开始处理豆瓣兴趣中的所有项目")
-                for title, douban_id, status in items:
-                    # 检查数据库中是否已存在相同的豆瓣ID
-                    if douban_id in existing_douban_ids:
-                        # 更新现有条目的状态
-                        cursor = self.db_connection.cursor()
-                        # 检查是电影还是电视剧
-                        cursor.execute('SELECT COUNT(*) FROM RSS_MOVIES WHERE douban_id = ?', (douban_id,))
-                        is_movie = cursor.fetchone()[0] > 0
-                        
-                        if is_movie:
-                            cursor.execute('UPDATE RSS_MOVIES SET status = ? WHERE douban_id = ?', (status, douban_id))
-                        else:
-                            cursor.execute('UPDATE RSS_TVS SET status = ? WHERE douban_id = ?', (status, douban_id))
-                        
-                        self.db_connection.commit()
-                        logging.info(f"更新了豆瓣ID {douban_id} 的状态为: {status}")
-                        continue
-
-                    movie_details = self.fetch_movie_details(title, douban_id, status)  # 使用标题、豆瓣ID和状态获取详细信息
-                    if movie_details:
-                        logging.info("-" * 80)
-                        logging.info(f"处理项目: {movie_details['title']}")
-                        logging.info(f"豆瓣ID: {movie_details['douban_id']}")
-                        logging.info(f"季数: {movie_details['season']}")
-                        logging.info(f"集数: {movie_details['episode']}")
-                        logging.info(f"年份: {movie_details['year']}")
-                        logging.info(f"类型: {movie_details['media_type']}")
-                        logging.info(f"状态: {movie_details['status']}")
-                        logging.info(f"图片URL: {movie_details['img']}")
-                        logging.info(f"URL: {movie_details['url']}")
-                        logging.info(f"副标题: {movie_details['sub_title']}")
-                        # 插入数据库
-                        self.insert_into_db(movie_details)
-                    
-                    # 随机休眠10到15秒，避免频繁请求
-                    sleep_time = random.uniform(10, 15)
-                    time.sleep(sleep_time)
-            else:
-                logging.warning("豆瓣兴趣中没有找到项目")
-        else:
+        rss_data_list, changed = self.fetch_rss_data()  # 获取所有用户的RSS数据
+        if not rss_data_list:
             logging.error("未能获取豆瓣兴趣数据")
+            return
+        items = self.parse_rss_data(rss_data_list)  # 解析所有数据
+        if not items:
+            logging.warning("豆瓣兴趣中没有找到项目")
+            return
+
+        # 获取数据库中已存在的豆瓣ID
+        existing_douban_ids = self.fetch_existing_douban_ids()
+        # 已订阅且内容哈希未变化的条目上次已处理，无需再次处理
+        processed = self.items_cache.get('processed') or {}
+        pending = [
+            (title, douban_id, status) for title, douban_id, status in items
+            if douban_id not in existing_douban_ids or processed.get(str(douban_id)) != item_hash(title, douban_id, status)
+        ]
+        if not changed and not pending:
+            logging.info("豆瓣兴趣数据无变化，跳过处理")
+            return
+
+        new_douban_ids = {douban_id for _, douban_id, _ in items}
+        # 删除数据库中不在新RSS数据中的过时数据
+        self.delete_old_data(existing_douban_ids, new_douban_ids)
+        processed = {key: value for key, value in processed.items() if int(key) in new_douban_ids}
+
+        logging.info(f"开始处理豆瓣兴趣中的项目：共 {len(items)} 个，其中 {len(pending)} 个有变化")
+        for title, douban_id, status in pending:
+            # 检查数据库中是否已存在相同的豆瓣ID
+            if douban_id in existing_douban_ids:
+                # 更新现有条目的状态
+                cursor = self.db_connection.cursor()
+                # 检查是电影还是电视剧
+                cursor.execute('SELECT COUNT(*) FROM RSS_MOVIES WHERE douban_id = ?', (douban_id,))
+                is_movie = cursor.fetchone()[0] > 0
+
+                if is_movie:
+                    cursor.execute('UPDATE RSS_MOVIES SET status = ? WHERE douban_id = ?', (status, douban_id))
+                else:
+                    cursor.execute('UPDATE RSS_TVS SET status = ? WHERE douban_id = ?', (status, douban_id))
+
+                self.db_connection.commit()
+                logging.info(f"更新了豆瓣ID {douban_id} 的状态为: {status}")
+                processed[str(douban_id)] = item_hash(title, douban_id, status)
+                continue
+
+            movie_details = self.fetch_movie_details(title, douban_id, status)  # 使用标题、豆瓣ID和状态获取详细信息
+            if movie_details:
+                logging.info("-" * 80)
+                logging.info(f"处理项目: {movie_details['title']}")
+                logging.info(f"豆瓣ID: {movie_details['douban_id']}")
+                logging.info(f"季数: {movie_details['season']}")
+                logging.info(f"集数: {movie_details['episode']}")
+                logging.info(f"年份: {movie_details['year']}")
+                logging.info(f"类型: {movie_details['media_type']}")
+                logging.info(f"状态: {movie_details['status']}")
+                logging.info(f"图片URL: {movie_details['img']}")
+                logging.info(f"URL: {movie_details['url']}")
+                logging.info(f"副标题: {movie_details['sub_title']}")
+                # 插入数据库，插入失败的条目下次继续处理
+                if self.insert_into_db(movie_details):
+                    processed[str(douban_id)] = item_hash(title, douban_id, status)
+
+        self.items_cache.set('processed', processed)
 
     def close_db(self):
         self.db_connection.close()
@@ -453,6 +556,8 @@ class DouBanRSSParser:
 # 主程序入口
 if __name__ == "__main__":
     parser = DouBanRSSParser()
+    # 缓存缺失或过期的条目在处理兴趣数据的同时于后台刷新
+    parser.schedule_subject_refresh()
     parser.run()
     parser.check_and_update_media_info()
     parser.close_db()
\ No newline at end of file
@@ -2,10 +2,10 @@ import os
 import re
 import logging
 import requests
-import sqlite3
 import shutil
 import time
 import json
+import hashlib
 import subprocess
 import threading
 from collections import defaultdict
@@ -13,6 +13,10 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from notifier import NotificationQueue
+from database import connect, load_config
+import scan_media
+import check_subscr
 
 # 新增：导入 guessit
 try:
@@ -32,6 +36,21 @@ except ImportError:
 
 # 定义常量
 FILES_RECORD_PATH = '/config/files_record.txt'
+# 配置变更标记文件，WEB端保存设置或修改剧集关联后会更新该文件
+CONFIG_MARKER_PATH = '/tmp/config_changed.marker'
+# 检查配置变更标记的最小间隔（秒）
+SNAPSHOT_CHECK_INTERVAL = 5
+# 下载器完成任务轮询间隔（秒）
+COMPLETION_FEED_INTERVAL = 15
+# 内容指纹采样块大小（头、中、尾各取一块）
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+# 文件转移队列状态文件，供 WEB 页面展示
+TRANSFER_STATUS_PATH = '/tmp/transfer_queue.json'
+# 限速转移时的分块大小
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+# 转移优先级：数值越小越优先
+PRIORITY_SINGLE = 0  # 单个新完成的文件（如新下载的一集）
+PRIORITY_BULK = 1  # 批量文件（如整季合集）
 
 # 配置日志
 logging.basicConfig(
@@ -48,23 +67,83 @@ cache = defaultdict(dict)
 # 全局锁
 processing_lock = threading.Lock()
 processing_files = set()
+# 媒体库增量更新锁，避免多个转移线程同时登记同一部剧
+library_update_lock = threading.Lock()
 # 全局未识别计数字典，记录每个文件夹未能获取到TMDB ID的次数
 unrecognized_count = {}
 
-def load_config(db_path='/config/data.db'):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
+class ConfigSnapshot:
+    """
+    配置、剧集关联、排除文件名和媒体库路径的内存快照。
+    快照只加载一次并在线程间共享，检测到配置变更标记更新后整体重建，
+    使单个文件处理过程中只需进行内存查找。
+    """
+    def __init__(self, db_path='/config/data.db'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.data = None
+        self.marker_mtime = None
+        self.last_check = 0
+
+    @staticmethod
+    def read_marker_mtime():
+        try:
+            return os.path.getmtime(CONFIG_MARKER_PATH)
+        except OSError:
+            return None
+
+    def build(self):
+        """从数据库读取配置和剧集关联，生成新的快照"""
+        config_data = load_config(self.db_path)
+        aliases = {}
+        try:
+            with connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT ALIAS, TARGET_TITLE, TARGET_SEASON FROM LIB_TV_ALIAS")
+                for alias, target_title, target_season in cursor.fetchall():
+                    aliases[alias] = {'target_title': target_title, 'target_season': target_season}
+        except Exception as e:
+            logging.error(f"加载剧集关联失败: {e}")
+
+        episode_directory = config_data.get("episodes_path", "")
+        return {
+            'config': config_data,
+            'aliases': aliases,
+            'excluded_filenames': frozenset(config_data.get("download_excluded_filenames", "").split(',')),
+            'action': config_data.get("download_action", ""),
+            'movie_directory': config_data.get("movies_path", ""),
+            'episode_directory': episode_directory,
+            'anime_directory': config_data.get("anime_path", episode_directory),
+            'variety_directory': config_data.get("variety_path", episode_directory),
+            'unknown_directory': config_data.get("unknown_path", ""),
+            'download_directory': config_data.get("download_dir", ""),
+        }
+
+    def get(self):
+        """返回当前快照，必要时根据变更标记重新加载"""
+        global config
+        now = time.monotonic()
+        if self.data is not None and now - self.last_check < SNAPSHOT_CHECK_INTERVAL:
+            return self.data
+        with self.lock:
+            if self.data is not None and now - self.last_check < SNAPSHOT_CHECK_INTERVAL:
+                return self.data
+            self.last_check = now
+            marker_mtime = self.read_marker_mtime()
+            if self.data is None or marker_mtime != self.marker_mtime:
+                if self.data is not None:
+                    logging.info("检测到配置变更，重新加载配置快照")
+                self.data = self.build()
+                self.marker_mtime = marker_mtime
+                # 同步更新全局配置，保证其它函数读取到最新配置
+                config = self.data['config']
+            return self.data
+
+snapshot = ConfigSnapshot()
+# 异步通知队列，入库通知在后台合并发送
+notifier = NotificationQueue("文件转移", lambda: snapshot.get()['config'])
+# 入库后订阅完成、缺失集数变化的通知
+subscription_notifier = NotificationQueue("订阅通知", lambda: snapshot.get()['config'])
 
 def apply_naming_format(format_string, media_info):
     """
@@ -1445,7 +1524,211 @@ def is_same_media_content(file1_path, file2_path):
     
     return result
 
-def move_or_copy_file(src, dst, action, media_type, config):
+class TransferScheduler:
+    """
+    文件转移调度器，避免入库转移与媒体服务器播放争抢磁盘：
+    1. 令牌桶限制总转移带宽（transfer_bandwidth_limit，MB/s，0 为不限制）。
+    2. 按目标磁盘设备限制并发转移数（transfer_device_concurrency）。
+    3. 按优先级排队，单个新完成的文件优先于整季合集等批量文件。
+    4. 队列状态写入 TRANSFER_STATUS_PATH，供 WEB 页面实时展示。
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.waiting = []  # [优先级, 序号, 设备, 任务信息]
+        self.active = {}  # 序号 -> 任务信息
+        self.device_active = defaultdict(int)
+        self.sequence = 0
+        self.bucket_lock = threading.Lock()
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        self.status_lock = threading.Lock()
+        self.last_status_write = 0
+
+    @staticmethod
+    def get_limits():
+        """读取带宽限制（字节/秒）和单设备并发数，配置无效时使用默认值"""
+        current_config = snapshot.get()['config']
+        try:
+            rate = float(current_config.get('transfer_bandwidth_limit', '0') or 0) * 1024 * 1024
+        except ValueError:
+            rate = 0
+        try:
+            device_limit = max(1, int(current_config.get('transfer_device_concurrency', '1') or 1))
+        except ValueError:
+            device_limit = 1
+        return rate, device_limit
+
+    def acquire(self, device, priority, info):
+        """排队等待目标设备的转移名额，返回任务序号"""
+        with self.condition:
+            self.sequence += 1
+            entry = [priority, self.sequence, device, info]
+            self.waiting.append(entry)
+        self.write_status(force=True)
+        with self.condition:
+            while True:
+                _, device_limit = self.get_limits()
+                # 同一设备上优先级最高（同优先级先到先得）的任务才能获得名额
+                head = min((e for e in self.waiting if e[2] == device), key=lambda e: (e[0], e[1]))
+                if head is entry and self.device_active[device] < device_limit:
+                    break
+                self.condition.wait(timeout=1)
+            self.waiting.remove(entry)
+            self.device_active[device] += 1
+            info['started_at'] = time.time()
+            self.active[entry[1]] = info
+        self.write_status(force=True)
+        return entry[1]
+
+    def release(self, transfer_id, device):
+        with self.condition:
+            self.device_active[device] -= 1
+            self.active.pop(transfer_id, None)
+            self.condition.notify_all()
+        self.write_status(force=True)
+
+    def consume(self, nbytes):
+        """令牌桶限速：消耗 nbytes 个令牌，不足时休眠等待"""
+        rate, _ = self.get_limits()
+        if rate <= 0:
+            return
+        with self.bucket_lock:
+            now = time.monotonic()
+            self.tokens = min(rate, self.tokens + (now - self.last_refill) * rate)
+            self.last_refill = now
+            self.tokens -= nbytes
+            wait_time = -self.tokens / rate if self.tokens < 0 else 0
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def copy_file(self, src, dst, info):
+        """分块复制文件并限速，失败时删除不完整的目标文件"""
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                while True:
+                    chunk = fsrc.read(TRANSFER_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.consume(len(chunk))
+                    fdst.write(chunk)
+                    info['transferred'] += len(chunk)
+                    self.write_status()
+            shutil.copystat(src, dst)
+        except Exception:
+            if os.path.exists(dst):
+                os.remove(dst)
+            raise
+
+    def transfer(self, src, dst, action, priority=PRIORITY_SINGLE):
+        """按调度策略执行移动或复制"""
+        dst_device = os.stat(os.path.dirname(dst)).st_dev
+        # 同设备移动只是重命名，不产生数据读写，小文件也无需排队
+        if (action == 'move' and os.stat(src).st_dev == dst_device) or is_small_file(src):
+            if action == 'move':
+                shutil.move(src, dst)
+            else:
+                shutil.copy2(src, dst)
+            return
+
+        info = {
+            'file': os.path.basename(dst),
+            'source': src,
+            'target': dst,
+            'action': action,
+            'priority': 'single' if priority == PRIORITY_SINGLE else 'bulk',
+            'size': os.path.getsize(src),
+            'transferred': 0,
+            'queued_at': time.time()
+        }
+        transfer_id = self.acquire(dst_device, priority, info)
+        try:
+            self.copy_file(src, dst, info)
+            if action == 'move':
+                os.remove(src)
+        finally:
+            self.release(transfer_id, dst_device)
+
+    def write_status(self, force=False):
+        """写入队列状态文件，非强制写入时每秒最多一次"""
+        now = time.time()
+        if not force and now - self.last_status_write < 1:
+            return
+        # 队列由调度线程在 condition 保护下修改，先在 condition 内复制快照，序列化和写文件在锁外进行
+        with self.condition:
+            now = time.time()
+            active_infos = [dict(info) for info in self.active.values()]
+            waiting = [dict(e[3]) for e in sorted(self.waiting, key=lambda e: (e[0], e[1]))]
+        rate, device_limit = self.get_limits()
+        active = []
+        for info in active_infos:
+            elapsed = max(now - info.get('started_at', now), 0.001)
+            active.append({**info, 'speed': info['transferred'] / elapsed})
+        status = {
+            'updated_at': now,
+            'bandwidth_limit': rate,
+            'device_concurrency': device_limit,
+            'active': active,
+            'waiting': waiting
+        }
+        with self.status_lock:
+            # 多个线程同时写入时，不用较旧的快照覆盖较新的状态
+            if now < self.last_status_write:
+                return
+            self.last_status_write = now
+            try:
+                tmp_path = TRANSFER_STATUS_PATH + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(status, f, ensure_ascii=False)
+                os.replace(tmp_path, TRANSFER_STATUS_PATH)
+            except Exception as e:
+                logging.debug(f"写入转移队列状态失败: {e}")
+
+transfer_scheduler = TransferScheduler()
+
+def compute_content_fingerprint(file_path, sample_size=FINGERPRINT_SAMPLE_SIZE):
+    """
+    计算文件内容指纹：文件大小 + 头部、中部、尾部采样块的 BLAKE2 哈希。
+    只读取少量数据，即使是大体积视频文件也能快速完成。
+    """
+    size = os.path.getsize(file_path)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(size).encode())
+    with open(file_path, 'rb') as f:
+        if size <= sample_size * 3:
+            hasher.update(f.read())
+        else:
+            for offset in (0, (size - sample_size) // 2, size - sample_size):
+                f.seek(offset)
+                hasher.update(f.read(sample_size))
+    return hasher.hexdigest(), size
+
+def find_fingerprint_duplicate(fingerprint, size):
+    """在媒体库指纹记录中查找内容相同且仍然存在的文件，返回其路径"""
+    try:
+        with connect(snapshot.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT PATH FROM LIB_FINGERPRINTS WHERE FINGERPRINT = ? AND SIZE = ?", (fingerprint, size))
+            for (path,) in cursor.fetchall():
+                if os.path.exists(path) and os.path.getsize(path) == size:
+                    return path
+                # 清理已不存在的文件记录
+                cursor.execute("DELETE FROM LIB_FINGERPRINTS WHERE PATH = ?", (path,))
+    except Exception as e:
+        logging.warning(f"查询内容指纹失败: {e}")
+    return None
+
+def record_fingerprint(path, fingerprint, size):
+    """记录媒体库文件的内容指纹"""
+    try:
+        with connect(snapshot.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO LIB_FINGERPRINTS (PATH, FINGERPRINT, SIZE) VALUES (?, ?, ?)",
+                (path, fingerprint, size)
+            )
+    except Exception as e:
+        logging.warning(f"记录内容指纹失败: {e}")
+
+def move_or_copy_file(src, dst, action, media_type, config, priority=PRIORITY_SINGLE):
     """
     执行文件转移操作，增加完善的错误处理和冲突解决机制
     根据配置决定文件覆盖策略
@@ -1459,6 +1742,19 @@ def move_or_copy_file(src, dst, action, media_type, config):
         # 获取文件覆盖选项
         file_overwrite_option = config.get("file_overwrite_option", "skip")
         logging.debug(f"文件覆盖选项: {file_overwrite_option}")
+
+        # 计算视频文件内容指纹，内容相同但文件名不同的资源无需再次转移
+        fingerprint = None
+        if is_common_video_file(src):
+            try:
+                fingerprint, src_size = compute_content_fingerprint(src)
+                duplicate_path = find_fingerprint_duplicate(fingerprint, src_size)
+                if duplicate_path and os.path.abspath(duplicate_path) != os.path.abspath(src):
+                    logging.info(f"媒体库中已存在内容相同的文件，跳过处理: {src} == {duplicate_path}")
+                    return False
+            except OSError as e:
+                logging.warning(f"计算内容指纹失败: {e}")
+                fingerprint = None
             
         # 检查目标目录是否存在，不存在则创建
         dst_dir = os.path.dirname(dst)
@@ -1530,12 +1826,12 @@ def move_or_copy_file(src, dst, action, media_type, config):
         
         # 执行文件转移操作
         if action == 'move':
-            shutil.move(src, target_file)
+            transfer_scheduler.transfer(src, target_file, 'move', priority)
             logging.info(f"文件已移动: {src} -> {target_file}")
             # 新增：移动完成后尝试清理源目录
             try_clean_source_directory(src, config)
         elif action == 'copy':
-            shutil.copy2(src, target_file)
+            transfer_scheduler.transfer(src, target_file, 'copy', priority)
             logging.info(f"文件已复制: {src} -> {target_file}")
         elif action == 'softlink':
             os.symlink(src, target_file)
@@ -1545,6 +1841,9 @@ def move_or_copy_file(src, dst, action, media_type, config):
             logging.info(f"已创建硬链接: {src} -> {target_file}")
         else:
             raise ValueError(f"不支持的操作类型: {action}")
+
+        if fingerprint:
+            record_fingerprint(os.path.abspath(target_file), fingerprint, src_size)
             
         return True
         
@@ -1584,7 +1883,7 @@ def is_small_file(file_path, min_size_mb=5):
     except FileNotFoundError:
         return False
 
-def is_ignored_video_file(file_path, config):
+def is_ignored_video_file(file_path):
     """
     检查视频文件是否为应被忽略的文件
     """
@@ -1599,8 +1898,7 @@ def is_ignored_video_file(file_path, config):
         return True
     
     # 棣查是否在排除文件名列表中
-    excluded_filenames = config.get("download_excluded_filenames", "").split(',')
-    if filename in excluded_filenames:
+    if filename in snapshot.get()['excluded_filenames']:
         return True
     
     # 检查是否在排除扩展名列表中
@@ -1694,7 +1992,7 @@ def try_clean_source_directory(file_path, config):
                 # 检查是否为视频文件
                 if is_common_video_file(item):
                     # 如果是视频文件，检查是否为可忽略的视频文件
-                    if is_ignored_video_file(item_path, config):
+                    if is_ignored_video_file(item_path):
                         # 可忽略的视频文件不影响目录删除
                         logging.debug(f"源目录包含可忽略的视频文件: {item_path}")
                         continue
@@ -1731,7 +2029,7 @@ def try_clean_source_directory(file_path, config):
                 item_path = os.path.join(source_dir, item)
                 # 检查是否为可忽略的文件（包括隐藏文件、可忽略的视频文件和可忽略的非视频文件）
                 if item.startswith('.') or \
-                   (os.path.isfile(item_path) and is_common_video_file(item) and is_ignored_video_file(item_path, config)) or \
+                   (os.path.isfile(item_path) and is_common_video_file(item) and is_ignored_video_file(item_path)) or \
                    (os.path.isfile(item_path) and not is_common_video_file(item) and is_ignored_non_video_file(item)):
                     # 记录可删除的文件
                     if os.path.isfile(item_path):
@@ -1775,30 +2073,38 @@ def save_processed_files(processed_filenames):
         for filename in processed_filenames:
             f.write(filename + '\n')
 
-def get_alias_mapping(db_path, alias_name):
-    """从数据库获取指定关系映射"""
+def update_library_subscriptions(media_type, media_dir):
+    """
+    增量刷新媒体库和正在订阅：只扫描刚转移文件所在的影片/剧集目录并登记到 LIB_* 表，
+    随后只更新受影响标题的订阅（MISS_*），下载器无需等待下一轮全量扫描即可跳过已入库的集数。
+    """
+    db_path = snapshot.db_path
+    with library_update_lock:
+        if media_type == 'tv':
+            tv_titles, movies = scan_media.add_show_directory(db_path, media_dir), []
+        else:
+            tv_titles, movies = [], scan_media.add_movie_directory(db_path, media_dir)
+        conn = connect(db_path)
+        try:
+            check_subscr.refresh_library_subscriptions(
+                conn.cursor(), tv_titles, movies, notify=subscription_notifier.notify
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+def refresh_media_library(media_type, media_dir):
+    # 增量刷新媒体库和正在订阅（删除、改名等变化由主程序定时执行的全量扫描处理）
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT target_title, target_season FROM LIB_TV_ALIAS WHERE alias = ?", (alias_name,))
-            row = cursor.fetchone()
-            if row:
-                return {'target_title': row[0], 'target_season': row[1]}
+        update_library_subscriptions(media_type, media_dir)
     except Exception as e:
-        logging.error(f"查询指定关系失败: {e}")
-    return None
-
-def refresh_media_library():
-    # 刷新媒体库
-    subprocess.run(['python', 'scan_media.py'])  
-    # 刷新正在订阅
-    subprocess.run(['python', 'check_subscr.py'])   
+        logging.error(f"增量更新媒体库和订阅失败: {media_dir}, 错误: {e}")
     # 刮削NFO元数据
     subprocess.run(['python', 'scrape_metadata.py'])
     # 刷新媒体库tmdb_id
     subprocess.run(['python', 'tmdb_id.py'])
 
-def process_file(file_path, processed_filenames):
+def process_file(file_path, processed_filenames, task_label=None, priority=PRIORITY_SINGLE):
     """
     处理单个文件：
     1. 提取媒体信息，尝试获取 TMDB ID。
@@ -1808,6 +2114,8 @@ def process_file(file_path, processed_filenames):
     5. 其它原有逻辑保持不变。
     6. 优化：年份、标题智能匹配度评分，智能年份覆盖、多语言标题匹配、模糊年份匹配。
     7. 优化：避免使用根下载目录名作为媒体标题
+    8. task_label 为下载完成事件源提供的任务标签，未提供时再向下载器查询
+    9. priority 为文件转移优先级，批量文件排在单个新文件之后
     """
     # 使用文件绝对路径作为唯一标识
     file_abs_path = os.path.abspath(file_path)
@@ -1821,14 +2129,16 @@ def process_file(file_path, processed_filenames):
     
     try:
         try:
-            excluded_filenames = config.get("download_excluded_filenames", "").split(',')
-            action = config.get("download_action", "")
-            movie_directory = config.get("movies_path", "")
-            episode_directory = config.get("episodes_path", "")
-            anime_directory = config.get("anime_path", episode_directory)  # 动漫路径
-            variety_directory = config.get("variety_path", episode_directory)  # 综艺路径
-            unknown_directory = config.get("unknown_path", "")
-            download_directory = config.get("download_dir", "")  # 获取下载根目录
+            # 从内存快照读取配置，避免每个文件重复解析配置和查询数据库
+            current = snapshot.get()
+            excluded_filenames = current['excluded_filenames']
+            action = current['action']
+            movie_directory = current['movie_directory']
+            episode_directory = current['episode_directory']
+            anime_directory = current['anime_directory']  # 动漫路径
+            variety_directory = current['variety_directory']  # 综艺路径
+            unknown_directory = current['unknown_directory']
+            download_directory = current['download_directory']  # 获取下载根目录
 
             filename = os.path.basename(file_path)
             folder_name = os.path.basename(os.path.dirname(file_path))
@@ -1860,7 +2170,8 @@ def process_file(file_path, processed_filenames):
                 return
 
             # 优先用下载任务标签辅助解析
-            task_label = get_task_label_from_downloader(folder_name, config)
+            if task_label is None:
+                task_label = get_task_label_from_downloader(folder_name, config)
             label_info = extract_info_from_label(task_label) if task_label else None
 
             # 将标签解析结果传递给 extract_info 进行辅助提取
@@ -1870,8 +2181,7 @@ def process_file(file_path, processed_filenames):
 
             # 新增：指定关系替换逻辑
             if result and result.get('名称'):
-                db_path = config.get("db_path", "/config/data.db")
-                alias_map = get_alias_mapping(db_path, result['名称'])
+                alias_map = current['aliases'].get(result['名称'])
                 if alias_map:
                     logging.info(f"应用剧集关联: {result['名称']} -> {alias_map['target_title']}")
                     result['名称'] = alias_map['target_title']
@@ -2102,18 +2412,26 @@ def process_file(file_path, processed_filenames):
                     return
 
                 # 执行文件转移操作并检查结果
-                move_result = move_or_copy_file(file_path, target_file_path, action, media_type, config)
+                move_result = move_or_copy_file(file_path, target_file_path, action, media_type, config, priority)
                 if move_result:
                     # 成功转移后，检查是否有对应的.nfo文件也需要转移
                     nfo_file_path = os.path.splitext(file_path)[0] + ".nfo"
                     if os.path.exists(nfo_file_path):
                         nfo_target_path = os.path.splitext(target_file_path)[0] + ".nfo"
-                        move_or_copy_file(nfo_file_path, nfo_target_path, action, media_type, config)
+                        move_or_copy_file(nfo_file_path, nfo_target_path, action, media_type, config, priority)
                         logging.info(f"转移NFO文件: {nfo_file_path} -> {nfo_target_path}")
 
-                    send_notification(new_filename)
+                    if media_type == 'tv':
+                        # 同一季的多集入库通知合并为一条摘要
+                        send_notification(
+                            new_filename,
+                            group=(title, int(season_number)),
+                            summary=f"{title} 第{int(season_number)}季：{{count}} 集已入库"
+                        )
+                    else:
+                        send_notification(new_filename)
                     logging.info(f"文件处理完成，刷新本地数据库")
-                    refresh_media_library()
+                    refresh_media_library(media_type, target_base_dir)
 
                     # 通知 tinyMediaManager
                     notify_tmm(classification)
@@ -2195,24 +2513,26 @@ def process_file(file_path, processed_filenames):
         with processing_lock:
             processing_files.discard(file_abs_path)
 
-def process_file_multithread(file_path, processed_filenames):
+def process_file_multithread(file_path, processed_filenames, task_label=None, priority=PRIORITY_SINGLE):
     """
     多线程版本的文件处理函数
     """
     # 这里复用原有的 process_file 逻辑
     # 为了简化，直接调用原函数
-    process_file(file_path, processed_filenames)
+    process_file(file_path, processed_filenames, task_label, priority)
 
-def process_files_in_batch(file_paths, processed_filenames):
+def process_files_in_batch(file_paths, processed_filenames, task_labels=None):
     """
     批量处理文件，主要针对同级目录中包含2个及以上相似视频文件的情况
     
     Args:
         file_paths: 文件路径列表
         processed_filenames: 已处理文件集合
+        task_labels: 文件路径到下载任务标签的映射（来自下载完成事件源，可选）
     """
     if not file_paths:
         return
+    task_labels = task_labels or {}
     
     # 过滤掉非视频文件
     video_files = [file_path for file_path in file_paths if is_common_video_file(os.path.basename(file_path))]
@@ -2267,7 +2587,7 @@ def process_files_in_batch(file_paths, processed_filenames):
                     with ThreadPoolExecutor(max_workers=thread_count) as executor:
                         # 提交任务
                         future_to_file = {
-                            executor.submit(process_file_multithread, file_path, processed_filenames): file_path 
+                            executor.submit(process_file_multithread, file_path, processed_filenames, task_labels.get(file_path), PRIORITY_BULK): file_path 
                             for file_path in files
                         }
                         
@@ -2282,17 +2602,17 @@ def process_files_in_batch(file_paths, processed_filenames):
                     # 单线程处理
                     logging.info(f"使用单线程处理目录 {directory} 中的 {len(files)} 个文件")
                     for file_path in files:
-                        process_file(file_path, processed_filenames)
+                        process_file(file_path, processed_filenames, task_labels.get(file_path), PRIORITY_BULK)
             else:
                 # 不是相似文件，单独处理每个文件
                 logging.info(f"目录 {directory} 中的文件不相似，单独处理")
                 for file_path in files:
-                    process_file(file_path, processed_filenames)
+                    process_file(file_path, processed_filenames, task_labels.get(file_path))
         else:
             # 目录中只有一个文件，单独处理
             logging.info(f"目录 {directory} 中只有 1 个文件，单独处理")
             for file_path in files:
-                process_file(file_path, processed_filenames)
+                process_file(file_path, processed_filenames, task_labels.get(file_path))
 
 def are_similar_media_files(file_paths):
     """
@@ -2475,32 +2795,184 @@ def notify_tmm(media_type):
     except Exception as e:
         logging.error(f"通知 tinyMediaManager 失败: {e}")
 
-def send_notification(title_text):
-    # 通知功能
-    try:
-        notification_enabled = config.get("notification", "")
-        if notification_enabled.lower() != "true":  # 显式检查是否为 "true"
-            logging.info("通知功能未启用，跳过发送通知。")
-            return
-        api_key = config.get("notification_api_key", "")
-        if not api_key:
-            logging.error("通知API Key未在配置文件中找到，无法发送通知。")
-            return
-        api_url = f"https://api.day.app/{api_key}"
-        data = {
-            "title": "文件转移",
-            "body": f"{title_text}已入库"
-        }
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(api_url, data=json.dumps(data), headers=headers)
-        if response.status_code == 200:
-            logging.info("通知发送成功: %s", response.text)
+def send_notification(title_text, group=None, summary=None):
+    # 通知功能：加入异步通知队列，由后台线程合并发送，不阻塞文件转移
+    notifier.notify(f"{title_text}已入库", group=group, summary=summary)
+
+class DownloadCompletionFeed:
+    """
+    下载完成事件源：定时轮询 Transmission（recently-active）或 qBittorrent（sync/maindata），
+    发现刚完成的任务后，直接把任务的视频文件列表和标签交给转移队列，
+    不再依赖递归监控下载目录，也避免处理写入中的文件。
+    """
+    def __init__(self, handler, config, poll_interval=COMPLETION_FEED_INTERVAL):
+        self.handler = handler
+        self.download_type = config.get('download_type', 'transmission').lower()
+        self.download_host = config.get('download_host', '127.0.0.1')
+        self.download_port = int(config.get('download_port', 9091))
+        self.download_username = config.get('download_username', '')
+        self.download_password = config.get('download_password', '')
+        self.download_directory = config.get('download_dir', '')
+        self.poll_interval = poll_interval
+        self.client = None
+        # 任务ID/哈希 -> 是否已完成，首次轮询只记录状态不触发转移
+        self.completed_state = {}
+        self.initialized = False
+        # 首次轮询的时间，之后才添加的任务按新任务处理
+        self.initialized_at = None
+        # qBittorrent 增量同步状态
+        self.qb_rid = 0
+        self.qb_torrents = {}
+
+    @staticmethod
+    def is_supported(config):
+        download_mgmt = config.get('download_mgmt', 'False').lower() == 'true'
+        feed_enabled = config.get('download_completion_feed', 'False').lower() == 'true'
+        download_type = config.get('download_type', 'transmission').lower()
+        if not (download_mgmt and feed_enabled):
+            return False
+        if download_type == 'transmission':
+            return TransmissionClient is not None
+        if download_type == 'qbittorrent':
+            return QBittorrentClient is not None
+        return False
+
+    def connect(self):
+        if self.download_type == 'transmission':
+            self.client = TransmissionClient(
+                host=self.download_host,
+                port=self.download_port,
+                username=self.download_username,
+                password=self.download_password
+            )
         else:
-            logging.error("通知发送失败: %s %s", response.status_code, response.text)
-    except KeyError as e:
-        logging.error(f"配置文件中缺少必要的键: {e}")
-    except requests.RequestException as e:
-        logging.error(f"网络请求出现错误: {e}")
+            self.client = QBittorrentClient(
+                host=f"http://{self.download_host}:{self.download_port}",
+                username=self.download_username,
+                password=self.download_password
+            )
+            self.client.auth_log_in()
+            self.qb_rid = 0
+            self.qb_torrents = {}
+
+    def resolve_path(self, save_path, relative_name):
+        """将下载器中的文件路径转换为本地路径，下载器与本程序路径映射不一致时回退到下载监控目录"""
+        file_path = os.path.join(save_path, relative_name)
+        if os.path.exists(file_path):
+            return file_path
+        fallback_path = os.path.join(self.download_directory, relative_name)
+        if os.path.exists(fallback_path):
+            return fallback_path
+        return None
+
+    def collect_video_files(self, save_path, relative_names):
+        file_paths = []
+        for relative_name in relative_names:
+            if not is_common_video_file(relative_name) or is_unfinished_download_file(relative_name):
+                continue
+            file_path = self.resolve_path(save_path, relative_name)
+            if not file_path:
+                logging.warning(f"下载完成的文件在本地不存在: {relative_name}")
+                continue
+            if is_ignored_video_file(file_path):
+                continue
+            file_paths.append(file_path)
+        return file_paths
+
+    @staticmethod
+    def transmission_done(t):
+        return t.percent_done >= 1 and t.left_until_done == 0
+
+    def added_after_start(self, t):
+        """任务是否在首次轮询之后才添加到 Transmission"""
+        try:
+            return t.added_date.timestamp() >= self.initialized_at
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return False
+
+    def poll_transmission(self):
+        """返回 [(任务名, 文件列表, 标签)]"""
+        completed = []
+        if not self.initialized:
+            # recently-active 只返回最近约 60 秒内活跃的任务，首次轮询时读取全部任务的完成状态，
+            # 否则当时空闲的已完成任务之后因做种重新活跃时会被误判为新完成的任务
+            for t in self.client.get_torrents():
+                self.completed_state[t.id] = self.transmission_done(t)
+            self.initialized_at = time.time()
+            return completed
+
+        active, removed = self.client.get_recently_active_torrents()
+        for torrent_id in removed:
+            self.completed_state.pop(torrent_id, None)
+        for t in active:
+            is_done = self.transmission_done(t)
+            if t.id in self.completed_state:
+                was_done = self.completed_state[t.id]
+            else:
+                # 未记录的任务视为已处理（如 Transmission 重启后任务ID变化），
+                # 只有首次轮询之后新添加、且在一个轮询间隔内就已完成的任务按新完成处理
+                was_done = not self.added_after_start(t)
+            self.completed_state[t.id] = is_done
+            if not is_done or was_done:
+                continue
+            names = [f.name for f in t.get_files() if f.selected]
+            labels = t.labels or []
+            completed.append((t.name, self.collect_video_files(t.download_dir, names), labels[0] if labels else ''))
+        return completed
+
+    def poll_qbittorrent(self):
+        """返回 [(任务名, 文件列表, 标签)]"""
+        completed = []
+        maindata = self.client.sync_maindata(rid=self.qb_rid)
+        self.qb_rid = maindata.get('rid', 0)
+        if maindata.get('full_update'):
+            self.qb_torrents = {}
+        for torrent_hash in maindata.get('torrents_removed', []) or []:
+            self.qb_torrents.pop(torrent_hash, None)
+            self.completed_state.pop(torrent_hash, None)
+        for torrent_hash, changes in (maindata.get('torrents') or {}).items():
+            self.qb_torrents.setdefault(torrent_hash, {}).update(changes)
+        for torrent_hash, t in self.qb_torrents.items():
+            is_done = t.get('progress', 0) >= 1 and t.get('amount_left', 1) == 0
+            was_done = self.completed_state.get(torrent_hash)
+            self.completed_state[torrent_hash] = is_done
+            if not is_done or was_done or not self.initialized:
+                continue
+            files = self.client.torrents_files(torrent_hash=torrent_hash)
+            names = [f.get('name', '') for f in files if f.get('priority', 1) != 0]
+            tags = t.get('tags', '')
+            completed.append((t.get('name', ''), self.collect_video_files(t.get('save_path', ''), names), tags.split(',')[0].strip() if tags else ''))
+        return completed
+
+    def poll_once(self):
+        if self.client is None:
+            self.connect()
+        if self.download_type == 'transmission':
+            completed = self.poll_transmission()
+        else:
+            completed = self.poll_qbittorrent()
+        self.initialized = True
+        for name, file_paths, label in completed:
+            if not file_paths:
+                logging.info(f"下载任务已完成，但未发现需要转移的视频文件: {name}")
+                continue
+            logging.info(f"下载任务已完成: {name}，共 {len(file_paths)} 个视频文件，标签: {label or '无'}")
+            self.handler.add_pending_files(file_paths, {file_path: label for file_path in file_paths})
+
+    def run(self):
+        logging.info(f"已启用下载完成事件源: {self.download_type}，轮询间隔 {self.poll_interval} 秒")
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                logging.warning(f"轮询下载器完成任务失败: {e}")
+                self.client = None
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="download-completion-feed", daemon=True)
+        thread.start()
+        return thread
 
 class CustomFileHandler(FileSystemEventHandler):
     def __init__(self):
@@ -2508,15 +2980,49 @@ class CustomFileHandler(FileSystemEventHandler):
         self.unfinished_files = set()
         self.processed_files = load_processed_files()
         self.pending_files = []  # 待处理文件队列
+        self.task_labels = {}  # 待处理文件对应的下载任务标签
         self.batch_timer = None
+        # 保护待处理队列：监控事件、下载完成事件源和批处理在不同线程中访问
+        self.lock = threading.Lock()
+        self.processing = False  # 是否有批次正在处理
+
+    def enqueue_file(self, file_path):
+        """将文件加入待处理队列，返回是否新加入"""
+        with self.lock:
+            if file_path in self.pending_files:
+                return False
+            self.pending_files.append(file_path)
+            return True
+
+    def add_pending_files(self, file_paths, task_labels=None):
+        """将下载完成事件源提供的文件加入待处理队列"""
+        with self.lock:
+            for file_path in file_paths:
+                if os.path.basename(file_path) in self.processed_files:
+                    logging.debug(f"文件已处理，跳过: {file_path}")
+                    continue
+                if task_labels and file_path in task_labels:
+                    self.task_labels[file_path] = task_labels[file_path]
+                if file_path not in self.pending_files:
+                    self.pending_files.append(file_path)
+            has_pending = bool(self.pending_files)
+        if has_pending:
+            self.schedule_batch_processing()
 
     def process_pending_files(self):
-        """处理待处理文件队列"""
-        if self.pending_files:
-            logging.debug(f"待处理文件数量: {len(self.pending_files)}")
+        """处理待处理文件队列（同一时间只处理一个批次，处理期间新加入的文件留到下一批）"""
+        with self.lock:
+            if self.processing or not self.pending_files:
+                return
+            batch, self.pending_files = self.pending_files, []
+            task_labels = {file_path: self.task_labels.pop(file_path) for file_path in batch if file_path in self.task_labels}
+            self.processing = True
+
+        try:
+            logging.debug(f"待处理文件数量: {len(batch)}")
             # 按目录分组显示
             files_by_dir = defaultdict(list)
-            for file_path in self.pending_files:
+            for file_path in batch:
                 directory = os.path.dirname(file_path)
                 files_by_dir[directory].append(os.path.basename(file_path))
             
@@ -2525,22 +3031,27 @@ class CustomFileHandler(FileSystemEventHandler):
                 for file in files:
                     logging.debug(f"文件名：{file}")
             
-            process_files_in_batch(self.pending_files.copy(), self.processed_files)
-            self.pending_files.clear()
+            process_files_in_batch(batch, self.processed_files, task_labels)
             save_processed_files(self.processed_files)
+        finally:
+            with self.lock:
+                self.processing = False
+                has_pending = bool(self.pending_files)
+            if has_pending:
+                self.schedule_batch_processing()
 
     def schedule_batch_processing(self):
         """安排批量处理"""
-        if self.batch_timer:
-            self.batch_timer.cancel()
-        
-        # 去重处理
-        unique_files = list(set(self.pending_files))
-        self.pending_files = unique_files
-        
-        # 延长延迟时间到5秒，避免频繁触发
-        self.batch_timer = threading.Timer(5.0, self.process_pending_files)
-        self.batch_timer.start()
+        with self.lock:
+            if self.batch_timer:
+                self.batch_timer.cancel()
+            
+            # 去重处理（保持加入顺序）
+            self.pending_files = list(dict.fromkeys(self.pending_files))
+            
+            # 延长延迟时间到5秒，避免频繁触发
+            self.batch_timer = threading.Timer(5.0, self.process_pending_files)
+            self.batch_timer.start()
 
     def on_created(self, event):
         if event.is_directory:
@@ -2576,11 +3087,9 @@ class CustomFileHandler(FileSystemEventHandler):
                 logging.debug(f"发现下载未完成文件: {file_path}，开始监控")
             return
         else:
-            # 检查是否已经在待处理队列中
-            if file_path not in self.pending_files:
+            # 检查是否已经在待处理队列中，不在时添加到待处理队列
+            if self.enqueue_file(file_path):
                 logging.debug(f"新文件创建: {file_path}")
-                # 添加到待处理队列
-                self.pending_files.append(file_path)
                 self.schedule_batch_processing()
             else:
                 logging.debug(f"文件已在待处理队列中，跳过: {file_path}")
@@ -2619,20 +3128,16 @@ class CustomFileHandler(FileSystemEventHandler):
             if not is_unfinished_download_file(filename):
                 self.unfinished_files.remove(file_path)
                 logging.info(f"下载文件已完成: {file_path}，开始处理")
-                # 检查是否已经在待处理队列中
-                if file_path not in self.pending_files:
-                    # 添加到待处理队列
-                    self.pending_files.append(file_path)
+                # 检查是否已经在待处理队列中，不在时添加到待处理队列
+                if self.enqueue_file(file_path):
                     self.schedule_batch_processing()
                 else:
                     logging.debug(f"文件已在待处理队列中，跳过: {file_path}")
         else:
             logging.debug(f"文件修改: {file_path}")
             if filename not in self.processed_files:
-                # 检查是否已经在待处理队列中
-                if file_path not in self.pending_files:
-                    # 添加到待处理队列
-                    self.pending_files.append(file_path)
+                # 检查是否已经在待处理队列中，不在时添加到待处理队列
+                if self.enqueue_file(file_path):
                     self.schedule_batch_processing()
                 else:
                     logging.debug(f"文件已在待处理队列中，跳过: {filename}")
@@ -2653,10 +3158,8 @@ class CustomFileHandler(FileSystemEventHandler):
         
         logging.debug(f"文件重命名: {old_file_path} -> {new_file_path}")
         if new_filename not in self.processed_files:
-            # 检查是否已经在待处理队列中
-            if new_file_path not in self.pending_files:
-                # 添加到待处理队列
-                self.pending_files.append(new_file_path)
+            # 检查是否已经在待处理队列中，不在时添加到待处理队列
+            if self.enqueue_file(new_file_path):
                 self.schedule_batch_processing()
             else:
                 logging.debug(f"文件已在待处理队列中，跳过: {new_filename}")
@@ -2667,7 +3170,12 @@ def start_monitoring(directory):
     logging.info(f"开始监控目录: {directory}")
     event_handler = CustomFileHandler()
     observer = Observer()
-    observer.schedule(event_handler, directory, recursive=True)
+    if DownloadCompletionFeed.is_supported(config):
+        # 由下载器直接通知完成的任务，只监控下载根目录下手动放入的文件
+        DownloadCompletionFeed(event_handler, config).start()
+        observer.schedule(event_handler, directory, recursive=False)
+    else:
+        observer.schedule(event_handler, directory, recursive=True)
     observer.start()
     try:
         # 处理已存在的文件
@@ -2711,6 +3219,6 @@ def start_monitoring(directory):
     logging.info("实时监控已停止")
 
 if __name__ == "__main__":
-    config = load_config()
+    config = snapshot.get()['config']
     directory = config.get("download_dir", "")
     start_monitoring(directory)
\ No newline at end of file
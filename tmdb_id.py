@@ -1,9 +1,8 @@
-import os
-import re
 import sqlite3
-import xml.etree.ElementTree as ET
 import logging
 import requests
+from database import load_config
+from nfo_catalog import refresh_catalog, library_root_types
 
 # 配置日志
 logging.basicConfig(
@@ -15,75 +14,41 @@ logging.basicConfig(
     ]
 )
 
-def load_config(db_path):
-    """从数据库中加载配置"""
-    try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT OPTION, VALUE FROM CONFIG')
-            config_items = cursor.fetchall()
-            config = {option: value for option, value in config_items}
-        
-        logging.debug("加载配置文件成功")
-        return config
-    except sqlite3.Error as e:
-        logging.error(f"数据库加载配置错误: {e}")
-        exit(0)
-
-def parse_nfo(file_path):
-    """解析NFO文件，返回title, year和tmdb id"""
-    logging.debug(f"解析NFO文件: {file_path}")
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # 查找<title>元素
-        title_element = root.find('title')
-        title = title_element.text.strip().lower() if title_element is not None and title_element.text is not None else None
-        
-        # 查找<year>元素
-        year_element = root.find('year')
-        year = year_element.text.strip() if year_element is not None and year_element.text is not None else None
-        
-        # 查找<uniqueid type="tmdb">元素
-        tmdb_id_element = root.find(".//uniqueid[@type='tmdb']")
-        tmdb_id = tmdb_id_element.text.strip() if tmdb_id_element is not None and tmdb_id_element.text is not None else None
-        
-        logging.debug(f"解析结果: 标题: {title}, 年份: {year}, tmdb_id: {tmdb_id}")
-        return title, year, tmdb_id
-    except Exception as e:
-        logging.error(f"解析 {file_path} 时出错: {e}")
-        return None, None, None
+def build_nfo_index(catalog, directory):
+    """
+    一次性从NFO目录索引中建立给定目录（可为多个目录）下的 标题/年份 -> tmdb_id 映射。
+    同一标题（和年份）存在多个NFO文件时，以路径顺序中的第一个为准。
+    """
+    by_title_year = {}
+    by_title = {}
+    directories = [directory] if isinstance(directory, str) else directory
+    for root in dict.fromkeys(path for path in directories if path):
+        for entry in catalog.under(root):
+            if entry['TITLE'] is None:
+                continue
+            title = entry['TITLE'].lower()
+            by_title_year.setdefault((title, entry['YEAR']), (entry['TMDB_ID'], entry['PATH']))
+            by_title.setdefault(title, (entry['TMDB_ID'], entry['PATH']))
+    logging.info(f"已从 {directory} 建立NFO标题索引，共 {len(by_title)} 个标题")
+    return {'title_year': by_title_year, 'title': by_title}
 
-def find_and_parse_nfo_files(directory, title, year):
-    """在给定目录中查找所有NFO文件并解析它们，返回匹配的tmdb_id"""
-    logging.info(f"在目录 {directory} 中查找所有NFO文件，标题: {title}, 年份: {year}")
+def find_and_parse_nfo_files(nfo_index, title, year):
+    """在NFO标题索引中查找匹配的tmdb_id"""
+    logging.info(f"在NFO标题索引中查找，标题: {title}, 年份: {year}")
     title = title.lower().strip()
     
-    # 处理年份为None的情况
-    if year is not None:
-        year = str(year).strip()  # 确保 year 是字符串类型
+    # 如果输入年份为None，则只比较标题
+    if year is None:
+        match = nfo_index['title'].get(title)
+        if match:
+            logging.info(f"找到匹配的NFO文件(仅标题匹配): {match[1]}, tmdb_id: {match[0]}")
+            return match[0]
     else:
-        year = None
-    
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.nfo'):
-                file_path = os.path.join(root, file)
-                parsed_title, parsed_year, tmdb_id = parse_nfo(file_path)
-                
-                # 如果输入年份为None，则只比较标题
-                if year is None:
-                    if parsed_title == title:
-                        logging.info(f"找到匹配的NFO文件(仅标题匹配): {file_path}, tmdb_id: {tmdb_id}")
-                        return tmdb_id
-                else:
-                    # 同时比较标题和年份
-                    if parsed_title == title and parsed_year == year:
-                        logging.info(f"找到匹配的NFO文件: {file_path}, tmdb_id: {tmdb_id}")
-                        return tmdb_id
-                        
-                logging.debug(f"不匹配的NFO文件: {file_path}, 解析标题: {parsed_title}, 解析年份: {parsed_year}")
+        # 同时比较标题和年份
+        match = nfo_index['title_year'].get((title, str(year).strip()))
+        if match:
+            logging.info(f"找到匹配的NFO文件: {match[1]}, tmdb_id: {match[0]}")
+            return match[0]
     
     logging.info(f"未找到匹配的NFO文件，标题: {title}, 年份: {year}")
     return None
@@ -173,6 +138,8 @@ def main():
     config = load_config(db_path)
     movies_path = config['movies_path']
     episodes_path = config['episodes_path']
+    # 电视剧、动漫、综艺路径一起并行查找
+    tv_paths = [episodes_path, config.get('anime_path', episodes_path), config.get('variety_path', episodes_path)]
 
     # 获取数据库中没有tmdb_id的电影记录
     movies_without_tmdb_id = fetch_data_without_tmdb_id(db_path, 'LIB_MOVIES')
@@ -180,6 +147,13 @@ def main():
     # 获取数据库中没有tmdb_id的电视剧记录
     episodes_without_tmdb_id = fetch_data_without_tmdb_id(db_path, 'LIB_TVS')
 
+    # 有待处理的记录时增量更新NFO目录索引，并一次性建立电影、电视剧的标题索引，
+    # 之后每条记录只需一次字典查找，不再遍历目录和解析NFO
+    if movies_without_tmdb_id or episodes_without_tmdb_id:
+        catalog = refresh_catalog(db_path, [movies_path] + tv_paths, library_root_types(config))
+        movies_nfo_index = build_nfo_index(catalog, movies_path)
+        tv_nfo_index = build_nfo_index(catalog, tv_paths)
+
     # 检查是否有需要处理的电影记录
     if movies_without_tmdb_id:
         for title, year in movies_without_tmdb_id:
@@ -190,7 +164,7 @@ def main():
                 
             logging.info(f"处理电影记录, 标题: {title}, 年份: {year}")
             # 尝试从NFO文件中读取tmdb_id
-            tmdb_id = find_and_parse_nfo_files(movies_path, title, year)
+            tmdb_id = find_and_parse_nfo_files(movies_nfo_index, title, year)
             if not tmdb_id:
                 # 调用TMDB API获取tmdb_id
                 tmdb_id = query_tmdb_api(title, year, 'movie', config)
@@ -208,7 +182,7 @@ def main():
                 
             logging.info(f"处理电视剧记录, 标题: {title}, 年份: {year}")
             # 尝试从NFO文件中读取tmdb_id
-            tmdb_id = find_and_parse_nfo_files(episodes_path, title, year)
+            tmdb_id = find_and_parse_nfo_files(tv_nfo_index, title, year)
             if not tmdb_id:
                 # 调用TMDB API获取tmdb_id
                 tmdb_id = query_tmdb_api(title, year, 'tv', config)
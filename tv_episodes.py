@@ -0,0 +1,104 @@
+# 剧集集数的公共读写工具：
+# 已入库的集数以 LIB_TV_EPISODES 表（每集一行）为准，LIB_TV_SEASONS.EPISODES 仅保留逗号分隔的字符串副本，
+# 供旧版本和页面展示使用；MISS_TVS.MISSING_EPISODES 仍为逗号分隔字符串，由下列函数统一解析和生成。
+
+def parse_episodes(value):
+    """将逗号分隔的集数字符串（兼容整数和空值）解析为集合，忽略无效值"""
+    if value is None:
+        return set()
+    if isinstance(value, int):
+        return {value}
+    value = str(value)
+    # 常见的纯数字字符串直接转换，含空格、空项等情况时逐项检查
+    if value.replace(',', '').isdigit():
+        try:
+            return set(map(int, value.split(',')))
+        except ValueError:
+            pass
+    return {int(ep) for ep in value.split(',') if ep.strip().isdigit()}
+
+def format_episodes(episodes):
+    """将集数集合格式化为升序的逗号分隔字符串"""
+    return ','.join(map(str, sorted(episodes)))
+
+def get_library_episodes(cursor, title, season, year=None):
+    """
+    查询媒体库中某剧某季已入库的集数。
+
+    Returns:
+        集数集合；媒体库中不存在该季时返回 None
+    """
+    if year is None:
+        tv_filter, params = 'SELECT ID FROM LIB_TVS WHERE TITLE = ?', (title, season)
+    else:
+        tv_filter, params = 'SELECT ID FROM LIB_TVS WHERE TITLE = ? AND YEAR = ?', (title, year, season)
+    rows = cursor.execute(f'''
+        SELECT e.EPISODE
+        FROM LIB_TV_SEASONS s
+        LEFT JOIN LIB_TV_EPISODES e ON e.TV_ID = s.TV_ID AND e.SEASON = s.SEASON
+        WHERE s.TV_ID = ({tv_filter}) AND s.SEASON = ?
+    ''', params).fetchall()
+    if not rows:
+        return None
+    return {row[0] for row in rows if row[0] is not None}
+
+def count_library_episodes(cursor):
+    """媒体库中的总集数"""
+    return cursor.execute('SELECT COUNT(*) FROM LIB_TV_EPISODES').fetchone()[0]
+
+def get_episode_counts(cursor, tv_ids):
+    """批量查询多部电视剧每一季的集数，返回 {(电视剧ID, 季): 集数}"""
+    if not tv_ids:
+        return {}
+    rows = cursor.execute('''
+        SELECT TV_ID, SEASON, COUNT(*) FROM LIB_TV_EPISODES
+        WHERE TV_ID IN ({})
+        GROUP BY TV_ID, SEASON
+    '''.format(','.join(['?'] * len(tv_ids))), list(tv_ids)).fetchall()
+    return {(row[0], row[1]): row[2] for row in rows}
+
+def season_key(season):
+    """
+    统一季号的类型：别名表中的季号为文本，SQL 比较时按整数处理（'2' 与 2 相等），内存中比对前同样转为整数
+    """
+    if isinstance(season, str) and season.strip().isdigit():
+        return int(season)
+    return season
+
+def load_library_seasons(cursor, titles=None):
+    """
+    一次性读取媒体库中剧集每一季已入库的集数（不匹配年份），titles 不为空时只读取这些标题的剧集。
+    同名剧集有多个年份时，与 get_library_episodes 不指定年份时一致，取年份最早的一部。
+
+    Returns:
+        (媒体库中的剧集标题集合, {(标题, 季): 集数集合})
+    """
+    if titles is None:
+        rows = cursor.execute('SELECT TITLE, ID FROM LIB_TVS ORDER BY TITLE, YEAR').fetchall()
+    elif titles:
+        titles = list(titles)
+        rows = cursor.execute(
+            'SELECT TITLE, ID FROM LIB_TVS WHERE TITLE IN ({}) ORDER BY TITLE, YEAR'.format(','.join(['?'] * len(titles))),
+            titles
+        ).fetchall()
+    else:
+        rows = []
+    tv_ids = {}
+    for title, tv_id in rows:
+        tv_ids.setdefault(title, tv_id)
+    if not tv_ids:
+        return set(), {}
+    names = {tv_id: title for title, tv_id in tv_ids.items()}
+    # 每季一行，集数由 SQLite 拼接后返回，减少逐集构造结果行的开销
+    rows = cursor.execute('''
+        SELECT s.TV_ID, s.SEASON, GROUP_CONCAT(e.EPISODE)
+        FROM LIB_TV_SEASONS s
+        LEFT JOIN LIB_TV_EPISODES e ON e.TV_ID = s.TV_ID AND e.SEASON = s.SEASON
+        WHERE s.TV_ID IN ({})
+        GROUP BY s.TV_ID, s.SEASON
+    '''.format(','.join(['?'] * len(names))), list(names)).fetchall()
+    seasons = {
+        (names[tv_id], season_key(season)): parse_episodes(episodes)
+        for tv_id, season, episodes in rows
+    }
+    return set(tv_ids), seasons